@@ -0,0 +1,135 @@
+"""
+Admission control of the gateway, per handler concurrency limits & token bucket rate limits
+
+__author__ = "Alex Xiao <http://www.alexxiao.me/>"
+__date__ = "2026-10-18"
+__version__ = "0.1"
+
+    Version:
+        0.1 (18/10/2026): per handler concurrency limits & token bucket rate limits, shed instead of queueing
+
+Limits are per worker process, the handler name is module.function, '*' is the default of handlers not listed.
+A request over the limit is rejected at once with ax.exception.Overloaded (the gateway returns 429/ 503 with
+Retry-After), so a slow handler can not take all the worker threads.
+
+Classes:
+    TokenBucket - the token bucket rate limiter
+    HandlerLimit - the concurrency & rate limit of one handler
+    AdmissionControl - the limits of all handlers
+"""
+import math
+import threading
+from time import monotonic
+from ax.exception import Overloaded
+
+
+class TokenBucket:
+    """
+    The token bucket, refilled at rate tokens per second up to burst tokens, not thread safe
+    """
+    def __init__(self, rate, burst=None):
+        """
+        :param rate: tokens per second
+        :param burst: [Default to max(rate, 1)] max tokens of the bucket
+        """
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 1))
+        self.tokens = self.burst
+        self.ts = monotonic()
+
+    def acquire(self):
+        """
+        Take one token
+        :return: 0 if taken, else seconds until one token is available
+        """
+        ts = monotonic()
+        self.tokens = min(self.burst, self.tokens + (ts - self.ts) * self.rate)
+        self.ts = ts
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+
+class HandlerLimit:
+    """
+    The concurrency & rate limit of one handler, with its counters
+    """
+    def __init__(self, max_concurrency=None, rate=None, burst=None):
+        """
+        :param max_concurrency: [Default to None] max requests in flight, None for no limit
+        :param rate: [Default to None] max requests per second, None for no limit
+        :param burst: [Default to None] the burst of the rate limit
+        """
+        self.max_concurrency = max_concurrency
+        self.bucket = TokenBucket(rate, burst) if rate is not None else None
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = {'concurrency': 0, 'rate': 0}
+
+
+class AdmissionControl:
+    """
+    The admission control of all handlers
+    """
+    def __init__(self, concurrency_limits=None, rate_limits=None, retry_after=1):
+        """
+        :param concurrency_limits: {handler: max requests in flight}, '*' for the default
+        :param rate_limits: {handler: (requests per second, burst)}, '*' for the default
+        :param retry_after: [Default to 1] the Retry-After seconds of requests shed by the concurrency limit
+        """
+        self.concurrency_limits = concurrency_limits or dict()
+        self.rate_limits = rate_limits or dict()
+        self.retry_after = retry_after
+        self._limits = dict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.concurrency_limits or self.rate_limits)
+
+    def _get_limit(self, handler):
+        limit = self._limits.get(handler)
+        if limit is None:
+            rate, burst = self.rate_limits.get(handler, self.rate_limits.get('*', (None, None)))
+            limit = HandlerLimit(self.concurrency_limits.get(handler, self.concurrency_limits.get('*')), rate, burst)
+            self._limits[handler] = limit
+        return limit
+
+    def acquire(self, handler):
+        """
+        Admit the request, or raise Overloaded
+        :param handler: the handler name
+        :return: the HandlerLimit to release once done, None if no limits
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            limit = self._get_limit(handler)
+            if limit.max_concurrency is not None and limit.in_flight >= limit.max_concurrency:
+                limit.shed['concurrency'] += 1
+                raise Overloaded(handler, 'concurrency', self.retry_after)
+            if limit.bucket is not None:
+                wait = limit.bucket.acquire()
+                if wait:
+                    limit.shed['rate'] += 1
+                    raise Overloaded(handler, 'rate', wait)
+            limit.in_flight += 1
+            limit.admitted += 1
+        return limit
+
+    def release(self, limit):
+        if limit is None:
+            return
+        with self._lock:
+            limit.in_flight -= 1
+
+    def stats(self):
+        """
+        :return: {handler: {max_concurrency, rate, in_flight, admitted, shed}}
+        """
+        with self._lock:
+            return {handler: {'max_concurrency': limit.max_concurrency,
+                              'rate': limit.bucket.rate if limit.bucket is not None else None,
+                              'in_flight': limit.in_flight, 'admitted': limit.admitted, 'shed': dict(limit.shed)}
+                    for handler, limit in self._limits.items()}
@@ -0,0 +1,232 @@
+"""
+The response encoders of the gateway
+
+__author__ = "Alex Xiao <http://www.alexxiao.me/>"
+__date__ = "2026-10-18"
+__version__ = "0.1"
+
+    Version:
+        0.1 (18/10/2026): json (orjson if installed)/ msgpack/ Arrow IPC encoders with content negotiation
+
+Classes:
+    JsonEncoder - json, handles datetime, numpy scalars/ arrays & DataFrame (column-oriented) natively
+    MsgpackEncoder - msgpack, same types as JsonEncoder
+    ArrowEncoder - Arrow IPC stream for tabular results (DataFrame)
+    ResponseEncoder - pick the encoder by Accept header, fallback to json
+"""
+import json
+from uuid import UUID
+from decimal import Decimal
+from datetime import date, datetime, timezone
+from email.utils import format_datetime
+import numpy
+import pandas
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+_week_days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+_months = ['', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+
+def format_http_datetime(dt):
+    """
+    Format datetime/ date as http date e.g. Sun, 18 Oct 2026 08:00:00 GMT, same as Flask's jsonify
+    :param dt: datetime or date, naive datetime is treated as UTC
+    :return: the formatted string
+    """
+    if not isinstance(dt, datetime):
+        dt = datetime(dt.year, dt.month, dt.day)
+    return format_datetime(dt.astimezone(timezone.utc) if dt.tzinfo else dt.replace(tzinfo=timezone.utc), usegmt=True)
+
+
+def series_values(s, datetime_format='http'):
+    """
+    The values of the Series as list, NaN/ NaT as None, datetime formatted (vectorized)
+    :param s: the Series
+    :param datetime_format: 'http' or 'iso'
+    :return: list of values
+    """
+    if s.dtype.kind == 'M':
+        tz = s.dt.tz is not None
+        values = (s.dt.tz_convert('UTC').dt.tz_localize(None) if tz else s).to_numpy(dtype='datetime64[us]')
+        nat = numpy.isnat(values).tolist()
+        if datetime_format == 'http':
+            iso = numpy.datetime_as_string(values, unit='s').tolist()
+            # 1970-01-01 is Thursday
+            week_days = ((values.astype('datetime64[D]').astype('int64') + 3) % 7).tolist()
+            return [None if n else _week_days[w] + ', ' + t[8:10] + ' ' + _months[int(t[5:7])] + ' ' + t[:4] + ' ' +
+                    t[11:19] + ' GMT' for t, w, n in zip(iso, week_days, nat)]
+        suffix = '+00:00' if tz else ''
+        return [None if n else t + suffix for t, n in zip(numpy.datetime_as_string(values, unit='us').tolist(), nat)]
+    return s.astype(object).where(s.notna(), None).tolist()
+
+
+def frame_columns(df, native_numpy=False, datetime_format='http'):
+    """
+    Column-oriented representation of the DataFrame, {column: [values]}
+    :param df: the DataFrame
+    :param native_numpy: [Default to False] keep numeric columns as numpy arrays (for orjson)
+    :param datetime_format: 'http' or 'iso'
+    :return: dict of columns
+    """
+    rtn = dict()
+    for col in df.columns:
+        s = df[col]
+        if native_numpy and s.dtype.kind in 'biuf':
+            rtn[str(col)] = s.to_numpy()
+        else:
+            rtn[str(col)] = series_values(s, datetime_format)
+    return rtn
+
+
+class JsonEncoder:
+    """
+    The json encoder, use orjson if installed
+    """
+    content_type = 'application/json'
+    # orjson serializes numeric numpy arrays natively
+    native_numpy = orjson is not None
+
+    def __init__(self, datetime_format='http'):
+        """
+        :param datetime_format: [Default to http] 'http' for http date (Flask compatible), 'iso' for ISO 8601
+        """
+        self.datetime_format = datetime_format
+        self._option = 0
+        if orjson:
+            self._option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+            if datetime_format == 'http':
+                self._option |= orjson.OPT_PASSTHROUGH_DATETIME
+
+    def default(self, o):
+        """
+        The fallback for types not supported by the json backend
+        :param o: the object
+        :return: the json compatible value
+        """
+        if isinstance(o, (datetime, date)):
+            return format_http_datetime(o) if self.datetime_format == 'http' else o.isoformat()
+        if isinstance(o, pandas.DataFrame):
+            return frame_columns(o, native_numpy=self.native_numpy, datetime_format=self.datetime_format)
+        if isinstance(o, pandas.Series):
+            return series_values(o, self.datetime_format)
+        if isinstance(o, numpy.ndarray):
+            return o.tolist()
+        if isinstance(o, numpy.generic):
+            return o.item()
+        if isinstance(o, (Decimal, UUID)):
+            return str(o)
+        raise TypeError('Object of type ' + type(o).__name__ + ' is not JSON serializable')
+
+    def encode(self, resp):
+        if orjson:
+            return orjson.dumps(resp, default=self.default, option=self._option)
+        return json.dumps(resp, default=self.default).encode()
+
+
+class MsgpackEncoder(JsonEncoder):
+    """
+    The msgpack encoder, datetime is in ISO 8601
+    """
+    content_type = 'application/x-msgpack'
+    native_numpy = False
+
+    def __init__(self):
+        JsonEncoder.__init__(self, datetime_format='iso')
+
+    def encode(self, resp):
+        return msgpack.packb(resp, default=self.default)
+
+
+class ArrowEncoder:
+    """
+    The Arrow IPC stream encoder for tabular results: a DataFrame, or a dict with exactly one DataFrame value
+    * the other values of the dict are kept as json in the schema metadata 'toby'
+    """
+    content_type = 'application/vnd.apache.arrow.stream'
+
+    def __init__(self, json_encoder=None):
+        self.json_encoder = json_encoder or JsonEncoder(datetime_format='iso')
+
+    @staticmethod
+    def find_frame(resp):
+        """
+        :return: (the DataFrame, the other values) or (None, None) if not tabular
+        """
+        if isinstance(resp, pandas.DataFrame):
+            return resp, dict()
+        if isinstance(resp, dict):
+            frames = [k for k, v in resp.items() if isinstance(v, pandas.DataFrame)]
+            if len(frames) == 1:
+                return resp[frames[0]], {k: v for k, v in resp.items() if k != frames[0]}
+        return None, None
+
+    def accepts(self, resp):
+        return pyarrow is not None and self.find_frame(resp)[0] is not None
+
+    def encode(self, resp):
+        df, others = self.find_frame(resp)
+        table = pyarrow.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                               b'toby': self.json_encoder.encode(others)})
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+
+class ResponseEncoder:
+    """
+    Encode the response by the Accept header, json if no other acceptable encoder
+    """
+    def __init__(self, datetime_format='http'):
+        """
+        :param datetime_format: the datetime format of json, 'http' (Flask compatible) or 'iso'
+        """
+        self.json = JsonEncoder(datetime_format=datetime_format)
+        self.encoders = dict()
+        if pyarrow:
+            self.register(ArrowEncoder())
+        if msgpack:
+            self.register(MsgpackEncoder())
+
+    def register(self, encoder):
+        """
+        Register an encoder, it should have content_type & encode(resp), [optional] accepts(resp)
+        :param encoder: the encoder
+        :return: N/A
+        """
+        self.encoders[encoder.content_type] = encoder
+
+    def select(self, resp, accept=None):
+        """
+        :param resp: the response
+        :param accept: the Accept header
+        :return: the encoder
+        """
+        if accept:
+            for content_type in accept.split(','):
+                encoder = self.encoders.get(content_type.split(';')[0].strip())
+                if encoder is not None and (not hasattr(encoder, 'accepts') or encoder.accepts(resp)):
+                    return encoder
+        return self.json
+
+    def encode(self, resp, accept=None):
+        """
+        :param resp: the response
+        :param accept: the Accept header
+        :return: (body bytes, content type)
+        """
+        encoder = self.select(resp, accept)
+        return encoder.encode(resp), encoder.content_type
@@ -51,6 +51,33 @@ class InvalidToken(BaseError):
         BaseError.__init__(self, 'InvalidToken', str(request))
 
 
+class InvalidRequest(BaseError):
+    """Raised when the request is not in the expected shape
+
+        Attributes:
+            fun
+        """
+
+    def __init__(self, desc=''):
+        BaseError.__init__(self, 'InvalidRequest', desc)
+
+
+class Overloaded(BaseError):
+    """Raised when the request is shed by the admission control
+
+        Attributes:
+            handler -- the handler name
+            reason -- concurrency/ rate
+            retry_after -- seconds the client should wait before retrying
+        """
+
+    def __init__(self, handler, reason, retry_after):
+        BaseError.__init__(self, 'Overloaded', handler + ' is over its ' + reason + ' limit')
+        self.handler = handler
+        self.reason = reason
+        self.retry_after = retry_after
+
+
 class MaxRetryReached(BaseError):
     """Raised when an Max retry reached
 
@@ -0,0 +1,615 @@
+"""
+The request pipeline of the Toby gateway, shared by all serving modes (Flask/ gunicorn & asyncio/ ASGI)
+
+__author__ = "Alex Xiao <http://www.alexxiao.me/>"
+__date__ = "2026-10-18"
+__version__ = "0.7"
+
+    Version:
+        0.1 (18/10/2026): separated from toby.py for the ASGI serving mode
+        0.2 (18/10/2026): batch requests
+        0.3 (18/10/2026): async job mode, run on Dask & result in Cache
+        0.4 (18/10/2026): pluggable response encoder (ax.encoder)
+        0.5 (18/10/2026): result memoization of idempotent handlers
+        0.6 (18/10/2026): per handler & phase metrics (ax.metrics)
+        0.7 (18/10/2026): per handler admission control (ax.admission), shed requests get 429/ 503
+
+Request contract:
+    in: json object with request_token, request_module, request_function, [optional] request_id/ request_timestamp,
+        all the others are passed to the handler as key-word arguments
+    out: the handler result, or the error envelope {request_id, request_status='error', request_error}
+        encoded by Accept header: json (default), msgpack, or Arrow IPC stream for tabular results
+    batch in: json array of requests, tokens are verified once per distinct token, a request with an invalid token
+        gets its error line only
+    batch out: NDJSON lines of {request_id, response} in completion order
+    memoization: results of handlers marked by ax.tools.cacheable (or in memo_handlers) are kept in Cache by the
+        hash of request parameters, without request_id/ request_timestamp/ request_token
+    async job (mode=async): {request_id, request_status='submitted'} is returned immediately, the job status
+        (submitted/ running/ done/ error) & result {request_id, request_status, response} is kept in Cache
+    admission: a request over the concurrency/ rate limit of its handler is shed before the handler is resolved,
+        with the error envelope & retry_after, http status 503 (concurrency)/ 429 (rate) & Retry-After header
+"""
+import os
+import json
+import math
+import time
+import asyncio
+import inspect
+import hashlib
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from ax.log import trace_error, get_logger
+from ax.datetime import now, current_sys_time
+from ax.tools import FunctionCache, TokenCache, get_uuid, load_function
+from ax.wrapper.redis import Cache, get_pool_status as get_redis_pool_status
+from ax.exception import InvalidToken, InvalidRequest, Overloaded
+from ax.connection import DatabaseConnection
+from ax.wrapper.sqlalchemy import get_pool_status
+from ax.encoder import ResponseEncoder
+from ax.metrics import Metrics, default_metrics_dir
+from ax.admission import AdmissionControl
+
+
+job_key_prefix = 'toby.job.'
+job_pending_status = ('submitted', 'running')
+
+
+def connect_db(pool_size=8, max_overflow=4):
+    """
+    Borrow a database connection from the process-wide pool
+    :param pool_size: the pool size per process
+    :param max_overflow: the max overflow of the pool per process
+    :return: the DatabaseConnection
+    """
+    return DatabaseConnection(os.getenv('TOBY_DB_USER', 'toby'), os.environ['TOBY_DB_PASSWORD'], pooled=True,
+                              pool_size=pool_size, max_overflow=max_overflow)
+
+
+class LazyConnection:
+    """
+    The get_db_connection callable for one request, borrow from the pool on first call
+    """
+    def __init__(self, connect=connect_db):
+        self.connect = connect
+        self.db = None
+
+    def __call__(self):
+        if self.db is None:
+            self.db = self.connect()
+        return self.db
+
+    def close(self):
+        """Returns the database connection (if any) to the pool"""
+        if self.db is not None:
+            self.db.disconnect()
+            self.db = None
+
+
+def run_job(in_param, cache_options, expire):
+    """
+    Run the handler as a job (on the Dask worker), keep the status & result in Cache
+    :param in_param: the prepared request, without logger & get_db_connection
+    :param cache_options: the arguments of Cache
+    :param expire: seconds to keep the status & result
+    :return: the final status
+    """
+    logger = get_logger('Job')
+    cache = Cache(**cache_options)
+    request_id = in_param['request_id']
+    key = job_key_prefix + request_id
+    cache.put(key, val={'request_id': request_id, 'request_status': 'running'}, expire=expire)
+    db = LazyConnection()
+    try:
+        in_param['logger'] = logger
+        in_param['get_db_connection'] = db
+        func = load_function(in_param['request_module'], in_param['request_function'], force_reload=False)
+        rtn = {'request_id': request_id, 'request_status': 'done', 'response': Gateway.call(func, in_param)}
+    except:
+        e = trace_error(logger)
+        rtn = {'request_id': request_id, 'request_status': 'error', 'request_error': str(e[-1])}
+    finally:
+        db.close()
+    cache.put(key, val=rtn, expire=expire)
+    return rtn['request_status']
+
+
+class Memoizer:
+    """
+    Cache the handler results in Cache, with single-flight: concurrent identical requests in the process wait for
+    the first one instead of running the handler again
+    * the wait is bounded, a request waiting longer (e.g. the first one hangs) runs the handler itself
+    """
+    volatile_fields = ('request_id', 'request_timestamp', 'request_token', 'logger', 'get_db_connection')
+
+    def __init__(self, gateway, prefix='toby.memo.', wait=30):
+        """
+        :param gateway: the gateway, for its cache & logger
+        :param prefix: the key prefix in Cache
+        :param wait: [Default to 30] max seconds to wait for the identical request in flight
+        """
+        self.gateway = gateway
+        self.prefix = prefix
+        self.wait = wait
+        self.stats = dict()
+        self._flights = dict()
+        self._lock = threading.Lock()
+
+    def key(self, name, in_param):
+        """
+        :param name: the handler name module.function
+        :param in_param: the request
+        :return: the cache key, by hash of the non-volatile request parameters
+        """
+        params = {k: v for k, v in in_param.items() if k not in self.volatile_fields}
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+        return self.prefix + name + '.' + digest
+
+    def _count(self, name, counter):
+        with self._lock:
+            stats = self.stats.setdefault(name, {'hits': 0, 'misses': 0, 'shared': 0, 'timeouts': 0})
+            stats[counter] += 1
+
+    @staticmethod
+    def _for_request(resp, in_param):
+        # the cached result belongs to a previous request
+        if isinstance(resp, dict) and 'request_id' in resp:
+            return {**resp, 'request_id': in_param['request_id']}
+        return resp
+
+    def _cache_get(self, key):
+        try:
+            return self.gateway.cache.get(key)
+        except:
+            trace_error(self.gateway.logger)
+            return None
+
+    def get_or_run(self, name, in_param, ttl, run):
+        """
+        Get the result from Cache, or run (once in process) & cache it
+        :param name: the handler name module.function
+        :param in_param: the request
+        :param ttl: seconds to cache the result
+        :param run: the function to run the handler
+        :return: the result
+        """
+        key = self.key(name, in_param)
+        resp = self._cache_get(key)
+        if resp is not None:
+            self._count(name, 'hits')
+            return self._for_request(resp, in_param)
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Future()
+        if not leader:
+            try:
+                resp = flight.result(timeout=self.wait)
+            except FutureTimeoutError:
+                self._count(name, 'timeouts')
+                self.gateway.logger.warning('Waited ' + str(self.wait) + 's for the identical request of ' + name +
+                                            ', running it')
+                return run()
+            self._count(name, 'shared')
+            return self._for_request(resp, in_param)
+        self._count(name, 'misses')
+        try:
+            resp = run()
+            if resp is not None and not (isinstance(resp, dict) and resp.get('request_status') == 'error'):
+                try:
+                    self.gateway.cache.put(key, val=resp, expire=ttl)
+                except:
+                    trace_error(self.gateway.logger)
+            flight.set_result(resp)
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+        return resp
+
+
+class Gateway:
+    """
+    The request pipeline: verify token, fill request defaults, resolve handler, build error envelope
+    """
+    def __init__(self, token, logger, token_cache_size=4096, token_cache_ttl=300, token_ttl=None,
+                 reload_check_interval=1.0, db_pool_size=8, db_pool_overflow=4, batch_max_size=1000,
+                 cache_options=None, dask_options=None, job_expire=3600, result_max_wait=30,
+                 datetime_format='http', memo_handlers=None, metrics_dir=default_metrics_dir,
+                 concurrency_limits=None, rate_limits=None, retry_after=1, memo_wait=30):
+        """
+        :param token: the expected decrypted request token
+        :param logger: the logger
+        :param token_cache_size: max number of verified tokens to keep
+        :param token_cache_ttl: seconds to keep a verified token
+        :param token_ttl: max age of the token from its fernet timestamp, None for no limit
+        :param reload_check_interval: min seconds between source file checks of a handler module
+        :param db_pool_size: the pool size per process
+        :param db_pool_overflow: the max overflow of the pool per process
+        :param batch_max_size: max number of requests in a batch
+        :param cache_options: the arguments of Cache for async job status & result
+        :param dask_options: the arguments of DaskClient to run async jobs
+        :param job_expire: seconds to keep async job status & result
+        :param result_max_wait: max seconds to long-poll an async job result
+        :param datetime_format: the datetime format of json response, 'http' (Flask compatible) or 'iso'
+        :param memo_handlers: {module.function: ttl} of handlers to memoize, in addition to ax.tools.cacheable ones
+        :param metrics_dir: the metrics folder shared by all worker processes
+        :param concurrency_limits: {module.function: max requests in flight per process}, '*' for the default
+        :param rate_limits: {module.function: (requests per second, burst) per process}, '*' for the default
+        :param retry_after: the Retry-After seconds of requests shed by the concurrency limit
+        :param memo_wait: max seconds a memoized request waits for the identical one in flight, then runs itself
+        """
+        self.logger = logger
+        self.db_pool_size = db_pool_size
+        self.db_pool_overflow = db_pool_overflow
+        self.batch_max_size = batch_max_size
+        self.cache_options = cache_options or dict()
+        self.dask_options = dask_options or dict()
+        self.job_expire = job_expire
+        self.result_max_wait = result_max_wait
+        self._cache = None
+        self._dask = None
+        self.encoder = ResponseEncoder(datetime_format=datetime_format)
+        self.memo_handlers = memo_handlers or dict()
+        self.memoizer = Memoizer(self, wait=memo_wait)
+        self.metrics = Metrics(metrics_dir)
+        self.metrics.describe('toby_shed_total', 'counter', 'Requests shed by the admission control by handler & reason')
+        self.admission = AdmissionControl(concurrency_limits, rate_limits, retry_after=retry_after)
+        # verified tokens are accepted by digest until expired, forged ones are negative cached
+        self.token_cache = TokenCache(token, max_size=token_cache_size, ttl=token_cache_ttl, token_ttl=token_ttl)
+        # handlers are resolved once, hot-reloaded when the source changed or via reload
+        self.dispatcher = FunctionCache(logger=logger, check_interval=reload_check_interval)
+
+    def connect_db(self):
+        """
+        Borrow a database connection from the process-wide pool
+        :return: the DatabaseConnection
+        """
+        return connect_db(self.db_pool_size, self.db_pool_overflow)
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            self._cache = Cache(**self.cache_options)
+        return self._cache
+
+    @property
+    def dask(self):
+        if self._dask is None:
+            # dask is only needed for async jobs
+            from ax.wrapper.dask import DaskClient
+            self._dask = DaskClient(**self.dask_options)
+        return self._dask
+
+    def verify_token(self, in_param, cached_only=False):
+        """
+        Raise InvalidToken if the request token is not valid
+        :param cached_only: [Default to False] True to check the verified/ rejected tokens only, no decrypt
+        :return: True if valid, None if cached_only & the token is not known yet
+        """
+        valid = self.token_cache.verify(in_param['request_token'], cached_only=cached_only)
+        if valid is False:
+            raise InvalidToken(in_param)
+        return valid
+
+    def prepare(self, in_param, get_db_connection, verify=True):
+        """
+        Verify the request & fill in the defaults for handler
+        :param in_param: the request
+        :param get_db_connection: the function to get database connection for the handler
+        :param verify: [Default to True] False if the token is verified already (e.g. batch)
+        :return: the request id
+        """
+        if verify:
+            self.verify_token(in_param)
+        if 'request_id' not in in_param:
+            in_param['request_id'] = get_uuid()
+        if 'request_timestamp' not in in_param:
+            in_param['request_timestamp'] = now()
+        in_param['logger'] = self.logger
+        in_param['get_db_connection'] = get_db_connection
+        return in_param['request_id']
+
+    @staticmethod
+    def handler_name(in_param):
+        """
+        :param in_param: the verified request
+        :return: the handler name module.function
+        """
+        return str(in_param.get('request_module')) + '.' + str(in_param.get('request_function'))
+
+    def resolve(self, in_param):
+        """
+        :param in_param: the prepared request
+        :return: the handler function
+        """
+        return self.dispatcher.resolve(in_param['request_module'], in_param['request_function'])
+
+    def handler_label(self, in_param):
+        """
+        The handler label of the metrics, the names come from the clients so only the handlers resolved in the
+        process are labelled by name, the others as unknown
+        :param in_param: the verified request
+        :return: module.function or unknown
+        """
+        module, func = in_param.get('request_module'), in_param.get('request_function')
+        if type(module) == str and type(func) == str and self.dispatcher.loaded(module, func):
+            return module + '.' + func
+        return 'unknown'
+
+    def lookup(self, in_param):
+        """
+        :param in_param: the prepared request
+        :return: the handler function if resolved without I/O, None if resolve is needed
+        """
+        return self.dispatcher.lookup(in_param['request_module'], in_param['request_function'])
+
+    @staticmethod
+    def call(func, in_param):
+        """
+        Call the handler from sync serving mode, coroutine handlers are run to complete
+        :param func: the handler
+        :param in_param: the prepared request
+        :return: the handler result
+        """
+        resp = func(**in_param)
+        return asyncio.run(resp) if inspect.iscoroutine(resp) else resp
+
+    def memo_ttl(self, in_param, func):
+        """
+        :return: seconds to cache the handler result, None if the handler is not cacheable
+        """
+        return self.memo_handlers.get(self.handler_name(in_param), getattr(func, 'toby_cache_ttl', None))
+
+    def execute(self, func, in_param):
+        """
+        Execute the handler from sync serving mode, from the memoized result if cacheable
+        :param func: the handler
+        :param in_param: the prepared request
+        :return: the handler result
+        """
+        ttl = self.memo_ttl(in_param, func)
+        if ttl is None:
+            return self.call(func, in_param)
+        return self.memoizer.get_or_run(self.handler_name(in_param), in_param, ttl,
+                                        lambda: self.call(func, in_param))
+
+    @contextmanager
+    def admit(self, in_param):
+        """
+        Hold a slot of the handler while in the context, raise Overloaded (counted) if over its limits
+        :param in_param: the verified request
+        """
+        handler = self.handler_name(in_param)
+        try:
+            limit = self.admission.acquire(handler)
+        except Overloaded as e:
+            self.metrics.inc('toby_shed_total', (('handler', self.handler_label(in_param)), ('reason', e.reason)))
+            raise
+        try:
+            yield
+        finally:
+            self.admission.release(limit)
+
+    @staticmethod
+    def shed(e, request_id=None):
+        """
+        The response of the request shed by the admission control, not logged as error
+        :param e: the Overloaded error
+        :param request_id: the request id
+        :return: (the error envelope, http status, Retry-After seconds)
+        """
+        retry_after = max(1, math.ceil(e.retry_after))
+        return ({'request_id': request_id, 'request_status': 'error',
+                 'request_error': 'ax.exception.Overloaded: ' + e.message, 'retry_after': retry_after},
+                429 if e.reason == 'rate' else 503, retry_after)
+
+    def run(self, in_param, timer, verify=True):
+        """
+        Run one request with its own database connection, never raise
+        :param in_param: the request
+        :param timer: the RequestTimer of the request
+        :param verify: [Default to True] False if the token is verified already
+        :return: the handler result or the error envelope
+        """
+        request_id = None
+        db = LazyConnection(self.connect_db)
+        try:
+            request_id = self.prepare(in_param, db, verify=verify)
+            timer.handler = self.handler_label(in_param)
+            if verify:
+                timer.phase('token')
+            with self.admit(in_param):
+                func = self.resolve(in_param)
+                timer.handler = self.handler_name(in_param)
+                timer.phase('resolve')
+                resp = self.execute(func, in_param)
+            timer.phase('execute')
+        except Overloaded as e:
+            timer.status = 'shed'
+            resp = self.shed(e, request_id)[0]
+        except:
+            timer.status = 'error'
+            resp = self.error(request_id)
+        finally:
+            db.close()
+        return resp
+
+    def submit(self, in_param):
+        """
+        Submit the prepared request as an async job to Dask
+        :param in_param: the prepared request
+        :return: the submitted status
+        """
+        request_id = in_param['request_id']
+        job = {k: v for k, v in in_param.items() if k not in ('logger', 'get_db_connection', 'request_token')}
+        status = {'request_id': request_id, 'request_status': 'submitted'}
+        self.cache.put(job_key_prefix + request_id, val=status, expire=self.job_expire)
+        self.dask.async_task(run_job, job, self.cache_options, self.job_expire)
+        return status
+
+    def job_status(self, request_id):
+        """
+        :param request_id: the request id of the async job
+        :return: the status, or the result when done/ error
+        """
+        return self.cache.get(job_key_prefix + request_id) or {'request_id': request_id, 'request_status': 'unknown'}
+
+    def wait_intervals(self, timeout):
+        """
+        The poll intervals of a long-poll, backoff from 20ms to 500ms
+        :param timeout: seconds to wait, capped by result_max_wait
+        :return: [generator] seconds to sleep before next poll
+        """
+        deadline = current_sys_time() + min(max(timeout, 0), self.result_max_wait)
+        interval = 0.02
+        while current_sys_time() < deadline:
+            yield min(interval, max(deadline - current_sys_time(), 0))
+            interval = min(interval * 2, 0.5)
+
+    def wait_result(self, in_param, request_id, timeout=0):
+        """
+        Long-poll the async job until done/ error or timeout
+        :param in_param: the request (for token)
+        :param request_id: the request id of the async job
+        :param timeout: seconds to wait
+        :return: the status, or the result when done/ error
+        """
+        self.verify_token(in_param)
+        rtn = self.job_status(request_id)
+        for interval in self.wait_intervals(timeout):
+            if rtn['request_status'] not in job_pending_status:
+                break
+            time.sleep(interval)
+            rtn = self.job_status(request_id)
+        return rtn
+
+    def prepare_batch(self, requests):
+        """
+        Verify the batch, each distinct token is verified once & each request gets its request id
+        * a request with a missing/ invalid token gets an error line, the others of the batch still run
+        :param requests: list of requests
+        :return: (the requests to run, the NDJSON error lines of the requests with an invalid token)
+        """
+        if type(requests) != list or any(type(r) != dict for r in requests):
+            raise InvalidRequest('Batch should be an array of request objects')
+        if len(requests) > self.batch_max_size:
+            raise InvalidRequest('Batch size ' + str(len(requests)) + ' exceeds ' + str(self.batch_max_size))
+        # the token is verified as str, e.g. a missing token as 'None'
+        errors = dict()
+        for token in {str(r.get('request_token')) for r in requests}:
+            try:
+                self.verify_token({'request_token': token})
+            except:
+                errors[token] = self.error()
+        valid, lines = [], []
+        for r in requests:
+            if 'request_id' not in r:
+                r['request_id'] = get_uuid()
+            error = errors.get(str(r.get('request_token')))
+            if error is None:
+                valid.append(r)
+            else:
+                lines.append(self.batch_line(r['request_id'], {**error, 'request_id': r['request_id']}))
+        return valid, lines
+
+    def dumps(self, resp):
+        """
+        :param resp: the response
+        :return: json bytes
+        """
+        return self.encoder.json.encode(resp)
+
+    def encode(self, resp, accept=None):
+        """
+        Encode the response by the Accept header, the error envelope in json if the response could not be encoded
+        :param resp: the response
+        :param accept: the Accept header
+        :return: (body bytes, content type)
+        """
+        try:
+            return self.encoder.encode(resp, accept)
+        except:
+            return self.dumps(self.error(resp.get('request_id') if isinstance(resp, dict) else None)), 'application/json'
+
+    def batch_line(self, request_id, resp):
+        """
+        :return: one NDJSON line of the batch result, the error envelope if the result could not be encoded
+        """
+        try:
+            return self.dumps({'request_id': request_id, 'response': resp}) + b'\n'
+        except:
+            return self.dumps({'request_id': request_id, 'response': self.error(request_id)}) + b'\n'
+
+    def error(self, request_id=None):
+        """
+        Capture & log current error
+        :param request_id: the request id if known
+        :return: the error envelope
+        """
+        e = trace_error(self.logger)
+        return {'request_id': request_id, 'request_status': 'error', 'request_error': str(e[-1])}
+
+    def stats(self, in_param):
+        """
+        The stats of current process
+        :param in_param: the request (for token)
+        :return: the response
+        """
+        self.verify_token(in_param)
+        return {'request_status': 'ok', 'pid': os.getpid(), 'token': self.token_cache.stats(),
+                'dispatch': self.dispatcher.stats(), 'memo': self.memoizer.stats, 'db_pool': get_pool_status(),
+                'admission': self.admission.stats(), 'redis_pool': get_redis_pool_status()}
+
+    def reload(self, in_param):
+        """
+        Reload the given request_module, or all loaded handler modules
+        :param in_param: the request
+        :return: the response
+        """
+        self.verify_token(in_param)
+        return {'request_status': 'ok', 'reloaded': self.dispatcher.reload(in_param.get('request_module')),
+                **self.dispatcher.stats()}
+
+
+def build_gateway(logger):
+    """
+    Build the gateway from environment variables
+    :param logger: the logger
+    :return: the Gateway
+    """
+    token_ttl = os.getenv('TOBY_TOKEN_TTL')
+    return Gateway(os.environ['TOBY_TOKEN'], logger,
+                   token_cache_size=int(os.getenv('TOBY_TOKEN_CACHE_SIZE', '4096')),
+                   token_cache_ttl=float(os.getenv('TOBY_TOKEN_CACHE_TTL', '300')),
+                   token_ttl=int(token_ttl) if token_ttl else None,
+                   reload_check_interval=float(os.getenv('TOBY_RELOAD_CHECK_INTERVAL', '1')),
+                   # pool per worker process, sized to its threads
+                   db_pool_size=int(os.getenv('TOBY_DB_POOL_SIZE', '8')),
+                   db_pool_overflow=int(os.getenv('TOBY_DB_POOL_OVERFLOW', '4')),
+                   batch_max_size=int(os.getenv('TOBY_BATCH_MAX_SIZE', '1000')),
+                   cache_options={'host': os.getenv('TOBY_REDIS_HOST', 'localhost'),
+                                  'port': int(os.getenv('TOBY_REDIS_PORT', '12116')),
+                                  'db': int(os.getenv('TOBY_REDIS_DB', '11'))},
+                   dask_options={'host': os.getenv('TOBY_DASK_HOST', 'tcp://127.0.0.1'),
+                                 'port': int(os.getenv('TOBY_DASK_PORT', '8786'))},
+                   job_expire=int(os.getenv('TOBY_JOB_EXPIRE', '3600')),
+                   result_max_wait=float(os.getenv('TOBY_RESULT_MAX_WAIT', '30')),
+                   datetime_format=os.getenv('TOBY_JSON_DATETIME', 'http'),
+                   # e.g. TOBY_MEMO_HANDLERS=handlers.lookup.get_user=60,handlers.lookup.get_device=300
+                   memo_handlers={h.split('=')[0]: int(h.split('=')[1])
+                                  for h in os.getenv('TOBY_MEMO_HANDLERS', '').split(',') if h},
+                   # the gunicorn worker timeout by default
+                   memo_wait=float(os.getenv('TOBY_MEMO_WAIT', '30')),
+                   metrics_dir=os.getenv('TOBY_METRICS_DIR', default_metrics_dir),
+                   # e.g. TOBY_CONCURRENCY_LIMITS=handlers.report.monthly=4,*=16
+                   concurrency_limits={h.split('=')[0]: int(h.split('=')[1])
+                                       for h in os.getenv('TOBY_CONCURRENCY_LIMITS', '').split(',') if h},
+                   # requests per second[:burst], e.g. TOBY_RATE_LIMITS=handlers.report.monthly=2:5
+                   rate_limits={h.split('=')[0]: (float(h.split('=')[1].split(':')[0]),
+                                                  float(h.split('=')[1].split(':')[1]) if ':' in h else None)
+                                for h in os.getenv('TOBY_RATE_LIMITS', '').split(',') if h},
+                   retry_after=int(os.getenv('TOBY_RETRY_AFTER', '1')))
@@ -0,0 +1,298 @@
+"""
+The metrics shared by all worker processes (e.g. gunicorn workers), exported in Prometheus text format
+
+__author__ = "Alex Xiao <http://www.alexxiao.me/>"
+__date__ = "2026-10-18"
+__version__ = "0.2"
+
+    Version:
+        0.1 (18/10/2026): mmap-backed counters & histograms, one file per process, summed on export
+        0.2 (18/10/2026): the store keys are built once per name & labels, the inherited store is closed after fork
+
+Each process writes its own mmap file in the metrics folder (no cross-process lock on the hot path), export reads
+& sums the files of all processes. The folder should be emptied before the server (re)starts, e.g. in start.sh
+
+Classes:
+    MmapStore - the mmap-backed {key: float} of one process
+    Metrics - counters & histograms, export in Prometheus text format
+    RequestTimer - time the phases of one request
+"""
+import os
+import json
+import mmap
+import glob
+import struct
+import weakref
+import tempfile
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+
+default_metrics_dir = os.path.join(tempfile.gettempdir(), 'toby_metrics')
+default_buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# the instances of the process, their stores are closed in the forked child
+_instances = weakref.WeakSet()
+
+
+def _close_after_fork():
+    # the lock may be held by a thread of the parent, the store (file & mmap) of the parent is not written by the child
+    for metrics in list(_instances):
+        metrics._lock = threading.Lock()
+        if metrics._store is not None:
+            metrics._store.close()
+            metrics._store = None
+            metrics._pid = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_close_after_fork)
+
+
+def read_entries(buf):
+    """
+    Read all entries of the store buffer
+    Layout: [used bytes u32][pad u32] then entries of [key length u32][key utf-8, padded to 8 bytes][value f64]
+    :param buf: the mmap/ bytes
+    :return: [generator] key, value, position of value
+    """
+    used = struct.unpack_from('I', buf, 0)[0]
+    pos = 8
+    while pos < used:
+        length = struct.unpack_from('I', buf, pos)[0]
+        key = bytes(buf[pos + 4:pos + 4 + length]).decode()
+        pos += 4 + length
+        pos += (8 - pos % 8) % 8
+        yield key, struct.unpack_from('d', buf, pos)[0], pos
+        pos += 8
+
+
+class MmapStore:
+    """
+    The mmap-backed {key: float} of one process, not thread safe
+    """
+    def __init__(self, file_name, initial_size=64 * 1024):
+        self.file_name = file_name
+        self._f = open(file_name, 'a+b')
+        if os.fstat(self._f.fileno()).st_size == 0:
+            self._f.truncate(initial_size)
+        self._capacity = os.fstat(self._f.fileno()).st_size
+        self._m = mmap.mmap(self._f.fileno(), self._capacity)
+        self._used = struct.unpack_from('I', self._m, 0)[0] or 8
+        self._positions = {key: pos for key, _, pos in read_entries(self._m)}
+
+    def _add_key(self, key):
+        encoded = key.encode()
+        size = 4 + len(encoded)
+        size += (8 - (self._used + size) % 8) % 8
+        if self._used + size + 8 > self._capacity:
+            while self._used + size + 8 > self._capacity:
+                self._capacity *= 2
+            self._m.close()
+            self._f.truncate(self._capacity)
+            self._m = mmap.mmap(self._f.fileno(), self._capacity)
+        struct.pack_into('I', self._m, self._used, len(encoded))
+        self._m[self._used + 4:self._used + 4 + len(encoded)] = encoded
+        pos = self._used + size
+        struct.pack_into('d', self._m, pos, 0.0)
+        self._used = pos + 8
+        # readers only see the entry once it is complete
+        struct.pack_into('I', self._m, 0, self._used)
+        self._positions[key] = pos
+        return pos
+
+    def inc(self, key, amount=1.0):
+        pos = self._positions.get(key)
+        if pos is None:
+            pos = self._add_key(key)
+        struct.pack_into('d', self._m, pos, struct.unpack_from('d', self._m, pos)[0] + amount)
+
+    def close(self):
+        self._m.close()
+        self._f.close()
+
+
+def format_labels(labels):
+    return '{' + ','.join(k + '="' + str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+                          for k, v in labels) + '}' if labels else ''
+
+
+class RequestTimer:
+    """
+    Time the phases of one request, recorded to the metrics once done
+    """
+    __slots__ = ('metrics', 'start', 'last', 'phases', 'handler', 'status')
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.start = self.last = perf_counter()
+        self.phases = []
+        self.handler = None
+        self.status = 'ok'
+
+    def phase(self, name):
+        """
+        End the current phase
+        :param name: the phase name
+        :return: N/A
+        """
+        ts = perf_counter()
+        self.phases.append((name, ts - self.last))
+        self.last = ts
+
+    def done(self):
+        """
+        Record the request, with the handler & status of the timer
+        :return: N/A
+        """
+        self.phases.append(('total', perf_counter() - self.start))
+        self.metrics.record_request(self.handler, self.status, self.phases)
+
+
+class Metrics:
+    """
+    Counters & histograms of the process, exported with the other processes' in Prometheus text format
+    """
+    def __init__(self, path=default_metrics_dir, buckets=default_buckets):
+        """
+        :param path: the metrics folder shared by all processes
+        :param buckets: the upper bounds of histogram buckets in seconds
+        """
+        self.path = path
+        self.buckets = buckets
+        self.descriptions = dict()
+        self._store = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # {(name, labels): store key} & {(name, labels): (bucket keys, sum key, count key)}, the labels are bounded
+        self._keys = dict()
+        self._histogram_keys = dict()
+        os.makedirs(path, exist_ok=True)
+        _instances.add(self)
+        self.describe('toby_requests_total', 'counter', 'Requests by handler & status')
+        self.describe('toby_request_phase_seconds', 'histogram',
+                      'Request latency by handler & phase (token, resolve, execute, serialize, total)')
+
+    def describe(self, name, metric_type, help_text):
+        """
+        Describe the metric for export
+        :param name: the metric name
+        :param metric_type: counter/ gauge/ histogram
+        :param help_text: the help text
+        :return: N/A
+        """
+        self.descriptions[name] = (metric_type, help_text)
+
+    def _get_store(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            # first use, or forked
+            self._store = MmapStore(os.path.join(self.path, 'metrics_' + str(pid) + '.db'))
+            self._pid = pid
+        return self._store
+
+    def _key(self, name, labels):
+        key = self._keys.get((name, labels))
+        if key is None:
+            key = self._keys[(name, labels)] = json.dumps([name, labels])
+        return key
+
+    def _get_histogram_keys(self, name, labels):
+        keys = self._histogram_keys.get((name, labels))
+        if keys is None:
+            keys = self._histogram_keys[(name, labels)] = (
+                tuple(json.dumps([name + '_bucket', labels + (('le', le),)])
+                      for le in [str(b) for b in self.buckets] + ['+Inf']),
+                json.dumps([name + '_sum', labels]), json.dumps([name + '_count', labels]))
+        return keys
+
+    def inc(self, name, labels=(), amount=1.0):
+        """
+        Increase the counter
+        :param name: the metric name
+        :param labels: tuple of (label name, value)
+        :param amount: [Default to 1]
+        :return: N/A
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self._get_store().inc(key, amount)
+
+    def _observe(self, store, name, labels, seconds):
+        buckets, sum_key, count_key = self._get_histogram_keys(name, labels)
+        store.inc(buckets[bisect_left(self.buckets, seconds)], 1.0)
+        store.inc(sum_key, seconds)
+        store.inc(count_key, 1.0)
+
+    def observe(self, name, labels, seconds):
+        """
+        Observe the value of the histogram
+        :param name: the metric name
+        :param labels: tuple of (label name, value)
+        :param seconds: the value
+        :return: N/A
+        """
+        with self._lock:
+            self._observe(self._get_store(), name, labels, seconds)
+
+    def record_request(self, handler, status, phases):
+        """
+        Record one request
+        :param handler: the handler name
+        :param status: ok/ error
+        :param phases: list of (phase, seconds)
+        :return: N/A
+        """
+        handler = handler or 'unknown'
+        with self._lock:
+            store = self._get_store()
+            store.inc(self._key('toby_requests_total', (('handler', handler), ('status', status))), 1.0)
+            for phase, seconds in phases:
+                self._observe(store, 'toby_request_phase_seconds', (('handler', handler), ('phase', phase)), seconds)
+
+    def timer(self):
+        """
+        :return: the RequestTimer for a new request
+        """
+        return RequestTimer(self)
+
+    def collect(self):
+        """
+        Sum the values of all processes
+        :return: {(name, labels): value}
+        """
+        rtn = dict()
+        for file_name in glob.glob(os.path.join(self.path, 'metrics_*.db')):
+            with open(file_name, 'rb') as f:
+                buf = f.read()
+            if len(buf) < 8:
+                continue
+            for key, value, _ in read_entries(buf):
+                name, labels = json.loads(key)
+                k = (name, tuple(tuple(label) for label in labels))
+                rtn[k] = rtn.get(k, 0.0) + value
+        return rtn
+
+    def export(self):
+        """
+        :return: all metrics in Prometheus text format
+        """
+        values = self.collect()
+        lines = []
+        for name, (metric_type, help_text) in sorted(self.descriptions.items()):
+            lines.append('# HELP ' + name + ' ' + help_text)
+            lines.append('# TYPE ' + name + ' ' + metric_type)
+            if metric_type != 'histogram':
+                for (n, labels), value in sorted(values.items()):
+                    if n == name:
+                        lines.append(name + format_labels(labels) + ' ' + repr(value))
+                continue
+            series = sorted(labels for n, labels in values if n == name + '_count')
+            for labels in series:
+                cumulative = 0.0
+                for le in [str(b) for b in self.buckets] + ['+Inf']:
+                    cumulative += values.get((name + '_bucket', labels + (('le', le),)), 0.0)
+                    lines.append(name + '_bucket' + format_labels(labels + (('le', le),)) + ' ' + repr(cumulative))
+                lines.append(name + '_sum' + format_labels(labels) + ' ' + repr(values[(name + '_sum', labels)]))
+                lines.append(name + '_count' + format_labels(labels) + ' ' + repr(values[(name + '_count', labels)]))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,174 @@
+"""
+The serializers of Cache/ Queue payloads
+
+__author__ = "Alex Xiao <http://www.alexxiao.me/>"
+__date__ = "2026-10-18"
+__version__ = "0.2"
+
+    Version:
+        0.1 (18/10/2026): pickle protocol 5 (out-of-band buffers)/ msgpack/ json, optional lz4/ zstd compression
+        0.2 (18/10/2026): legacy by default until all the readers are upgraded
+
+Payload: [header byte][body], the header byte is format id | compression id << 3, never 0x80 so the payloads of the
+old pickle.dumps (protocol 2+ starts with 0x80) are still loaded, both can coexist in redis during rollout.
+The 'legacy' serializer writes the old header-less pickle, for readers not upgraded yet, it is the default.
+
+Rollout in two steps, as the old code loads the payloads by plain pickle.loads only:
+    1. deploy the new code everywhere with the default (legacy), it loads both the old & new payloads
+    2. once no old reader is left, switch the writers, e.g. TOBY_REDIS_SERIALIZER=pickle:lz4
+
+pickle body: [buffer count u32][length u64 of the pickle & each out-of-band buffer][pickle][buffers]
+    the numpy arrays/ DataFrames are loaded from the buffers without copy, they are read-only views of the payload
+    (unlike the legacy pickle), np.array(a) or a.copy() to modify them
+
+Classes:
+    Serializer - dumps with the configured format & compression, loads any payload
+"""
+import os
+import json
+import struct
+import pickle
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+_legacy_header = 0x80
+
+
+def pickle_dumps(obj):
+    buffers = []
+    data = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    parts = [data] + [b.raw() for b in buffers]
+    return b''.join([struct.pack('<I' + 'Q' * len(parts), len(buffers), *[len(p) for p in parts])] + parts)
+
+
+def pickle_loads(body):
+    body = memoryview(body)
+    count = struct.unpack_from('<I', body, 0)[0]
+    lengths = struct.unpack_from('<' + 'Q' * (count + 1), body, 4)
+    pos = 4 + 8 * (count + 1)
+    parts = []
+    for length in lengths:
+        parts.append(body[pos:pos + length])
+        pos += length
+    return pickle.loads(parts[0], buffers=parts[1:])
+
+
+def msgpack_dumps(obj):
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def msgpack_loads(body):
+    return msgpack.unpackb(body, raw=False)
+
+
+def json_dumps(obj):
+    return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY) if orjson else json.dumps(obj).encode()
+
+
+def json_loads(body):
+    return orjson.loads(body) if orjson else json.loads(bytes(body))
+
+
+# format id: (name, dumps, loads)
+formats = {1: ('pickle', pickle_dumps, pickle_loads),
+           2: ('msgpack', msgpack_dumps, msgpack_loads),
+           3: ('json', json_dumps, json_loads)}
+format_ids = {name: fid for fid, (name, _, _) in formats.items()}
+# compression id: (name, compress, decompress)
+compressions = {0: (None, None, None),
+                1: ('lz4', lambda b, level: lz4.frame.compress(b, compression_level=level or 0),
+                    lambda b: lz4.frame.decompress(b)),
+                2: ('zstd', lambda b, level: zstandard.ZstdCompressor(level=level or 3).compress(b),
+                    lambda b: zstandard.ZstdDecompressor().decompress(b))}
+compression_ids = {name: cid for cid, (name, _, _) in compressions.items()}
+
+
+def loads(payload):
+    """
+    Load the payload of any serializer, incl. the old header-less pickle
+    :param payload: the bytes
+    :return: the object
+    """
+    header = payload[0]
+    if header == _legacy_header:
+        return pickle.loads(payload)
+    fid, cid = header & 0x07, header >> 3
+    if fid not in formats or cid not in compressions:
+        raise ValueError('Unknown payload header ' + hex(header))
+    body = memoryview(payload)[1:]
+    if cid:
+        body = compressions[cid][2](body)
+    return formats[fid][2](body)
+
+
+class Serializer:
+    """
+    Dumps with the configured format & compression, loads any payload
+    """
+    def __init__(self, fmt='legacy', compression=None, compress_threshold=16384, level=None):
+        """
+        :param fmt: [Default to legacy] legacy (old header-less pickle, no compression), pickle (protocol 5, arrays
+         loaded read-only), msgpack, or json
+        :param compression: [Default to None] lz4 or zstd
+        :param compress_threshold: [Default to 16KiB] min body size to compress
+        :param level: [Default to None] the compression level, default of the library if None
+        """
+        if fmt != 'legacy' and fmt not in format_ids:
+            raise ValueError('Unknown serializer format ' + str(fmt))
+        if compression not in compression_ids:
+            raise ValueError('Unknown compression ' + str(compression))
+        if fmt == 'legacy' and compression:
+            raise ValueError('The legacy format is not compressed, old readers could not load it')
+        if (fmt == 'msgpack' and msgpack is None) or (compression == 'lz4' and lz4 is None) or \
+                (compression == 'zstd' and zstandard is None):
+            raise ValueError('The library of ' + fmt + '/ ' + str(compression) + ' is not installed')
+        self.fmt = fmt
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+        self.level = level
+        self._fid = format_ids.get(fmt)
+        self._cid = compression_ids[compression]
+
+    def dumps(self, obj):
+        """
+        :param obj: the object
+        :return: the payload bytes
+        """
+        if self._fid is None:
+            return pickle.dumps(obj)
+        body = formats[self._fid][1](obj)
+        if self._cid and len(body) >= self.compress_threshold:
+            return bytes((self._fid | self._cid << 3,)) + compressions[self._cid][1](body, self.level)
+        return bytes((self._fid,)) + body
+
+    @staticmethod
+    def loads(payload):
+        return loads(payload)
+
+
+def get_serializer(spec=None):
+    """
+    Build the serializer from spec format[:compression[:threshold]], e.g. pickle:lz4:65536
+    :param spec: [Default to TOBY_REDIS_SERIALIZER or legacy] the spec, or a Serializer
+    :return: the Serializer
+    """
+    if isinstance(spec, Serializer):
+        return spec
+    parts = (spec or os.getenv('TOBY_REDIS_SERIALIZER', 'legacy')).split(':')
+    return Serializer(parts[0], compression=parts[1] if len(parts) > 1 and parts[1] else None,
+                      compress_threshold=int(parts[2]) if len(parts) > 2 else 16384)
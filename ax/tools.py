@@ -9,12 +9,18 @@ __version__ = "0.2"
         0.1 (1/7/2017): implemented run_thread, run_thread, search_paragraph
         0.2 (3/3/2018): moved date related function to datetime, added retry
         0.3 (25/4/2019): encrypt/ decrypt
+        0.4 (18/10/2026): FunctionCache - cached dispatch table for load_function
+        0.5 (18/10/2026): TokenCache - LRU cache of verified tokens
+        0.6 (18/10/2026): cacheable - mark gateway handler result cacheable
 
 Functions List:
 
     get_ngrok_url - return ngrok information
     get_public_ip -  return current machine's public ip
     retry - [decorator] to try to run function x time
+    cacheable - [decorator] mark the handler as idempotent, the gateway caches its result
+    FunctionCache - [class] resolve (module, function) once, reload only when source changed
+    TokenCache - [class] verify request tokens once, LRU cache the verified digests
     search_paragraph - [generator] return paragraph between start/end keywords
 
 """
@@ -24,17 +30,23 @@ from .log import trace_error
 import ax.datetime as ax_datetime
 import threading
 import time
+from time import time as current_time
 from requests import get
 import inspect
 import sys
 import importlib
+import hashlib
+import hmac
+import base64
+import struct
 import uuid
 import os
-from cryptography.fernet import Fernet
+from collections import OrderedDict
+from cryptography.fernet import Fernet, InvalidToken as InvalidFernetToken
 
 
 # the fernet for encrypt/ decrypt
-_fernet = Fernet(os.getenv('TOBY_ENCRYPT_KEY') or Fernet.generate_key().decode()).encode()
+_fernet = Fernet(os.getenv('TOBY_ENCRYPT_KEY') or Fernet.generate_key())
 
 
 def encrypt(value):
@@ -46,17 +58,131 @@ def encrypt(value):
     return _fernet.encrypt(value.encode() if type(value) != bytes else value)
 
 
-def decrypt(value, output_decode_flag=True):
+def decrypt(value, output_decode_flag=True, ttl=None):
     """
     Decrypt
     :param value: the encrypted value
     :param output_decode_flag: default to True; the flag of if to decode output
+    :param ttl: [optional] max age in seconds of the encrypted value, based on its fernet timestamp
     :return: the decrypted output
     """
-    o = _fernet.decrypt(value)
+    o = _fernet.decrypt(value, ttl=ttl)
     return o.decode() if output_decode_flag else o
 
 
+def get_token_timestamp(value):
+    """
+    The timestamp of the encrypted value (fernet token), not verified
+    :param value: the encrypted value
+    :return: timestamp in seconds
+    """
+    raw = base64.urlsafe_b64decode(value if type(value) == bytes else value.encode())
+    return struct.unpack('>Q', raw[1:9])[0]
+
+
+class TokenCache:
+    """
+    Bounded LRU cache of verified request tokens
+    * a token is fully verified (decrypt & compare) once, then accepted by its sha256 digest until expired
+    * invalid tokens are negative cached, the rejected digests are refused without verification
+    * after too many failures (e.g. a flood of forged tokens) unknown tokens are refused without verification
+      until the failure window resets, the tokens already accepted are still accepted
+    """
+    def __init__(self, expected, max_size=4096, ttl=300, token_ttl=None, negative_ttl=60, max_failures=100,
+                 failure_window=1.0):
+        """
+        :param expected: the expected decrypted token value
+        :param max_size: [Default to 4096] max number of accepted/ rejected digests to keep
+        :param ttl: [Default to 300] seconds to keep a verified token
+        :param token_ttl: [Default to None] max age of the token from its fernet timestamp, None for no limit
+        :param negative_ttl: [Default to 60] seconds to keep a rejected token
+        :param max_failures: [Default to 100] max failed verifications in the failure_window, unknown tokens are
+         refused once reached, 0 for no limit
+        :param failure_window: [Default to 1 second] the window for max_failures
+        """
+        self.expected = expected
+        self.max_size = max_size
+        self.ttl = ttl
+        self.token_ttl = token_ttl
+        self.negative_ttl = negative_ttl
+        self.max_failures = max_failures
+        self.failure_window = failure_window
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self.throttled = 0
+        self._accepted = OrderedDict()
+        self._rejected = OrderedDict()
+        self._failures = 0
+        self._window_start = 0.0
+        self._lock = threading.Lock()
+
+    def _remember(self, store, digest, expire_at):
+        store[digest] = expire_at
+        store.move_to_end(digest)
+        while len(store) > self.max_size:
+            store.popitem(last=False)
+
+    def verify(self, value, cached_only=False):
+        """
+        Verify the token
+        :param value: the encrypted token
+        :param cached_only: [Default to False] True to answer from the cache only, no decrypt (e.g. on event loop)
+        :return: True if valid, None if cached_only & the token needs the full verification
+        """
+        value = value if type(value) == bytes else str(value).encode()
+        digest = hashlib.sha256(value).digest()
+        ts = current_time()
+        with self._lock:
+            expire_at = self._accepted.get(digest)
+            if expire_at is not None:
+                if expire_at > ts:
+                    self._accepted.move_to_end(digest)
+                    self.hits += 1
+                    return True
+                del self._accepted[digest]
+            expire_at = self._rejected.get(digest)
+            if expire_at is not None and expire_at > ts:
+                self.rejected += 1
+                return False
+            if ts - self._window_start > self.failure_window:
+                self._window_start = ts
+                self._failures = 0
+            if self.max_failures and self._failures >= self.max_failures:
+                # not negative cached, a valid token is accepted once the window resets
+                self.throttled += 1
+                return False
+            if cached_only:
+                return None
+            self.misses += 1
+        valid = self._decrypt_verify(value)
+        with self._lock:
+            if valid:
+                expire_at = ts + self.ttl
+                if self.token_ttl is not None:
+                    expire_at = min(expire_at, get_token_timestamp(value) + self.token_ttl)
+                self._remember(self._accepted, digest, expire_at)
+            else:
+                self._failures += 1
+                self.rejected += 1
+                self._remember(self._rejected, digest, ts + self.negative_ttl)
+        return valid
+
+    def _decrypt_verify(self, value):
+        try:
+            return hmac.compare_digest(decrypt(value, output_decode_flag=False, ttl=self.token_ttl),
+                                       self.expected.encode())
+        except InvalidFernetToken:
+            return False
+
+    def stats(self):
+        """
+        :return: the verification counters & cache sizes
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'rejected': self.rejected, 'throttled': self.throttled,
+                'accepted_size': len(self._accepted), 'rejected_size': len(self._rejected)}
+
+
 def get_uuid():
     return uuid.uuid4().hex
 
@@ -113,7 +239,7 @@ def load_module(module, logger=None, force_reload=True):
             if logger:
                 logger.info('Use existing module' + module)
             return sys.modules[module]
-    else:
+    elif logger:
         logger.info('New module, loading ' + module)
     return importlib.import_module(module)
 
@@ -133,6 +259,168 @@ def load_function(module, func, logger=None, force_reload=True):
     return mod.__dict__[func]
 
 
+class FunctionCache:
+    """
+    The dispatch table of loaded functions, keyed by (module, function)
+    * a function is resolved once, its module is reloaded only when the source file changed
+      (mtime & hash) or reload() is called explicitly
+    """
+    def __init__(self, logger=None, check_interval=1.0):
+        """
+        :param logger: [optional] for logging info
+        :param check_interval: [Default to 1 second] min seconds between source file checks of a module
+        """
+        self.logger = logger
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self._functions = dict()
+        self._modules = dict()
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _digest(file_name):
+        with open(file_name, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def _track(self, module, mod):
+        file_name = getattr(mod, '__file__', None)
+        entry = {'module': mod, 'file': file_name, 'mtime': None, 'digest': None, 'checked': current_time()}
+        if file_name and os.path.isfile(file_name):
+            entry['mtime'] = os.stat(file_name).st_mtime
+            entry['digest'] = self._digest(file_name)
+        self._modules[module] = entry
+        return mod
+
+    def _is_stale(self, module):
+        """
+        Compare the mtime of the source file only, at most once per check_interval, the entry is updated by _refresh
+        """
+        entry = self._modules[module]
+        ts = current_time()
+        if entry['mtime'] is None or ts - entry['checked'] < self.check_interval:
+            return False
+        entry['checked'] = ts
+        try:
+            return os.stat(entry['file']).st_mtime != entry['mtime']
+        except OSError:
+            return False
+
+    def _refresh(self, module):
+        """
+        Reload the module if its source has changed, under the lock, the mtime is updated after the import succeeds
+        * a failed reload keeps the functions loaded before, retried at the next check
+        """
+        entry = self._modules[module]
+        try:
+            mtime = os.stat(entry['file']).st_mtime
+            digest = self._digest(entry['file'])
+        except OSError:
+            return
+        if mtime == entry['mtime']:
+            # reloaded by another thread already
+            return
+        if digest == entry['digest']:
+            # touched only, the source is the same
+            entry['mtime'] = mtime
+            return
+        try:
+            self._reload(module)
+        except:
+            if self.logger:
+                trace_error(self.logger)
+
+    def _reload(self, module):
+        mod = self._track(module, load_module(module, logger=self.logger, force_reload=True))
+        for key in [k for k in self._functions if k[0] == module]:
+            del self._functions[key]
+        self.reloads += 1
+        return mod
+
+    def lookup(self, module, func):
+        """
+        The function from the dispatch table without any I/O, for the event loop
+        :param module: Module full name e.g. ax.datetime
+        :param func: the function of the module
+        :return: the function, None if not loaded yet or the source file is due to check (then use resolve)
+        """
+        fn = self._functions.get((module, func))
+        if fn is None:
+            return None
+        entry = self._modules.get(module)
+        if entry is None or (entry['mtime'] is not None and current_time() - entry['checked'] >= self.check_interval):
+            return None
+        self.hits += 1
+        return fn
+
+    def resolve(self, module, func):
+        """
+        Resolve the function from the dispatch table, load/ reload the module when needed
+        :param module: Module full name e.g. ax.datetime
+        :param func: the function of the module
+        :return: the function
+        """
+        fn = self._functions.get((module, func))
+        if fn is not None and not self._is_stale(module):
+            self.hits += 1
+            return fn
+        with self._lock:
+            self.misses += 1
+            if module not in self._modules:
+                self._track(module, load_module(module, logger=self.logger, force_reload=False))
+            elif fn is not None:
+                # the source file has changed
+                self._refresh(module)
+            latest = self._functions.get((module, func))
+            if latest is not None:
+                # the same if the reload failed, or reloaded by another thread
+                return latest
+            if self.logger:
+                self.logger.info('Getting function ' + func)
+            fn = self._modules[module]['module'].__dict__[func]
+            self._functions[(module, func)] = fn
+        return fn
+
+    def loaded(self, module, func):
+        """
+        :return: True if the function is in the dispatch table, no I/O
+        """
+        return (module, func) in self._functions
+
+    def reload(self, module=None):
+        """
+        Reload module(s) explicitly
+        :param module: [Default to None] the module to be reloaded, None to reload all loaded modules
+        :return: list of reloaded modules
+        """
+        with self._lock:
+            modules = list(self._modules) if module is None else [module]
+            for mod in modules:
+                self._reload(mod)
+        return modules
+
+    def stats(self):
+        """
+        :return: the resolve hits/ misses/ reloads and loaded functions
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'reloads': self.reloads,
+                'functions': ['.'.join(k) for k in self._functions]}
+
+
+def cacheable(ttl=60):
+    """
+    Mark the handler as idempotent, the gateway caches its result by request parameters (without request_id/
+    request_timestamp/ request_token) for ttl seconds
+    :param ttl: [Default to 60] seconds to cache the result
+    :return:
+    """
+    def decorator(func):
+        func.toby_cache_ttl = ttl
+        return func
+    return decorator
+
+
 def retry(max_retry_times, logger=None, retry_interval=1.0, pass_retry_param_name=None):
     """
     Retry the function for certain, if still fail, raise MaxRetryReached Exception
@@ -2,26 +2,168 @@
 The redis components for Cache/ Queue
 
 __author__ = "Alex Xiao <http://www.alexxiao.me/>"
-__date__ = "2018-03-03"
-__version__ = "0.2"
+__date__ = "2026-10-18"
+__version__ = "0.12"
 
     Version:
         0.1 (10/12/2017): implemented basic definition
         0.2 (03/03/2018): added timeout to pubsub
+        0.3 (18/10/2026): bulk operations of Cache (MGET/ HMGET/ pipelines), put with expire in one atomic round trip
+        0.4 (18/10/2026): pluggable serializers (ax.serializer) per instance/ key prefix
+        0.5 (18/10/2026): NearCache, in-process LRU/ TTL tier with invalidation by client side caching/ keyspace
+        0.6 (18/10/2026): iter_items/ iter_subitems, streaming iteration of keys/ sub keys & values
+        0.7 (18/10/2026): reliable queue on Streams consumer group, ack/ visibility timeout/ dead letter/ stats
+        0.8 (18/10/2026): RpcClient/ RpcServer, Queue.pubsub subscribes before publish
+        0.9 (18/10/2026): process-wide connection pool registry (get_pool), shared by all components
+        0.10 (18/10/2026): Cache.get_or_compute, stampede protection by redis lock & XFetch early refresh
+        0.11 (18/10/2026): buffered count, flushed in one pipeline periodically/ by size/ at exit
+        0.12 (18/10/2026): Queue.push_many/ pop_many, many messages in one RPUSH/ LPOP
 
 
+Functions:
+    get_pool - the process-wide connection pool, shared by the components with the same server & options
+    get_pool_status - the usage counters of all pools
+
 Classes:
     Cache - To access redis cache
+    NearCache - Cache with an in-process tier in front of get, invalidated by the writes of any node
     PubSub - To access redis pub/sub queues
+    RpcClient/ RpcServer - request/ reply over pub/sub, multiplexed by correlation id
 """
 import os
-import pickle
+import math
+import atexit
+import weakref
+import time
+import uuid
+import random
+import heapq
+import socket
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, InvalidStateError
+from collections import OrderedDict
 import redis
-from ax.exception import Timeout
+from ax.log import trace_error
+from ax.serializer import get_serializer, loads
+from ax.exception import Timeout, BotError
 from ax.datetime import current_sys_time
 from ax.base import Connector
 
 
+_pools = dict()
+_pools_lock = threading.Lock()
+default_pool_options = {'max_connections': int(os.getenv('TOBY_REDIS_MAX_CONNECTIONS', '50')),
+                        'timeout': float(os.getenv('TOBY_REDIS_POOL_TIMEOUT', '20')),
+                        'health_check_interval': int(os.getenv('TOBY_REDIS_HEALTH_CHECK_INTERVAL', '30'))}
+
+
+class CountingConnectionPool(redis.BlockingConnectionPool):
+    """
+    The blocking connection pool (waits up to timeout for a free connection once max_connections are in use),
+    with the usage counters
+    """
+    def __init__(self, **kwargs):
+        redis.BlockingConnectionPool.__init__(self, **kwargs)
+        self.stats = {'borrowed': 0, 'in_use': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+        self._stats_lock = threading.Lock()
+
+    def reset(self):
+        redis.BlockingConnectionPool.reset(self)
+        # also called in the child after fork
+        self.stats = {'borrowed': 0, 'in_use': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+        self._stats_lock = threading.Lock()
+
+    def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        connection = redis.BlockingConnectionPool.get_connection(self, *args, **kwargs)
+        wait = time.perf_counter() - start
+        with self._stats_lock:
+            self.stats['borrowed'] += 1
+            self.stats['in_use'] += 1
+            self.stats['wait_total'] += wait
+            self.stats['wait_max'] = max(self.stats['wait_max'], wait)
+        return connection
+
+    def release(self, connection):
+        if connection.pid == self.pid:
+            with self._stats_lock:
+                self.stats['in_use'] -= 1
+        redis.BlockingConnectionPool.release(self, connection)
+
+
+def get_pool(host='localhost', port=12116, db=11, unix_socket_path=None, **options):
+    """
+    The process-wide connection pool of the redis server, shared by all components with the same options
+    :param host: the host name
+    :param port: the port number
+    :param db: the db number
+    :param unix_socket_path: [Default to TOBY_REDIS_SOCKET] the unix domain socket of a co-located redis, host &
+     port are ignored if set
+    :param options: the pool/ connection options e.g. max_connections, timeout (seconds to wait for a free
+     connection), health_check_interval, socket_timeout, password, override default_pool_options
+    :return: the CountingConnectionPool
+    """
+    unix_socket_path = unix_socket_path or os.getenv('TOBY_REDIS_SOCKET')
+    if 'password' not in options and os.environ.get('TOBY_REDIS_PASSWD'):
+        options['password'] = os.environ['TOBY_REDIS_PASSWD']
+    options = {**default_pool_options, **options}
+    # repr as the option values may be unhashable, e.g. the dict of socket_keepalive_options
+    key = (unix_socket_path or host, None if unix_socket_path else port, db, repr(sorted(options.items())))
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                if unix_socket_path:
+                    pool = CountingConnectionPool(connection_class=redis.UnixDomainSocketConnection,
+                                                  path=unix_socket_path, db=db, **options)
+                else:
+                    pool = CountingConnectionPool(host=host, port=port, db=db, **options)
+                pool.options = options
+                _pools[key] = pool
+    return pool
+
+
+def get_pool_status():
+    """
+    Status of all connection pools in current process
+    :return: dict of {redis://host:port/db or unix://path?db=, options without password: status}
+    """
+    rtn = dict()
+    for (address, port, db, _), pool in list(_pools.items()):
+        name = ('redis://' + address + ':' + str(port) + '/' + str(db) if port is not None else
+                'unix://' + address + '?db=' + str(db))
+        name += ' ' + str({k: v for k, v in pool.options.items() if k != 'password'})
+        rtn[name] = {'max_connections': pool.max_connections, 'created': len(pool._connections),
+                     'idle': len([c for c in list(pool.pool.queue) if c is not None]), **pool.stats}
+    return rtn
+
+
+def disconnect_pools(close=True):
+    """
+    Disconnect all connection pools
+    :param close: [Default to True] close the connections, False to only drop them (e.g. after fork)
+    :return: N/A
+    """
+    with _pools_lock:
+        for pool in _pools.values():
+            if close:
+                pool.disconnect()
+            else:
+                pool.reset()
+
+
+def _reinit_after_fork():
+    # the connections belong to parent process (e.g. gunicorn master), never close them in the child
+    global _pools_lock
+    _pools_lock = threading.Lock()
+    disconnect_pools(close=False)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reinit_after_fork)
+
+
 class Base(Connector):
     """
     Base Class for all redis components
@@ -32,19 +174,63 @@ class Base(Connector):
         self._redis = None
 
     def connect(self, rds=redis.StrictRedis, **kwargs):
-        if 'passwword' not in kwargs:
-            pwd = os.environ.get('TOBY_REDIS_PASSWD',None)
-            if pwd:
-                kwargs['password'] = pwd
-        self._redis = rds(host=self.host, port=self.port, db=self.db, **kwargs)
+        """
+        Connect via the process-wide connection pool, see get_pool for the options
+        """
+        self._redis = rds(connection_pool=get_pool(host=self.host, port=self.port, db=self.db, **kwargs))
+
+
+# the Cache instances with buffered count, flushed at exit
+_buffered_caches = weakref.WeakSet()
+
+
+def _flush_buffered_counts():
+    for cache in list(_buffered_caches):
+        try:
+            cache.flush_counts()
+        except:
+            trace_error(cache.logger)
+
+
+atexit.register(_flush_buffered_counts)
+
+
+def _reset_buffered_counts():
+    # the lock may be held by a thread of the parent, the buffer is flushed by the parent
+    for cache in list(_buffered_caches):
+        cache._counts_lock = threading.Lock()
+        cache._counts = dict()
+        cache._counts_pid = None
+        cache._flush_needed = threading.Event()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_buffered_counts)
 
 
 class Cache(Base):
     """
     Cahce based on redis
     """
-    def __init__(self, logger_name='Cache', host='localhost', port=12116, db=11, redis_instance=None, **kwargs):
+    def __init__(self, logger_name='Cache', host='localhost', port=12116, db=11, redis_instance=None,
+                 serializer=None, prefix_serializers=None, count_flush_interval=None, count_flush_size=1000,
+                 **kwargs):
+        """
+        :param serializer: [Default to TOBY_REDIS_SERIALIZER or legacy] the Serializer or its spec e.g. pickle:lz4
+        :param prefix_serializers: [Default to None] {key prefix: Serializer or spec}, the longest matched prefix
+         is used instead of serializer, e.g. {'toby.job.': 'json'}
+        :param count_flush_interval: [Default to None] buffer the increments of count in process, flushed in one
+         pipeline at most every count_flush_interval seconds (the max staleness, > 0) & at exit, None to not buffer
+        :param count_flush_size: [Default to 1000] flush once this number of key/ subkey are buffered
+        """
+        if count_flush_interval is not None and count_flush_interval <= 0:
+            raise ValueError('count_flush_interval should be > 0, or None to not buffer')
         Base.__init__(self, logger_name=logger_name, host=host, port=port, db=db)
+        self.serializer = get_serializer(serializer)
+        # longest prefix first
+        self.prefix_serializers = sorted(((prefix, get_serializer(spec))
+                                          for prefix, spec in (prefix_serializers or dict()).items()),
+                                         key=lambda p: len(p[0]), reverse=True)
         if redis_instance is None:
             self.connect(rds=redis.StrictRedis, **kwargs)
         else:
@@ -52,10 +238,33 @@ class Cache(Base):
             self._redis = redis_instance
         # enable expire function
         self.expire = self._redis.expire
+        self._compute_stats = {'hits': 0, 'fills': 0, 'early_refreshes': 0, 'stampede_avoided': 0,
+                               'wait_timeouts': 0, 'fill_seconds_total': 0.0, 'fill_seconds_max': 0.0}
+        self._compute_lock = threading.Lock()
+        self.count_flush_interval = count_flush_interval
+        self.count_flush_size = count_flush_size
+        self._counts = dict()
+        self._counts_lock = threading.Lock()
+        self._counts_pid = None
+        self._flush_needed = threading.Event()
+        if count_flush_interval is not None:
+            _buffered_caches.add(self)
         # self._char_to_type = {b"s": str, b"i": int, b"f": float}
         # self._type_to_char = {self._char_to_type[c]: c for c in self._char_to_type}
         
         
+    def get_serializer(self, key):
+        """
+        :param key: the key
+        :return: the Serializer of the key
+        """
+        if self.prefix_serializers:
+            key = key.decode() if type(key) == bytes else str(key)
+            for prefix, serializer in self.prefix_serializers:
+                if key.startswith(prefix):
+                    return serializer
+        return self.serializer
+
     def get_instance(self):
         """
         return the redis connection for reuse
@@ -65,7 +274,7 @@ class Cache(Base):
 
     def put(self, key, subkey=None, val=None, expire=-1):
         """
-        Save an object to cache, pickle if not str/int/float 
+        Save an object to cache, serialized by the serializer of the key
         
         :param key: The key 
         :param subkey: the sub key if has, None if not
@@ -73,30 +282,316 @@ class Cache(Base):
         :param expire: expire time -1 for not exipre
         :return: the redis save result
         """
-        o = pickle.dumps(val)
+        o = self.get_serializer(key).dumps(val)
         if not subkey:
-            r = self._redis.set(key, o)
+            r = self._redis.set(key, o, ex=expire if expire > 0 else None)
+        elif expire > 0:
+            pipe = self._redis.pipeline(transaction=True)
+            pipe.hset(key, subkey, o)
+            pipe.expire(key, expire)
+            r = pipe.execute()[0]
         else:
             r = self._redis.hset(key, subkey, o)
-        if expire > 0:
-            self._redis.expire(key, expire)
         return r
+
+    @staticmethod
+    def _chunks(items, chunk_size):
+        items = list(items)
+        for i in range(0, len(items), chunk_size):
+            yield items[i:i + chunk_size]
+
+    def put_many(self, items, expire=-1, chunk_size=10000):
+        """
+        Save many objects to cache, one round trip per chunk: MSET, or pipelined SET EX if expire
+
+        :param items: dict or iterable of (key, val)
+        :param expire: expire time -1 for not exipre
+        :param chunk_size: max keys per round trip
+        :return: list of the redis save results in input order
+        """
+        rtn = []
+        for chunk in self._chunks(items.items() if isinstance(items, dict) else items, chunk_size):
+            if expire > 0:
+                pipe = self._redis.pipeline(transaction=False)
+                for key, val in chunk:
+                    pipe.set(key, self.get_serializer(key).dumps(val), ex=expire)
+                rtn.extend(pipe.execute())
+            else:
+                r = self._redis.mset({key: self.get_serializer(key).dumps(val) for key, val in chunk})
+                rtn.extend([r] * len(chunk))
+        return rtn
+
+    def get_many(self, keys, chunk_size=10000):
+        """
+        Fetch many objects from the cache, one MGET per chunk
+
+        :param keys: the keys
+        :param chunk_size: max keys per round trip
+        :return: list of the fetched objects in input order, None if not exist
+        """
+        rtn = []
+        for chunk in self._chunks(keys, chunk_size):
+            rtn.extend(loads(r) if r else None for r in self._redis.mget(chunk))
+        return rtn
+
+    def delete_many(self, keys, chunk_size=10000):
+        """
+        Delete many keys, one DEL per chunk
+
+        :param keys: the keys
+        :param chunk_size: max keys per round trip
+        :return: number of keys deleted
+        """
+        return sum(self._redis.delete(*chunk) for chunk in self._chunks(keys, chunk_size) if chunk)
+
+    def sub_put_many(self, key, items, expire=-1, chunk_size=10000):
+        """
+        Save many objects to the sub keys of the key, one HSET per chunk, HSET & EXPIRE in one transaction if expire
+
+        :param key: the Key
+        :param items: dict or iterable of (subkey, val)
+        :param expire: expire time of the key -1 for not exipre
+        :param chunk_size: max sub keys per round trip
+        :return: number of new sub keys
+        """
+        rtn = 0
+        serializer = self.get_serializer(key)
+        for chunk in self._chunks(items.items() if isinstance(items, dict) else items, chunk_size):
+            mapping = {subkey: serializer.dumps(val) for subkey, val in chunk}
+            if expire > 0:
+                pipe = self._redis.pipeline(transaction=True)
+                pipe.hset(key, mapping=mapping)
+                pipe.expire(key, expire)
+                rtn += pipe.execute()[0]
+            else:
+                rtn += self._redis.hset(key, mapping=mapping)
+        return rtn
+
+    def sub_get_many(self, key, subkeys, chunk_size=10000):
+        """
+        Fetch many sub keys of the key, one HMGET per chunk
+
+        :param key: the Key
+        :param subkeys: the sub keys
+        :param chunk_size: max sub keys per round trip
+        :return: list of the fetched objects in input order, None if not exist
+        """
+        rtn = []
+        for chunk in self._chunks(subkeys, chunk_size):
+            rtn.extend(loads(r) if r else None for r in self._redis.hmget(key, chunk))
+        return rtn
+
+    def sub_delete_many(self, key, subkeys, chunk_size=10000):
+        """
+        Delete many sub keys of the key, one HDEL per chunk
+
+        :param key: the Key
+        :param subkeys: the sub keys
+        :param chunk_size: max sub keys per round trip
+        :return: number of sub keys deleted
+        """
+        return sum(self._redis.hdel(key, *chunk) for chunk in self._chunks(subkeys, chunk_size) if chunk)
     
 
+    def _release_lock(self, lock_key, token):
+        # delete only if still held by this caller, WATCH so it works without lua
+        with self._redis.pipeline(transaction=True) as pipe:
+            try:
+                pipe.watch(lock_key)
+                if pipe.get(lock_key) == token:
+                    pipe.multi()
+                    pipe.delete(lock_key)
+                    pipe.execute()
+            except redis.WatchError:
+                pass
+
+    def _record(self, name, seconds=None):
+        with self._compute_lock:
+            self._compute_stats[name] += 1
+            if seconds is not None:
+                self._compute_stats['fill_seconds_total'] += seconds
+                self._compute_stats['fill_seconds_max'] = max(self._compute_stats['fill_seconds_max'], seconds)
+
+    def compute_stats(self):
+        """
+        :return: the counters of get_or_compute
+            hits - fresh values returned
+            fills - values computed & saved, with fill_seconds_total/ fill_seconds_max
+            early_refreshes - fills before expiry (XFetch)
+            stampede_avoided - callers served the stale value or the value filled by another caller
+            wait_timeouts - callers computed without the lock after waiting for another caller
+        """
+        with self._compute_lock:
+            return dict(self._compute_stats)
+
+    def get_or_compute(self, key, fn, ttl, beta=1.0, stale_ttl=None, lock_timeout=None, wait=1.0):
+        """
+        Fetch the key, or compute & save it by fn, only one caller computes the key at a time (redis lock)
+        * others get the stale value if any, or wait for the value up to wait seconds & the lock TTL, they compute
+          the value themselves if the lock is released/ expired without a value (e.g. the holder died)
+        * hot keys are refreshed before expiry with probability growing towards expiry & with the compute time
+          (XFetch), the compute time & logical expiry are kept in key:xfetch
+        * the key is kept ttl + stale_ttl seconds, get(key) returns the value (incl. stale) as well
+        * a value without key:xfetch (saved by put/ put_many) is fresh for ttl from the first call, key:xfetch is
+          added then
+        * a caller computed after waiting saves its value only if still missing, the lock holder's value wins
+
+        :param key: the Key, str or bytes
+        :param fn: compute the value, fn() -> value
+        :param ttl: seconds the value is fresh
+        :param beta: [Default to 1] > 1 to refresh earlier, 0 to disable early refresh
+        :param stale_ttl: [Default to ttl] seconds to keep the stale value after ttl, to serve while computing
+        :param lock_timeout: [Default to 10 x last compute time, min 10] seconds to hold the lock at most
+        :param wait: [Default to 1] max seconds to wait for the value computed by another caller
+        :return: the value
+        """
+        meta_key = self._sub_key(key, ':xfetch')
+        lock_key = self._sub_key(key, ':lock')
+        stale_ttl = ttl if stale_ttl is None else stale_ttl
+        r, meta = self._redis.mget([key, meta_key])
+        delta = expiry = 0.0
+        if r and not meta:
+            # the compute time is unknown, the value is refreshed once ttl passed
+            self._redis.set(meta_key, '0 ' + str(current_sys_time() + ttl), nx=True,
+                            ex=max(1, int(math.ceil(ttl + stale_ttl))))
+            self._record('hits')
+            return loads(r)
+        if r:
+            delta, expiry = (float(v) for v in meta.split())
+            # XFetch: now - delta * beta * ln(rand) >= expiry, log(1 - random()) to avoid log(0)
+            if current_sys_time() - delta * beta * math.log(1.0 - random.random()) < expiry:
+                self._record('hits')
+                return loads(r)
+        early = current_sys_time() < expiry
+        lock_timeout = lock_timeout or max(10.0, delta * 10)
+        computed, val = self._compute_locked(key, meta_key, lock_key, fn, ttl + stale_ttl, ttl, lock_timeout)
+        if computed:
+            if early:
+                self._record('early_refreshes')
+            return val
+        if r:
+            # computing by another caller
+            self._record('stampede_avoided')
+            return loads(r)
+        # not longer than the lock is held, the holder may have died
+        lock_ttl = self._redis.pttl(lock_key)
+        timeout_ts = current_sys_time() + min(wait, lock_ttl / 1000.0 if lock_ttl > 0 else 0.0)
+        interval = 0.005
+        while True:
+            r, locked = self._redis.mget([key, lock_key])
+            if r:
+                self._record('stampede_avoided')
+                return loads(r)
+            if not locked:
+                # released/ expired without a value
+                computed, val = self._compute_locked(key, meta_key, lock_key, fn, ttl + stale_ttl, ttl,
+                                                     lock_timeout)
+                if computed:
+                    return val
+            if current_sys_time() >= timeout_ts:
+                break
+            time.sleep(min(interval, max(0.0, timeout_ts - current_sys_time())))
+            interval = min(interval * 2, 0.1)
+        self._record('wait_timeouts')
+        start = time.perf_counter()
+        val = fn()
+        self._save(key, meta_key, val, time.perf_counter() - start, ttl + stale_ttl, ttl, nx=True)
+        return val
+
+    @staticmethod
+    def _sub_key(key, suffix):
+        return key + suffix.encode() if type(key) == bytes else str(key) + suffix
+
+    def _compute_locked(self, key, meta_key, lock_key, fn, expire, ttl, lock_timeout):
+        """
+        Compute & save the value if the lock is acquired
+        :return: (True, the value) if computed, (False, None) if locked by another caller
+        """
+        token = uuid.uuid4().hex.encode()
+        if not self._redis.set(lock_key, token, nx=True, px=int(lock_timeout * 1000)):
+            return False, None
+        try:
+            start = time.perf_counter()
+            val = fn()
+            self._save(key, meta_key, val, time.perf_counter() - start, expire, ttl)
+            return True, val
+        finally:
+            self._release_lock(lock_key, token)
+
+    def _save(self, key, meta_key, val, delta, expire, ttl, nx=False):
+        """
+        Save the computed value & its key:xfetch
+        :param delta: seconds to compute the value
+        :param nx: True to save only if the key does not exist
+        """
+        expire = max(1, int(math.ceil(expire)))
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.set(key, self.get_serializer(key).dumps(val), ex=expire, nx=nx)
+        pipe.set(meta_key, str(delta) + ' ' + str(current_sys_time() + ttl), ex=expire, nx=nx)
+        if pipe.execute()[0]:
+            self._record('fills', delta)
+
     def count(self, key, subkey=None, step=1):
         """
-        Increase/Decrease a value in key & subkey if any
+        Increase/Decrease a value in key & subkey if any, buffered if count_flush_interval is set
         
         :param key: the key
         :param subkey: the subkey if has
         :param step: step to increase
         :return: N/A
         """
+        if self.count_flush_interval is not None:
+            with self._counts_lock:
+                if self._counts_pid != os.getpid():
+                    # first count, or forked (the buffer is reset by _reset_buffered_counts): start the flusher
+                    self._counts = dict()
+                    self._counts_pid = os.getpid()
+                    threading.Thread(target=self._flush_loop, name='Cache.CountFlusher', daemon=True).start()
+                self._counts[(key, subkey)] = self._counts.get((key, subkey), 0) + step
+                if len(self._counts) >= self.count_flush_size:
+                    self._flush_needed.set()
+            return
         if subkey:
             self._redis.hincrby(key, subkey, amount=step)
         else:
             self._redis.incrby(key, amount=step)
 
+    def flush_counts(self):
+        """
+        Flush the buffered increments of count in one pipeline, synchronously
+
+        :return: number of key/ subkey flushed
+        """
+        with self._counts_lock:
+            counts, self._counts = self._counts, dict()
+        if not counts:
+            return 0
+        pipe = self._redis.pipeline(transaction=False)
+        for (key, subkey), step in counts.items():
+            if subkey:
+                pipe.hincrby(key, subkey, amount=step)
+            else:
+                pipe.incrby(key, amount=step)
+        try:
+            pipe.execute()
+        except:
+            # keep the increments for the next flush
+            with self._counts_lock:
+                for k, step in counts.items():
+                    self._counts[k] = self._counts.get(k, 0) + step
+            raise
+        return len(counts)
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._counts_pid == pid:
+            self._flush_needed.wait(self.count_flush_interval)
+            self._flush_needed.clear()
+            try:
+                self.flush_counts()
+            except:
+                trace_error(self.logger)
+
             
     def get(self, key, subkey=None):
         """
@@ -108,7 +603,7 @@ class Cache(Base):
         """
         r = self._redis.hget(key, subkey) if subkey else self._redis.get(key)
         if r:
-            rtn = pickle.loads(r)
+            rtn = loads(r)
         else:
             rtn = None
         return rtn
@@ -137,6 +632,48 @@ class Cache(Base):
         return self._redis.hscan(key, cursor=start,match=match,count=count)
     
     
+    def iter_items(self, match='*', count=1000):
+        """
+        Iterate all keys with match pattern & their values, the cursor is walked to completion
+        * one round trip per page: MGET of the page & SCAN of the next page in one pipeline
+        * values are deserialized as iterated, only one page is kept in memory
+        * as SCAN, a key may be returned more than once, keys of other types (hash etc.) are skipped
+        :param match: the Key match pattern
+        :param count: the page size hint of SCAN
+        :return: [generator] (key str, value)
+        """
+        cursor, keys = self._redis.scan(cursor=0, match=match, count=count)
+        while True:
+            pipe = self._redis.pipeline(transaction=False)
+            if keys:
+                pipe.mget(keys)
+            if cursor:
+                pipe.scan(cursor=cursor, match=match, count=count)
+            results = pipe.execute() if keys or cursor else []
+            for key, r in zip(keys, results[0] if keys else []):
+                if r:
+                    yield key.decode() if type(key) == bytes else key, loads(r)
+            if not cursor:
+                return
+            cursor, keys = results[-1]
+
+    def iter_subitems(self, key, match='*', count=1000):
+        """
+        Iterate all sub keys of the key with match pattern & their values, the cursor is walked to completion
+        * HSCAN returns the values with the page, values are deserialized as iterated
+        :param key: the Key
+        :param match: the subKey match pattern
+        :param count: the page size hint of HSCAN
+        :return: [generator] (subkey str, value)
+        """
+        cursor = 0
+        while True:
+            cursor, page = self._redis.hscan(key, cursor=cursor, match=match, count=count)
+            for subkey, r in page.items():
+                yield subkey.decode() if type(subkey) == bytes else subkey, loads(r)
+            if not cursor:
+                return
+
     def delete(self, key, *subkey):
         """
         Fetch from the cache by key/ subkey
@@ -152,40 +689,334 @@ class Cache(Base):
         return rtn
         
 
+class NearCache(Cache):
+    """
+    Cache with an in-process LRU/ TTL tier in front of get/ get_many, one instance per process
+    * the local copies are evicted by the writes of any node, via redis client side caching (CLIENT TRACKING BCAST,
+      redis 6+), or keyspace notifications (the server should have notify-keyspace-events with K & g$xe)
+    * the local tier is bypassed while the invalidation listener is not connected, and flushed on reconnect
+    * the links (the invalidation connection & the tracking connection, lost silently otherwise) are pinged every
+      near_check_interval, a link lost is reconnected & CLIENT TRACKING re-issued
+    * the values are shared by the readers of the process, they should not be modified
+    * sub keys (hash) are not cached locally
+    """
+    invalidate_channel = '__redis__:invalidate'
+
+    def __init__(self, logger_name='NearCache', host='localhost', port=12116, db=11, redis_instance=None,
+                 near_max_size=10000, near_max_bytes=64 * 1024 * 1024, near_ttl=60, prefixes=None,
+                 invalidation='auto', near_check_interval=5, **kwargs):
+        """
+        :param near_max_size: [Default to 10000] max number of keys kept locally
+        :param near_max_bytes: [Default to 64MiB] max payload bytes kept locally
+        :param near_ttl: [Default to 60] max seconds to keep a local copy
+        :param prefixes: [Default to None] only keys with these prefixes are cached locally, None for all keys
+        :param invalidation: [Default to auto] tracking, keyspace, or auto (tracking, keyspace if not supported)
+        :param near_check_interval: [Default to 5] seconds between the pings of the invalidation links
+        """
+        Cache.__init__(self, logger_name=logger_name, host=host, port=port, db=db, redis_instance=redis_instance,
+                       **kwargs)
+        self.near_max_size = near_max_size
+        self.near_max_bytes = near_max_bytes
+        self.near_ttl = near_ttl
+        self.prefixes = tuple(prefixes) if prefixes else None
+        self.invalidation = invalidation
+        self.near_check_interval = near_check_interval
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._local = OrderedDict()
+        self._bytes = 0
+        # increased by every invalidation, a value read before an invalidation is not kept
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self._connected = False
+        self._closed = False
+        self._listener = threading.Thread(target=self._listen, name='NearCache.Listener', daemon=True)
+        self._listener.start()
+
+    def _cacheable(self, key):
+        return self.prefixes is None or key.startswith(self.prefixes)
+
+    @staticmethod
+    def _local_key(key):
+        return key.decode() if type(key) == bytes else str(key)
+
+    def _make_connection(self):
+        """
+        A connection of the pool speaking RESP2, the invalidations & the subscribe replies are pubsub messages then
+        * RESP3 (the default of redis-py 8+) hands them to the push handler, read_response would wait for ever
+        """
+        pool = self._redis.connection_pool
+        # the maintenance notifications of redis-py 8+ require RESP3
+        kwargs = {k: v for k, v in pool.connection_kwargs.items() if not k.startswith('maint_notifications')}
+        try:
+            return pool.connection_class(**dict(kwargs, protocol=2))
+        except TypeError:
+            # redis-py < 5, RESP2 only
+            return pool.make_connection()
+
+    def _open_listener(self):
+        """
+        :return: (the connection receiving invalidations, the tracking connection or None)
+        """
+        conn = self._make_connection()
+        conn.connect()
+        tracking = None
+        if self.invalidation in ('auto', 'tracking'):
+            try:
+                conn.send_command('CLIENT', 'ID')
+                client_id = conn.read_response()
+                tracking = self._make_connection()
+                tracking.connect()
+                args = ['CLIENT', 'TRACKING', 'on', 'REDIRECT', client_id, 'BCAST']
+                for prefix in self.prefixes or ():
+                    args += ['PREFIX', prefix]
+                tracking.send_command(*args)
+                tracking.read_response()
+                conn.send_command('SUBSCRIBE', self.invalidate_channel)
+            except redis.ResponseError:
+                if self.invalidation == 'tracking':
+                    raise
+                if tracking is not None:
+                    tracking.disconnect()
+                tracking = None
+        if tracking is None:
+            conn.send_command('PSUBSCRIBE', *['__keyspace@' + str(self.db) + '__:' + prefix + '*'
+                                              for prefix in self.prefixes or ('',)])
+        conn.read_response()
+        return conn, tracking
+
+    def _check_links(self, conn, tracking, pong_ts):
+        """
+        Ping the links, raise ConnectionError if one is lost
+        :param pong_ts: the time of the last pong of the invalidation connection
+        """
+        if time.monotonic() - pong_ts > 2 * self.near_check_interval:
+            raise redis.ConnectionError('No pong from the invalidation connection')
+        if tracking is not None:
+            # the tracking is off once its connection is closed, nothing is received on the redirect then
+            tracking.send_command('PING')
+            tracking.read_response()
+        # the pong is received by the listener loop
+        conn.send_command('PING')
+
+    def _listen(self):
+        while not self._closed:
+            conn = tracking = None
+            try:
+                conn, tracking = self._open_listener()
+                self.clear()
+                self._connected = True
+                self.logger.debug('NearCache listening to invalidations by ' +
+                                  ('tracking' if tracking is not None else 'keyspace notifications'))
+                pong_ts = next_check = time.monotonic()
+                while not self._closed:
+                    if time.monotonic() >= next_check:
+                        self._check_links(conn, tracking, pong_ts)
+                        next_check = time.monotonic() + self.near_check_interval
+                    if tracking is not None and tracking.can_read(timeout=0):
+                        # no reply is expected, read the EOF/ error of the lost link
+                        tracking.read_response()
+                    if not conn.can_read(timeout=min(1, self.near_check_interval)):
+                        continue
+                    msg = conn.read_response()
+                    if msg == b'PONG' or msg[0] == b'pong':
+                        # [pong, ''] in subscribed mode
+                        pong_ts = time.monotonic()
+                    elif msg[0] == b'message':
+                        # tracking: list of keys, None to flush all
+                        self._invalidate(msg[2])
+                    elif msg[0] == b'pmessage':
+                        self._invalidate([msg[2].split(b'__:', 1)[1]])
+            except:
+                if not self._closed:
+                    trace_error(self.logger)
+                    time.sleep(1)
+            finally:
+                if self._connected:
+                    self._connected = False
+                    # the invalidations while disconnected are missed
+                    self.clear()
+                    if not self._closed:
+                        self.logger.warning('NearCache invalidation link lost, local tier flushed, reconnecting')
+                for c in (conn, tracking):
+                    if c is not None:
+                        c.disconnect()
+
+    def _invalidate(self, keys):
+        with self._lock:
+            self._epoch += 1
+            if keys is None:
+                self.invalidations += len(self._local)
+                self._local.clear()
+                self._bytes = 0
+                return
+            for key in keys:
+                entry = self._local.pop(self._local_key(key), None)
+                if entry is not None:
+                    self._bytes -= entry[2]
+                    self.invalidations += 1
+
+    def _remember(self, key, val, size, epoch):
+        with self._lock:
+            if epoch != self._epoch or size > self.near_max_bytes:
+                return
+            old = self._local.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._local[key] = (val, current_sys_time() + self.near_ttl, size)
+            self._bytes += size
+            while len(self._local) > self.near_max_size or self._bytes > self.near_max_bytes:
+                self._bytes -= self._local.popitem(last=False)[1][2]
+                self.evictions += 1
+
+    def _lookup(self, key):
+        """
+        :return: (True, the value) if kept locally
+        """
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                if entry[1] > current_sys_time():
+                    self._local.move_to_end(key)
+                    self.hits += 1
+                    return True, entry[0]
+                del self._local[key]
+                self._bytes -= entry[2]
+            self.misses += 1
+            return False, None
+
+    def get(self, key, subkey=None):
+        local_key = self._local_key(key)
+        if subkey or not self._connected or not self._cacheable(local_key):
+            return Cache.get(self, key, subkey)
+        found, val = self._lookup(local_key)
+        if found:
+            return val
+        epoch = self._epoch
+        r = self._redis.get(key)
+        val = loads(r) if r else None
+        if r:
+            self._remember(local_key, val, len(r), epoch)
+        return val
+
+    def get_many(self, keys, chunk_size=10000):
+        if not self._connected:
+            return Cache.get_many(self, keys, chunk_size=chunk_size)
+        keys = list(keys)
+        rtn = [None] * len(keys)
+        missed = []
+        for i, key in enumerate(keys):
+            local_key = self._local_key(key)
+            found, val = self._lookup(local_key) if self._cacheable(local_key) else (False, None)
+            if found:
+                rtn[i] = val
+            else:
+                missed.append(i)
+        for chunk in self._chunks(missed, chunk_size):
+            epoch = self._epoch
+            for i, r in zip(chunk, self._redis.mget([keys[i] for i in chunk])):
+                if r:
+                    rtn[i] = loads(r)
+                    local_key = self._local_key(keys[i])
+                    if self._cacheable(local_key):
+                        self._remember(local_key, rtn[i], len(r), epoch)
+        return rtn
+
+    def put(self, key, subkey=None, val=None, expire=-1):
+        # evict now, the invalidation of the other nodes comes asynchronously
+        self._invalidate([key])
+        return Cache.put(self, key, subkey=subkey, val=val, expire=expire)
+
+    def put_many(self, items, expire=-1, chunk_size=10000):
+        items = list(items.items() if isinstance(items, dict) else items)
+        self._invalidate([key for key, _ in items])
+        return Cache.put_many(self, items, expire=expire, chunk_size=chunk_size)
+
+    def count(self, key, subkey=None, step=1):
+        self._invalidate([key])
+        return Cache.count(self, key, subkey=subkey, step=step)
+
+    def delete(self, key, *subkey):
+        self._invalidate([key])
+        return Cache.delete(self, key, *subkey)
+
+    def delete_many(self, keys, chunk_size=10000):
+        keys = list(keys)
+        self._invalidate(keys)
+        return Cache.delete_many(self, keys, chunk_size=chunk_size)
+
+    def clear(self):
+        """
+        Clear the local tier
+        :return: N/A
+        """
+        self._invalidate(None)
+
+    def stats(self):
+        """
+        :return: the stats of the local tier
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'connected': self._connected, 'size': len(self._local), 'bytes': self._bytes,
+                    'hits': self.hits, 'misses': self.misses,
+                    'hit_ratio': self.hits / lookups if lookups else 0.0,
+                    'evictions': self.evictions, 'invalidations': self.invalidations}
+
+    def close(self):
+        """
+        Stop the invalidation listener & clear the local tier
+        :return: N/A
+        """
+        self._closed = True
+        self._listener.join(timeout=2)
+        self.clear()
+
+
 class Queue(Base):
     """
     Queue based redis
         Pub/Sub
         Push/ Pop
+        Reliable queue: enqueue/ dequeue/ ack
     """
-    def __init__(self, logger_name='Queue', host='localhost', port=12116, db=11, timeout=-1, redis_instance=None, **kwargs):
+    # the one consumer group of a reliable queue stream
+    stream_group = 'toby'
+
+    def __init__(self, logger_name='Queue', host='localhost', port=12116, db=11, timeout=-1, redis_instance=None,
+                 serializer=None, **kwargs):
         Base.__init__(self, logger_name=logger_name, host=host, port=port, db=db)
-        kwargs = dict()
+        self.serializer = get_serializer(serializer)
         self.channels = None
         self.last_channel = None
         self.timeout = timeout
         if timeout > 0:
-            kwargs['socket_timeout'] = timeout
+            kwargs.setdefault('socket_timeout', timeout)
         if redis_instance is None:
             self.connect(rds=redis.Redis, **kwargs)
         else:
             # allow passing in redis instance
             self._redis = redis_instance
         self._redis_pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        # the reliable queue
+        self.consumer = socket.gethostname() + '.' + str(os.getpid())
+        self._groups = set()
+        self._xpending_idle = True
 
     
     
 
     
-    @staticmethod
-    def _pack_msg(msg):
-        m = pickle.dumps(msg)
+    def _pack_msg(self, msg):
+        m = self.serializer.dumps(msg)
         return m
 
     def _unpack_msg(self, queue_inp):
         m = None
         if queue_inp is not None:
-            m = pickle.loads(queue_inp['data']) if queue_inp.get('data', None) is not None else None
+            m = loads(queue_inp['data']) if queue_inp.get('data', None) is not None else None
             self.last_channel = queue_inp['channel'].decode()
         return m
     
@@ -197,8 +1028,180 @@ class Queue(Base):
 
     def pop(self, queue_name):
         out = self._redis.lpop(queue_name)
-        return None if out is None else self._unpack_msg(out)
-    
+        return None if out is None else loads(out)
+
+    def push_many(self, queue_name, messages, raw=False, front=False):
+        """
+        Push many messages in one RPUSH
+
+        :param queue_name: the queue name
+        :param messages: the messages
+        :param raw: [Default to False] the messages are payloads already serialized
+        :param front: [Default to False] push to the head (LPUSH), the messages are popped first & in order
+        :return: the length of the queue
+        """
+        messages = list(messages) if raw else [self._pack_msg(m) for m in messages]
+        if not messages:
+            return 0
+        return self._redis.lpush(queue_name, *messages[::-1]) if front else self._redis.rpush(queue_name, *messages)
+
+    def pop_many(self, queue_name, count, raw=False):
+        """
+        Pop up to count messages in one LPOP (redis 6.2+)
+
+        :param queue_name: the queue name
+        :param count: max messages to pop
+        :param raw: [Default to False] return the payloads without loading
+        :return: list of the messages in queue order, empty if the queue is empty
+        """
+        out = self._redis.lpop(queue_name, count) or []
+        return out if raw else [loads(m) for m in out]
+
+    """
+    Reliable queue: Redis Streams consumer group, ack & redelivery after visibility timeout
+        * a reliable queue is a stream, not to be used with push/ pop
+        * a stream has a single consumer group (stream_group), each message is processed once by one consumer, the
+          acked messages are deleted from the stream
+        * the expired messages are found by XPENDING IDLE (redis 6.2+), filtered here for older servers
+        * a message not acked within visibility_timeout is redelivered, moved to the dead letter stream
+          (queue_name.dead by default) after max_attempts deliveries
+    """
+    def _ensure_group(self, queue_name):
+        if queue_name in self._groups:
+            return
+        try:
+            self._redis.xgroup_create(queue_name, self.stream_group, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+        self._groups.add(queue_name)
+
+    def enqueue(self, queue_name, message):
+        """
+        Add the message to the reliable queue
+
+        :param queue_name: the queue name
+        :param message: the message
+        :return: the message id
+        """
+        self._ensure_group(queue_name)
+        return self._redis.xadd(queue_name, {'m': self._pack_msg(message)}).decode()
+
+    def _dead_letter(self, queue_name, message_id, fields, attempts, dead_letter):
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.xadd(dead_letter, {**fields, 'id': message_id, 'attempts': attempts})
+        pipe.xack(queue_name, self.stream_group, message_id)
+        pipe.xdel(queue_name, message_id)
+        pipe.execute()
+        self.logger.warning('Message ' + str(message_id) + ' of ' + queue_name + ' moved to ' + dead_letter +
+                            ' after ' + str(attempts) + ' attempts')
+
+    def _pending_expired(self, queue_name, idle):
+        """
+        :param idle: the min idle ms
+        :return: up to 10 pending entries idle for at least idle ms, oldest first
+        """
+        if self._xpending_idle:
+            try:
+                return self._redis.xpending_range(queue_name, self.stream_group, min='-', max='+', count=10,
+                                                  idle=idle)
+            except redis.ResponseError:
+                # redis < 6.2
+                self._xpending_idle = False
+        pending = self._redis.xpending_range(queue_name, self.stream_group, min='-', max='+', count=100)
+        return [p for p in pending if p['time_since_delivered'] >= idle][:10]
+
+    def _claim_expired(self, queue_name, consumer, visibility_timeout, max_attempts, dead_letter):
+        idle = int(visibility_timeout * 1000)
+        for p in self._pending_expired(queue_name, idle):
+            message_id = p['message_id'].decode()
+            # only one consumer can claim the expired message
+            claimed = self._redis.xclaim(queue_name, self.stream_group, consumer, idle, [message_id])
+            if not claimed:
+                continue
+            fields = claimed[0][1]
+            if not fields:
+                # deleted from the stream
+                self._redis.xack(queue_name, self.stream_group, message_id)
+            elif p['times_delivered'] >= max_attempts:
+                self._dead_letter(queue_name, message_id, fields, p['times_delivered'],
+                                  dead_letter or queue_name + '.dead')
+            else:
+                return message_id, loads(fields[b'm'])
+        return None
+
+    def dequeue(self, queue_name, consumer=None, timeout=-1, visibility_timeout=30, max_attempts=5, dead_letter=None):
+        """
+        Take the next message of the reliable queue, blocking, to be acked within visibility_timeout
+
+        :param queue_name: the queue name
+        :param consumer: [Default to hostname.pid] the consumer name
+        :param timeout: if <0 block until a message, else timeout in provided seconds
+        :param visibility_timeout: [Default to 30] seconds before a message not acked is redelivered
+        :param max_attempts: [Default to 5] deliveries before the message is moved to the dead letter stream
+        :param dead_letter: [Default to queue_name.dead] the dead letter stream
+        :return: (message id, message)
+        """
+        self._ensure_group(queue_name)
+        consumer = consumer or self.consumer
+        timeout_ts = current_sys_time() + timeout if timeout >= 0 else None
+        while True:
+            rtn = self._claim_expired(queue_name, consumer, visibility_timeout, max_attempts, dead_letter)
+            if rtn is not None:
+                return rtn
+            # wake up for the messages expired meanwhile
+            block = visibility_timeout if self.timeout <= 0 else min(visibility_timeout, self.timeout * 0.9)
+            if timeout_ts is not None:
+                block = min(block, timeout_ts - current_sys_time())
+                if block <= 0:
+                    raise Timeout('Timeout while waiting for queue:' + queue_name)
+            # block=0 is forever
+            r = self._redis.xreadgroup(self.stream_group, consumer, {queue_name: '>'}, count=1,
+                                       block=max(1, int(block * 1000)))
+            if r:
+                message_id, fields = r[0][1][0]
+                if fields:
+                    return message_id.decode(), loads(fields[b'm'])
+                self._redis.xack(queue_name, self.stream_group, message_id)
+
+    def ack(self, queue_name, message_id):
+        """
+        Acknowledge the message is processed, removed from the reliable queue
+
+        :param queue_name: the queue name
+        :param message_id: the message id
+        :return: number of messages acked, 0 if acked already or redelivered to a consumer which acked it
+        """
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.xack(queue_name, self.stream_group, message_id)
+        pipe.xdel(queue_name, message_id)
+        return pipe.execute()[0]
+
+    def queue_stats(self, queue_name, dead_letter=None):
+        """
+        The stats of the reliable queue
+
+        :param queue_name: the queue name
+        :param dead_letter: [Default to queue_name.dead] the dead letter stream
+        :return: {depth, pending, lag, lag_seconds, consumers, dead_letter}
+            depth - messages in the queue, incl. pending
+            pending - messages delivered & not acked
+            lag - messages not delivered yet
+            lag_seconds - age of the oldest message not delivered yet
+        """
+        self._ensure_group(queue_name)
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.xlen(queue_name)
+        pipe.xinfo_groups(queue_name)
+        pipe.xlen(dead_letter or queue_name + '.dead')
+        depth, groups, dead = pipe.execute()
+        info = [g for g in groups if g['name'].decode() == self.stream_group][0]
+        undelivered = self._redis.xrange(queue_name, min='(' + info['last-delivered-id'].decode(), max='+', count=1)
+        lag_seconds = current_sys_time() - int(undelivered[0][0].decode().split('-')[0]) / 1000 if undelivered else 0
+        return {'depth': depth, 'pending': info['pending'], 'lag': info.get('lag'), 'lag_seconds': lag_seconds,
+                'consumers': info['consumers'], 'dead_letter': dead}
+
+
     
     """
     Pub/ Sub
@@ -206,6 +1209,30 @@ class Queue(Base):
     def pub(self, channel, message):
         self._redis.publish(channel, self._pack_msg(message))
 
+    def _subscribe(self, channels, wildcard=True, timeout=5):
+        """
+        Subscribe to the channels if not yet, wait for the confirmation so no message published afterwards is lost
+        """
+        if channels == self.channels:
+            return
+        self.unsub()
+        if wildcard:
+            self._redis_pubsub.psubscribe(*channels)
+        else:
+            self._redis_pubsub.subscribe(*channels)
+        self.channels = channels
+        confirmed = 0
+        timeout_ts = current_sys_time() + timeout
+        self._redis_pubsub.ignore_subscribe_messages = False
+        try:
+            while confirmed < len(channels) and timeout_ts > current_sys_time():
+                msg = self._redis_pubsub.get_message(timeout=timeout_ts - current_sys_time())
+                if msg is not None and msg['type'] in ('subscribe', 'psubscribe'):
+                    confirmed += 1
+        finally:
+            self._redis_pubsub.ignore_subscribe_messages = True
+        self.logger.debug('Subscribed to queue:'+str(channels))
+
     def sub(self, *channels, timeout=-1, wildcard=True):
         """
         Subscribe and return result 
@@ -215,15 +1242,9 @@ class Queue(Base):
         :param wildcard: is wildcard to be used in channels (subscribe/ psubscribe)
         :return: 
         """
-        if channels != self.channels:
-            self.unsub()
-            if wildcard:
-                self._redis_pubsub.psubscribe(*channels)
-            else:
-                self._redis_pubsub.subscribe(*channels)
-            self.channels = channels
-            self.logger.debug('Subscribed to queue:'+str(channels))
-        if timeout < 0 and self.timeout < 0:
+        self._subscribe(channels, wildcard=wildcard)
+        timeout = timeout if timeout >= 0 else self.timeout
+        if timeout < 0:
             # Block until receive
             for msg in self._redis_pubsub.listen():
                 rtn = msg
@@ -233,7 +1254,9 @@ class Queue(Base):
             timeout_ts = current_sys_time()+timeout
             rtn = None
             while rtn is None and timeout_ts > current_sys_time():
-                rtn = self._redis_pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+                # wait for the remaining time only
+                rtn = self._redis_pubsub.get_message(ignore_subscribe_messages=True,
+                                                     timeout=timeout_ts - current_sys_time())
             if rtn is None:
                 raise Timeout('Timeout while listening to queue:'+str(self.channels))
 
@@ -254,5 +1277,221 @@ class Queue(Base):
         :param timeout: timeout of listening (-1 is block forever)
         :return: returned object
         """
+        # subscribe before publish, or a fast reply is lost
+        self._subscribe((from_topic,), wildcard=False)
         self.pub(to_topic, req_obj)
         return self.sub(from_topic, timeout=timeout, wildcard=False)
+
+
+class RpcClient(Base):
+    """
+    Request/ reply over redis pub/sub, multiplexed by correlation id
+        * one reply channel & one listener thread per instance (use one per process), subscribed before any request
+        * call_async returns a concurrent.futures.Future (asyncio.wrap_future for asyncio), any number in flight
+        * the timeouts are kept in a heap, expired by a timer thread waiting for the earliest deadline
+    Request: {correlation_id, reply_to, request} published to the topic, served by RpcServer
+    Reply: {correlation_id, response} or {correlation_id, error} published to reply_to
+    """
+    def __init__(self, logger_name='RpcClient', host='localhost', port=12116, db=11, redis_instance=None,
+                 serializer=None, default_timeout=30, **kwargs):
+        """
+        :param serializer: [Default to TOBY_REDIS_SERIALIZER or legacy] the Serializer or its spec
+        :param default_timeout: [Default to 30] seconds to wait for a reply, None for no timeout
+        """
+        Base.__init__(self, logger_name=logger_name, host=host, port=port, db=db)
+        self.serializer = get_serializer(serializer)
+        self.default_timeout = default_timeout
+        if redis_instance is None:
+            self.connect(rds=redis.Redis, **kwargs)
+        else:
+            self._redis = redis_instance
+        self.reply_to = 'toby.rpc.reply.' + socket.gethostname() + '.' + str(os.getpid()) + '.' + uuid.uuid4().hex
+        self._pending = dict()
+        self._deadlines = []
+        self._lock = threading.Lock()
+        self._deadline_changed = threading.Condition(self._lock)
+        self._ready = threading.Event()
+        self._closed = False
+        self._listener = threading.Thread(target=self._listen, name='RpcClient.Listener', daemon=True)
+        self._listener.start()
+        self._timer = threading.Thread(target=self._expire, name='RpcClient.Timer', daemon=True)
+        self._timer.start()
+
+    def _listen(self):
+        while not self._closed:
+            pubsub = self._redis.pubsub()
+            try:
+                pubsub.subscribe(self.reply_to)
+                while not self._closed:
+                    msg = pubsub.get_message(timeout=1.0)
+                    if msg is None:
+                        continue
+                    if msg['type'] == 'subscribe':
+                        self._ready.set()
+                    elif msg['type'] == 'message':
+                        self._reply(loads(msg['data']))
+            except:
+                if not self._closed:
+                    trace_error(self.logger)
+                    time.sleep(1)
+            finally:
+                self._ready.clear()
+                pubsub.close()
+
+    def _expire(self):
+        while not self._closed:
+            try:
+                expired = []
+                with self._deadline_changed:
+                    ts = current_sys_time()
+                    while self._deadlines and self._deadlines[0][0] <= ts:
+                        future = self._pending.pop(heapq.heappop(self._deadlines)[1], None)
+                        if future is not None:
+                            expired.append(future)
+                    if not expired:
+                        self._deadline_changed.wait(self._deadlines[0][0] - ts if self._deadlines else 1.0)
+                for future in expired:
+                    self._settle(future, error=Timeout('Timeout while waiting for the reply on ' + self.reply_to))
+            except:
+                trace_error(self.logger)
+
+    @staticmethod
+    def _settle(future, result=None, error=None):
+        """
+        Set the result/ error of the future, unless the caller has cancelled it
+        """
+        if future.done():
+            return
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            # cancelled meanwhile
+            pass
+
+    def _reply(self, reply):
+        with self._lock:
+            future = self._pending.pop(reply.get('correlation_id'), None)
+        if future is None:
+            # timed out/ cancelled already
+            return
+        if 'error' in reply:
+            self._settle(future, error=BotError('RpcError', reply['error']))
+        else:
+            self._settle(future, result=reply.get('response'))
+
+    def _discard(self, correlation_id, future):
+        if future.cancelled():
+            with self._lock:
+                self._pending.pop(correlation_id, None)
+
+    def call_async(self, topic, req_obj, timeout=-1):
+        """
+        Send the request, the reply is set to the future
+
+        :param topic: the topic served by RpcServer
+        :param req_obj: the request object
+        :param timeout: [Default to default_timeout] seconds to wait for the reply, None for no timeout
+        :return: the Future of the response
+        """
+        timeout = self.default_timeout if timeout == -1 else timeout
+        if not self._ready.wait(timeout=5):
+            raise Timeout('Reply listener is not subscribed to ' + self.reply_to)
+        correlation_id = uuid.uuid4().hex
+        future = Future()
+        # a cancelled call is not waited for any more, e.g. by asyncio.wrap_future
+        future.add_done_callback(lambda f: self._discard(correlation_id, f))
+        with self._lock:
+            self._pending[correlation_id] = future
+            if timeout is not None:
+                heapq.heappush(self._deadlines, (current_sys_time() + timeout, correlation_id))
+                if self._deadlines[0][1] == correlation_id:
+                    self._deadline_changed.notify()
+        try:
+            self._redis.publish(topic, self.serializer.dumps({'correlation_id': correlation_id,
+                                                              'reply_to': self.reply_to, 'request': req_obj}))
+        except:
+            with self._lock:
+                self._pending.pop(correlation_id, None)
+            raise
+        return future
+
+    def call(self, topic, req_obj, timeout=-1):
+        """
+        Send the request and wait for the reply
+
+        :param topic: the topic served by RpcServer
+        :param req_obj: the request object
+        :param timeout: [Default to default_timeout] seconds to wait for the reply, None for no timeout
+        :return: the response
+        """
+        return self.call_async(topic, req_obj, timeout=timeout).result()
+
+    def in_flight(self):
+        """
+        :return: number of requests waiting for reply
+        """
+        with self._lock:
+            return len(self._pending)
+
+    def close(self):
+        self._closed = True
+        with self._deadline_changed:
+            self._deadline_changed.notify()
+        self._listener.join(timeout=2)
+        with self._lock:
+            pending, self._pending = self._pending, dict()
+        for future in pending.values():
+            future.cancel()
+
+
+class RpcServer(Base):
+    """
+    Serve the requests of RpcClient on a topic, the handler runs on a thread pool
+        * pub/sub delivers every request to every server subscribed to the topic, run one server per topic
+    """
+    def __init__(self, logger_name='RpcServer', host='localhost', port=12116, db=11, redis_instance=None,
+                 serializer=None, workers=8, **kwargs):
+        """
+        :param serializer: [Default to TOBY_REDIS_SERIALIZER or legacy] the Serializer or its spec
+        :param workers: [Default to 8] max requests handled concurrently
+        """
+        Base.__init__(self, logger_name=logger_name, host=host, port=port, db=db)
+        self.serializer = get_serializer(serializer)
+        if redis_instance is None:
+            self.connect(rds=redis.Redis, **kwargs)
+        else:
+            self._redis = redis_instance
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='RpcServer')
+        self._closed = False
+
+    def _handle(self, func, envelope):
+        try:
+            reply = {'correlation_id': envelope['correlation_id'], 'response': func(envelope['request'])}
+        except:
+            reply = {'correlation_id': envelope['correlation_id'], 'error': trace_error(self.logger)[-1]}
+        self._redis.publish(envelope['reply_to'], self.serializer.dumps(reply))
+
+    def serve(self, topic, func):
+        """
+        Serve the topic until stop
+
+        :param topic: the topic
+        :param func: the handler, func(request) -> response
+        :return: N/A
+        """
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(topic)
+        try:
+            while not self._closed:
+                msg = pubsub.get_message(timeout=1.0)
+                if msg is not None and msg['type'] == 'message':
+                    self._executor.submit(self._handle, func, loads(msg['data']))
+        finally:
+            pubsub.close()
+
+    def stop(self):
+        self._closed = True
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,404 @@
+"""
+The asyncio redis components for Cache/ Queue, same methods as ax.wrapper.redis as coroutines
+
+__author__ = "Alex Xiao <http://www.alexxiao.me/>"
+__date__ = "2026-10-18"
+__version__ = "0.2"
+
+    Version:
+        0.1 (18/10/2026): AsyncCache/ AsyncQueue on redis.asyncio, connection pools shared per event loop
+        0.2 (18/10/2026): AsyncCache prefix_serializers, as Cache
+
+The values are serialized by ax.serializer as the sync classes, both can be used on the same keys/ queues, given the
+same serializer & prefix_serializers.
+
+Classes:
+    AsyncCache - To access redis cache from asyncio
+    AsyncQueue - To access redis push/ pop & pub/ sub queues from asyncio
+"""
+import os
+import asyncio
+import weakref
+import redis.asyncio
+from ax.serializer import get_serializer, loads
+from ax.exception import Timeout
+from ax.base import Connector
+
+
+# {event loop: {(host, port, db, options): pool}}, the connections of a pool are bound to the loop
+_pools = weakref.WeakKeyDictionary()
+
+
+def get_pool(host='localhost', port=12116, db=11, **kwargs):
+    """
+    The connection pool shared by the components of the running event loop
+    :param host: the redis host
+    :param port: the redis port
+    :param db: the redis db
+    :param kwargs: the other arguments of the pool, e.g. max_connections, a pool per distinct options
+    :return: the redis.asyncio.ConnectionPool
+    """
+    pools = _pools.setdefault(asyncio.get_running_loop(), dict())
+    if 'password' not in kwargs and os.environ.get('TOBY_REDIS_PASSWD'):
+        kwargs['password'] = os.environ['TOBY_REDIS_PASSWD']
+    key = (host, port, db, repr(sorted(kwargs.items())))
+    if key not in pools:
+        pools[key] = redis.asyncio.ConnectionPool(host=host, port=port, db=db, **kwargs)
+    return pools[key]
+
+
+class AsyncBase(Connector):
+    """
+    Base Class for all asyncio redis components, a client per event loop created at first use in the loop,
+    e.g. for a module level instance used by asyncio.run per request
+    """
+    def __init__(self, logger_name, host='localhost', port=12116, db=11, redis_instance=None, serializer=None,
+                 **kwargs):
+        Connector.__init__(self, host=host, port=port, logger_name=logger_name)
+        self.db = db
+        self.serializer = get_serializer(serializer)
+        # the redis_instance passed in is used in any loop
+        self._redis = redis_instance
+        self._clients = weakref.WeakKeyDictionary()
+        self._pool_options = kwargs
+
+    @property
+    def redis(self):
+        if self._redis is not None:
+            return self._redis
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = redis.asyncio.Redis(connection_pool=get_pool(self.host, self.port, self.db,
+                                                                  **self._pool_options))
+            self._clients[loop] = client
+        return client
+
+    def get_instance(self):
+        """
+        return the redis connection for reuse
+        """
+        return self.redis
+
+
+class AsyncCache(AsyncBase):
+    """
+    Cache based on redis asyncio
+    """
+    def __init__(self, logger_name='AsyncCache', host='localhost', port=12116, db=11, redis_instance=None,
+                 serializer=None, prefix_serializers=None, **kwargs):
+        """
+        :param serializer: [Default to TOBY_REDIS_SERIALIZER or legacy] the Serializer or its spec e.g. pickle:lz4
+        :param prefix_serializers: [Default to None] {key prefix: Serializer or spec}, the longest matched prefix
+         is used instead of serializer, e.g. {'toby.job.': 'json'}
+        """
+        AsyncBase.__init__(self, logger_name, host=host, port=port, db=db, redis_instance=redis_instance,
+                           serializer=serializer, **kwargs)
+        # longest prefix first
+        self.prefix_serializers = sorted(((prefix, get_serializer(spec))
+                                          for prefix, spec in (prefix_serializers or dict()).items()),
+                                         key=lambda p: len(p[0]), reverse=True)
+
+    def get_serializer(self, key):
+        """
+        :param key: the key
+        :return: the Serializer of the key
+        """
+        if self.prefix_serializers:
+            key = key.decode() if type(key) == bytes else str(key)
+            for prefix, serializer in self.prefix_serializers:
+                if key.startswith(prefix):
+                    return serializer
+        return self.serializer
+
+    async def put(self, key, subkey=None, val=None, expire=-1):
+        """
+        Save an object to cache, serialized by the serializer of the key
+
+        :param key: The key
+        :param subkey: the sub key if has, None if not
+        :param val: the object to be save
+        :param expire: expire time -1 for not exipre
+        :return: the redis save result
+        """
+        o = self.get_serializer(key).dumps(val)
+        if not subkey:
+            return await self.redis.set(key, o, ex=expire if expire > 0 else None)
+        if expire > 0:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(key, subkey, o)
+                pipe.expire(key, expire)
+                return (await pipe.execute())[0]
+        return await self.redis.hset(key, subkey, o)
+
+    async def put_many(self, items, expire=-1):
+        """
+        Save many objects to cache in one round trip
+
+        :param items: dict or iterable of (key, val)
+        :param expire: expire time -1 for not exipre
+        :return: list of the redis save results in input order
+        """
+        items = list(items.items() if isinstance(items, dict) else items)
+        if not items:
+            return []
+        if expire > 0:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, val in items:
+                    pipe.set(key, self.get_serializer(key).dumps(val), ex=expire)
+                return await pipe.execute()
+        return [await self.redis.mset({key: self.get_serializer(key).dumps(val) for key, val in items})] * len(items)
+
+    async def count(self, key, subkey=None, step=1):
+        """
+        Increase/Decrease a value in key & subkey if any
+
+        :param key: the key
+        :param subkey: the subkey if has
+        :param step: step to increase
+        :return: N/A
+        """
+        if subkey:
+            await self.redis.hincrby(key, subkey, amount=step)
+        else:
+            await self.redis.incrby(key, amount=step)
+
+    async def get(self, key, subkey=None):
+        """
+        Fetch from the cache by key/ subkey
+
+        :param key: the Key
+        :param subkey: the sub key if has
+        :return: the fetched object None if not exist
+        """
+        r = await (self.redis.hget(key, subkey) if subkey else self.redis.get(key))
+        return loads(r) if r else None
+
+    async def get_many(self, keys):
+        """
+        Fetch many objects from the cache in one MGET
+
+        :param keys: the keys
+        :return: list of the fetched objects in input order, None if not exist
+        """
+        keys = list(keys)
+        return [loads(r) if r else None for r in await self.redis.mget(keys)] if keys else []
+
+    async def scan(self, match='*', start=0, count=None):
+        """
+        Scan all keys with match pattern
+        :param match: the Key match pattern
+        :param start: [Optional] the start point of return if specified
+        :param count: [Optional] how many records to return if specified
+        :return: the scan result
+        """
+        return await self.redis.scan(cursor=start, match=match, count=count)
+
+    async def sub_scan(self, key, match='*', start=0, count=None):
+        """
+        Scan all sub keys with match pattern
+        :param key: the Key
+        :param match: the subKey match pattern
+        :param start: [Optional] the start point of return if specified
+        :param count: [Optional] how many records to return if specified
+        :return: the scan result
+        """
+        return await self.redis.hscan(key, cursor=start, match=match, count=count)
+
+    async def iter_items(self, match='*', count=1000):
+        """
+        Iterate all keys with match pattern & their values, one MGET per SCAN page
+
+        :param match: the Key match pattern
+        :param count: the page size hint of SCAN
+        :return: [async generator] (key str, value)
+        """
+        cursor = None
+        while cursor != 0:
+            cursor, keys = await self.redis.scan(cursor=cursor or 0, match=match, count=count)
+            if keys:
+                for key, r in zip(keys, await self.redis.mget(keys)):
+                    if r:
+                        yield key.decode() if type(key) == bytes else key, loads(r)
+
+    async def iter_subitems(self, key, match='*', count=1000):
+        """
+        Iterate all sub keys of the key with match pattern & their values
+
+        :param key: the Key
+        :param match: the subKey match pattern
+        :param count: the page size hint of HSCAN
+        :return: [async generator] (subkey str, value)
+        """
+        cursor = None
+        while cursor != 0:
+            cursor, page = await self.redis.hscan(key, cursor=cursor or 0, match=match, count=count)
+            for subkey, r in page.items():
+                yield subkey.decode() if type(subkey) == bytes else subkey, loads(r)
+
+    async def delete(self, key, *subkey):
+        """
+        Delete the key/ sub keys
+
+        :param key: the Key
+        :param *subkey: the sub key(s), if not specified, delete the whole key
+        :return: number of keys/ sub keys deleted
+        """
+        if subkey:
+            return await self.redis.hdel(key, *subkey)
+        return await self.redis.delete(key)
+
+    async def delete_many(self, keys):
+        """
+        Delete many keys in one DEL
+
+        :param keys: the keys
+        :return: number of keys deleted
+        """
+        keys = list(keys)
+        return await self.redis.delete(*keys) if keys else 0
+
+
+class AsyncQueue(AsyncBase):
+    """
+    Queue based redis asyncio
+        Pub/Sub, async iterator of subscription by listen
+        Push/ Pop
+    """
+    def __init__(self, logger_name='AsyncQueue', host='localhost', port=12116, db=11, timeout=-1,
+                 redis_instance=None, serializer=None, **kwargs):
+        """
+        :param timeout: [Default to -1] the default timeout of sub/ bpop in seconds, <0 for block forever
+        :param serializer: [Default to TOBY_REDIS_SERIALIZER or legacy] the Serializer or its spec
+        """
+        AsyncBase.__init__(self, logger_name, host=host, port=port, db=db, redis_instance=redis_instance,
+                           serializer=serializer, **kwargs)
+        self.timeout = timeout
+        self.channels = None
+        self.last_channel = None
+        self._pubsub = None
+        self._pubsub_loop = None
+
+    def _unpack_msg(self, queue_inp):
+        m = None
+        if queue_inp is not None:
+            m = loads(queue_inp['data']) if queue_inp.get('data', None) is not None else None
+            self.last_channel = queue_inp['channel'].decode()
+        return m
+
+    """
+    Push/ Pop
+    """
+    async def push(self, queue_name, message):
+        await self.redis.rpush(queue_name, self.serializer.dumps(message))
+
+    async def pop(self, queue_name):
+        out = await self.redis.lpop(queue_name)
+        return None if out is None else loads(out)
+
+    async def bpop(self, queue_name, timeout=-1):
+        """
+        Pop, wait for the message if the queue is empty
+
+        :param queue_name: the queue name
+        :param timeout: if <0 use the default timeout, 0 for block forever, else timeout in provided seconds
+        :return: the message
+        """
+        timeout = timeout if timeout >= 0 else max(self.timeout, 0)
+        out = await self.redis.blpop([queue_name], timeout=timeout)
+        if out is None:
+            raise Timeout('Timeout while waiting for queue:' + str(queue_name))
+        return loads(out[1])
+
+    """
+    Pub/ Sub
+    """
+    async def pub(self, channel, message):
+        await self.redis.publish(channel, self.serializer.dumps(message))
+
+    async def _subscribe(self, channels, wildcard=True):
+        if self._pubsub is not None and self._pubsub_loop is not asyncio.get_running_loop():
+            # bound to a previous loop, e.g. closed by asyncio.run
+            self._pubsub = None
+            self.channels = None
+        if channels == self.channels:
+            return
+        await self.unsub()
+        if self._pubsub is None:
+            self._pubsub = self.redis.pubsub(ignore_subscribe_messages=False)
+            self._pubsub_loop = asyncio.get_running_loop()
+        if wildcard:
+            await self._pubsub.psubscribe(*channels)
+        else:
+            await self._pubsub.subscribe(*channels)
+        self.channels = channels
+        # wait for the confirmation, the messages published afterwards are not lost
+        confirmed = 0
+        while confirmed < len(channels):
+            msg = await self._pubsub.get_message(timeout=5)
+            if msg is None:
+                raise Timeout('Timeout while subscribing to queue:' + str(channels))
+            if msg['type'] in ('subscribe', 'psubscribe'):
+                confirmed += 1
+        self.logger.debug('Subscribed to queue:' + str(channels))
+
+    async def sub(self, *channels, timeout=-1, wildcard=True):
+        """
+        Subscribe and return result
+
+        :param channels: the channels to listen
+        :param timeout: if <0 use the default timeout (block if <0 too), else, timeout in provided seconds
+        :param wildcard: is wildcard to be used in channels (subscribe/ psubscribe)
+        :return: the message
+        """
+        await self._subscribe(channels, wildcard=wildcard)
+        timeout = timeout if timeout >= 0 else self.timeout
+        loop = asyncio.get_running_loop()
+        timeout_ts = loop.time() + timeout if timeout >= 0 else None
+        while True:
+            wait = None if timeout_ts is None else timeout_ts - loop.time()
+            if wait is not None and wait <= 0:
+                raise Timeout('Timeout while listening to queue:' + str(self.channels))
+            msg = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=wait)
+            if msg is not None:
+                return self._unpack_msg(msg)
+
+    async def listen(self, *channels, wildcard=True):
+        """
+        Subscribe and iterate the messages
+
+        :param channels: the channels to listen
+        :param wildcard: is wildcard to be used in channels (subscribe/ psubscribe)
+        :return: [async generator] the messages, the channel is in last_channel
+        """
+        await self._subscribe(channels, wildcard=wildcard)
+        async for msg in self._pubsub.listen():
+            if msg['type'] in ('message', 'pmessage'):
+                yield self._unpack_msg(msg)
+
+    async def unsub(self):
+        if self._pubsub is not None and self.channels is not None:
+            await self._pubsub.punsubscribe()
+            await self._pubsub.unsubscribe()
+        self.channels = None
+
+    async def pubsub(self, to_topic, req_obj, from_topic, timeout=-1):
+        """
+
+        :param to_topic: the queue which req_obj should be sent to
+        :param req_obj: the request object
+        :param from_topic: the queue should listen to result
+        :param timeout: timeout of listening (-1 is block forever)
+        :return: returned object
+        """
+        # subscribe before publish, or a fast reply is lost
+        await self._subscribe((from_topic,), wildcard=False)
+        await self.pub(to_topic, req_obj)
+        return await self.sub(from_topic, timeout=timeout, wildcard=False)
+
+    async def close(self):
+        if self._pubsub is not None:
+            if self._pubsub_loop is asyncio.get_running_loop():
+                await self._pubsub.aclose()
+            self._pubsub = None
+            self.channels = None
@@ -3,43 +3,166 @@ The wrapper for Postgres through SQLAchemy
 
 __author__ = "Alex Xiao <http://www.alexxiao.me/>"
 __date__ = "2018-11-03"
-__version__ = "0.1"
+__version__ = "0.3"
 
     Version:
         0.1 (03/11/2018 AX) : init
-        
+        0.2 (18/10/2026) : process-wide pooled engine registry, fork safe, with pool status
+        0.3 (18/10/2026) : engines keyed by uri & options
 
 """
+import os
+import threading
 from urllib.parse import quote_plus
 from sqlalchemy import create_engine, text
 import pandas
+from ax.datetime import current_sys_time
 from ax.log import get_logger
 
 
+# the process-wide engines, keyed by (uri, repr of the sorted options), an engine per distinct options
+_engines = dict()
+_engine_stats = dict()
+_engines_lock = threading.Lock()
+default_pool_options = {'pool_size': 5, 'max_overflow': 10, 'pool_timeout': 30, 'pool_recycle': 1800,
+                        'pool_pre_ping': True}
+
+
+def build_uri(db_type, user, password, host='localhost', port=5432, db='toby'):
+    """
+    Build the database uri
+    :param db_type: the dialect + driver e.g. postgresql+psycopg2
+    :param user: user name
+    :param password: password
+    :param host: host name
+    :param port: port number
+    :param db: database name
+    :return: the uri string
+    """
+    return '{}://{}:{}@{}:{}/{}'.format(db_type, quote_plus(user), quote_plus(password), host, port, db)
+
+
+def get_engine(uri, **options):
+    """
+    Get the process-wide pooled engine of the uri & options, create it on first call
+    :param uri: the database uri
+    :param options: engine options, default_pool_options will be used if not specified
+    :return: the engine
+    """
+    return _get_engine(uri, options)[1]
+
+
+def _get_engine(uri, options):
+    """
+    :return: (the registry key, the engine)
+    """
+    key = (uri, repr(sorted(options.items())))
+    engine = _engines.get(key)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(key)
+            if engine is None:
+                engine = create_engine(uri, **{**default_pool_options, **options})
+                _engine_stats[key] = {'borrowed': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+                _engines[key] = engine
+    return key, engine
+
+
+def borrow_connection(uri, **options):
+    """
+    Borrow a connection from the pooled engine of the uri, close() returns it to the pool
+    :param uri: the database uri
+    :param options: engine options for get_engine
+    :return: the connection
+    """
+    key, engine = _get_engine(uri, options)
+    start = current_sys_time()
+    conn = engine.connect()
+    wait = current_sys_time() - start
+    stats = _engine_stats[key]
+    with _engines_lock:
+        stats['borrowed'] += 1
+        stats['wait_total'] += wait
+        stats['wait_max'] = max(stats['wait_max'], wait)
+    return conn
+
+
+def get_pool_status():
+    """
+    Status of all pooled engines in current process
+    :return: dict of {masked url & the options if any: status}
+    """
+    rtn = dict()
+    for key, engine in list(_engines.items()):
+        pool = engine.pool
+        stats = _engine_stats[key]
+        name = repr(engine.url) + (' ' + key[1] if key[1] != '[]' else '')
+        rtn[name] = {'size': pool.size(), 'checked_in': pool.checkedin(),
+                     'checked_out': pool.checkedout(), 'overflow': pool.overflow(),
+                     'borrowed': stats['borrowed'], 'wait_total': stats['wait_total'],
+                     'wait_max': stats['wait_max']}
+    return rtn
+
+
+def dispose_engines(close=True):
+    """
+    Dispose all pooled engines
+    :param close: [Default to True] close the pooled connections, False to only drop them (e.g. after fork)
+    :return: N/A
+    """
+    with _engines_lock:
+        for key, engine in _engines.items():
+            engine.dispose(close=close)
+            _engine_stats[key] = {'borrowed': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+
+
+def _reinit_after_fork():
+    # the pooled connections belong to parent process (e.g. gunicorn master), never close them in the child
+    global _engines_lock
+    _engines_lock = threading.Lock()
+    dispose_engines(close=False)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reinit_after_fork)
+
+
 class Connection:
     """
     Base Class for all SQL Alchemy Connection
     """
     def __init__(self, user, password, logger_name='Toby.DB', db_type='postgresql+psycopg2', host='localhost',
-                 port=5432, db='toby', encoding='utf8'):
+                 port=5432, db='toby', encoding='utf8', pooled=False, **pool_options):
+        """
+        :param pooled: [Default to False] borrow connection from the process-wide pooled engine
+        :param pool_options: engine options for pooled engine e.g. pool_size, max_overflow
+        """
         self._connection = None
         self._uri = None
         self._encoding = encoding
+        self._pooled = pooled
+        self._pool_options = pool_options
         self.logger = get_logger(logger_name)
         self.connect(db_type, user, password, host, port, db, encoding)
-    
+
+    def _connect(self):
+        if self._pooled:
+            return borrow_connection(self._uri, client_encoding=self._encoding, **self._pool_options)
+        return create_engine(self._uri, client_encoding=self._encoding).connect()
+
     def connect(self, db_type, user, password, host='localhost', port=5432, db='toby', encoding='utf8'):
-        self._uri = '{}://{}:{}@{}:{}/{}'
+        self._uri = build_uri(db_type, user, password, host, port, db)
+        self._encoding = encoding
         if not self._connection or self._connection.closed:
-            self._connection = create_engine(self._uri.format(db_type, quote_plus(user), quote_plus(password), host,
-                                                              port, db), client_encoding=encoding).connect()
+            self._connection = self._connect()
 
     def disconnect(self,):
+        # for pooled connection, this returns it back to the pool
         self._connection.close()
 
     def reconnect(self,):
         if self._connection.closed:
-            self._connection = create_engine(self._uri, client_encoding=self._encoding).connect()
+            self._connection = self._connect()
 
     def query(self, sql, **options):
         return pandas.read_sql(text(sql), self._connection, **options)
@@ -3,68 +3,196 @@ The queue by ZeroMQ
 This is the connector which will be the core message queue within the same machine
 
 __author__ = "Alex Xiao <http://www.alexxiao.me/>"
-__date__ = "2017-05-27"
-__version__ = "0.1"
+__date__ = "2026-10-18"
+__version__ = "0.4"
 
     Version:
         0.1 : implemented zeroMQ publish/ subscribe device
-
+        0.2 (18/10/2026): steerable QueueDevice (PAUSE/ RESUME/ TERMINATE/ STATISTICS over the control socket),
+                          built-in monitor of per topic message & byte rates
+        0.3 (18/10/2026): binary framing of QueuePub/ QueueSub, zero-copy payload frames, lazy logging
+        0.4 (18/10/2026): flow control of the connectors, HWMs, per topic conflation, drop/ block with timeout & counters
+
+QueueDevice control: send one of the commands to the REQ/REP control socket, the reply is the JSON of statistics
+    PAUSE - stop forwarding, the messages are held by the sockets (up to their HWM)
+    RESUME - resume forwarding
+    TERMINATE - stop the device, the device thread ends
+    STATISTICS - the proxy counters, depth and the per topic message/ byte rates of the monitor
+
+QueuePub/ QueueSub framing:
+    text - [topic][utf-8 message], dict is sent as JSON
+    binary - [topic][header][payload frames], the header is framing version & format (0 raw bytes, 1 pickle, 2 msgpack)
+        pickle is protocol 5, the out-of-band buffers (e.g. numpy arrays) are sent as frames without copy
+
+Flow control of the connectors, counted in counters (sent, received, dropped, blocked, timeouts, conflated):
+    sndhwm/ rcvhwm - the high-water marks in messages, set before connect/ bind (0 for no limit)
+    on_full - when the peers are at the HWM: None (the socket default, PUB drops silently for the slow subscriber,
+              PUSH blocks), drop (count & drop), block (count & wait up to send_timeout ms, then raise Timeout)
+              QueuePub with on_full is XPUB with XPUB_NODROP, i.e. the message is dropped/ blocked for all subscribers
+    conflate - QueueSub keeps the latest message of each topic only, the older ones are counted as conflated
 """
-from threading import Thread
+import json
+import struct
+import pickle
+import itertools
+from time import monotonic
+from collections import OrderedDict
+from threading import Thread, Event, Lock
 
 import zmq
 
-from ax.info import QueueBaseConnector as Base_connector
+from ax.base import Connector as Base_connector
 from ax.tools import trace_error
+from ax.exception import Timeout
+from ax.serializer import format_ids, msgpack_dumps, msgpack_loads, msgpack
+
+
+_device_ids = itertools.count()
+_framing_version = 1
+_raw_format = 0
+
+
+def pack_frames(obj, fmt='pickle'):
+    """
+    The header & payload frames of the binary framing
+    :param obj: the object, bytes/ bytearray/ memoryview are sent as is
+    :param fmt: [Default to pickle] pickle (protocol 5) or msgpack
+    :return: list of frames, the payload frames are not copied
+    """
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return [struct.pack('<BB', _framing_version, _raw_format), obj]
+    if fmt == 'msgpack':
+        return [struct.pack('<BB', _framing_version, format_ids['msgpack']), msgpack_dumps(obj)]
+    buffers = []
+    data = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    return [struct.pack('<BB', _framing_version, format_ids['pickle']), data] + [b.raw() for b in buffers]
+
+
+def unpack_frames(frames):
+    """
+    Load the object of the binary framing
+    :param frames: the header & payload frames, zmq.Frame or bytes
+    :return: the object, raw payload as memoryview of the frame
+    """
+    buffers = [f.buffer if isinstance(f, zmq.Frame) else f for f in frames]
+    version, fmt = struct.unpack('<BB', buffers[0])
+    if version != _framing_version:
+        raise ValueError('Unknown framing version ' + str(version))
+    if fmt == _raw_format:
+        return buffers[1]
+    if fmt == format_ids['msgpack']:
+        return msgpack_loads(buffers[1])
+    if fmt == format_ids['pickle']:
+        return pickle.loads(buffers[1], buffers=buffers[2:])
+    raise ValueError('Unknown payload format ' + str(fmt))
+
+
+def control_device(command, host='tcp://127.0.0.1', port=12118, timeout=5000, context=None):
+    """
+    Send the command to the control socket of the QueueDevice
+    :param command: PAUSE/ RESUME/ TERMINATE/ STATISTICS
+    :param host: the host of the device, or the inproc address if port is None
+    :param port: the control port of the device
+    :param timeout: [Default to 5000] timeout in ms
+    :param context: [Default to None] the zmq context, required by inproc address
+    :return: the statistics of the device
+    """
+    ctx = context or zmq.Context.instance()
+    socket = ctx.socket(zmq.REQ)
+    try:
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.setsockopt(zmq.RCVTIMEO, timeout)
+        socket.connect(host if port is None else host + ':' + str(port))
+        socket.send_string(command)
+        return socket.recv_json()
+    finally:
+        socket.close()
 
 
 class QueueDevice(Thread, Base_connector):
     """
         The device which exchanges messages between pub/sub, router/dealer, push puller
-        
+
         Input parameters:
             name : the name of device - default to Exchanger
             mode: the pair of in & out port, default to [zmq.SUB,zmq.PUB]
             port_in: in port number default to 12116
             port_out: output port number default to 1217
             port_mointor: monitor port, default to -1, if greater than 0, will open monitor port (PUB)
+            port_control: control port, default to -1, if greater than 0, will open control port (REP)
+            stats_interval: the interval in seconds to compute the rates of topics, default to 1
+            max_topics: the max topics to keep statistics, the others are counted in '~other'
+            hwm: the send & receive high-water marks of in & out ports, default to None (zmq default 1000)
             logger: pass in logger otherwise will use print
-        
+
         Sample code:
-            ex=Q_device(name='Exchanger',mode=['sub','pub'],port_in=12116,port_out=12117,port_monitor=-1,logger=None)
-            ex.setDaemon(True)
+            ex=Q_device(name='Exchanger',mode=['sub','pub'],port_in=12116,port_out=12117,port_monitor=-1,
+                        port_control=12118,logger=None)
+            ex.daemon = True
             ex.start()
+            ex.statistics()
+            ex.stop()
     """
 
     def __init__(self, name='Exchanger', mode=['sub', 'pub'], port_in=12116, port_out=12117, port_monitor=-1,
-                 logger_name=None):
+                 logger_name=None, port_control=-1, stats_interval=1.0, max_topics=1024, hwm=None):
         Thread.__init__(self)
-        Base_connector.__init__(self, logger_name=logger_name)
+        Base_connector.__init__(self, logger_name=logger_name or name)
         self.context = None
         self.monitor = None
+        self.control_socket = None
         self.name = name
         self.port_in = port_in
         self.port_out = port_out
         self.port_monitor = port_monitor
+        self.port_control = port_control
+        self.stats_interval = stats_interval
+        self.max_topics = max_topics
+        self.hwm = hwm
         self.mode = mode
         self.mode_map = {'pub': zmq.PUB, 'sub': zmq.SUB,
+                         'xpub': zmq.XPUB, 'xsub': zmq.XSUB,
                          'router': zmq.ROUTER, 'dealer': zmq.DEALER,
-                         'psh': zmq.PUSH, 'pull': zmq.PULL
+                         'psh': zmq.PUSH, 'push': zmq.PUSH, 'pull': zmq.PULL
                          }
         self.frontend = None
         self.backend = None
+        self.paused = False
+        self.ready = Event()
+        self._resumed = Event()
+        self._proxy_done = Event()
+        # inproc addresses of the capture, the proxy control & the control socket, unique in the context
+        prefix = 'inproc://' + name + '.' + str(next(_device_ids))
+        self.capture_address = prefix + '.capture'
+        self.steer_address = prefix + '.steer'
+        self.control_address = prefix + '.control'
+        self._running = False
+        self._helpers = []
+        self._stats_lock = Lock()
+        self._online_ts = None
+        # {topic: [messages, bytes, messages per second, bytes per second, messages & bytes at last tick]}
+        self._topics = dict()
+        # frames counted by the monitor
+        self._captured = 0
+        # the 8 counters of the proxy: frontend frames & bytes in/ out, then backend
+        self._proxy_stats = [0] * 8
 
     def run(self):
-        # try:
         self.context = None
         self.frontend = None
         self.backend = None
         self.monitor = None
+        self.control_socket = None
+        steer = None
         try:
             self.context = zmq.Context()
             # Socket facing clients
             self.logger.debug('Got context')
             self.frontend = self.context.socket(self.mode_map[self.mode[0]])
+            self._set_hwm(self.frontend)
+            if self.mode[0] == 'sub':
+                # forward all topics
+                self.frontend.setsockopt(zmq.SUBSCRIBE, b'')
             address = "tcp://*:" + str(self.port_in)
             self.logger.debug('Trying to bind In port at ' + address)
             self.frontend.bind(address)
@@ -72,44 +200,242 @@ class QueueDevice(Thread, Base_connector):
 
             # Socket facing services
             self.backend = self.context.socket(self.mode_map[self.mode[1]])
-            self.logger.debug('Trying to bind Out port at ' + address)
+            self._set_hwm(self.backend)
             address = "tcp://*:" + str(self.port_out)
+            self.logger.debug('Trying to bind Out port at ' + address)
             self.backend.bind(address)
             self.logger.debug('Out port ' + str(self.port_out) + ' is up at ' + address)
 
+            # the capture of the proxy, consumed by the built-in monitor & published on the monitor port if any
+            self.monitor = self.context.socket(zmq.PUB)
+            self.monitor.setsockopt(zmq.SNDHWM, 100000)
+            self.monitor.bind(self.capture_address)
             if self.port_monitor > 0:
-                self.monitor = self.context.socket(zmq.PUB)
-                self.logger.debug('Trying to bind Monitor port at ' + address)
                 address = "tcp://*:" + str(self.port_monitor)
+                self.logger.debug('Trying to bind Monitor port at ' + address)
                 self.monitor.bind(address)
                 self.logger.debug('Monitor port PUB is up at ' + address)
 
+            steer = self.context.socket(zmq.PAIR)
+            steer.bind(self.steer_address)
+            self.control_socket = self.context.socket(zmq.REP)
+            self.control_socket.bind(self.control_address)
+            if self.port_control > 0:
+                address = "tcp://*:" + str(self.port_control)
+                self.logger.debug('Trying to bind Control port at ' + address)
+                self.control_socket.bind(address)
+                self.logger.debug('Control port REP is up at ' + address)
+
+            self._running = True
+            self._online_ts = monotonic()
+            self._helpers = [Thread(target=self._monitor_loop, name=self.name + '.monitor', daemon=True),
+                             Thread(target=self._control_loop, name=self.name + '.control', daemon=True)]
+            for t in self._helpers:
+                t.start()
             self.logger.info(self.name + " is ONLINE")
-            # zmq.device(zmq.FORWARDER, frontend, backend)
-            zmq.proxy(self.frontend, self.backend, self.monitor)
+            self.ready.set()
+            while self._running:
+                if self.paused:
+                    # the messages are held by the sockets while paused
+                    self._resumed.wait(0.2)
+                    continue
+                # returns on TERMINATE of the control loop, to pause or stop
+                zmq.proxy_steerable(self.frontend, self.backend, self.monitor, steer)
         except:
             trace_error(self.logger)
         finally:
-            #    pass
             self.logger.info(self.name + " is preparing to go offline")
-            if self.frontend: self.frontend.close()
-            if self.backend: self.backend.close()
-            if self.backend: self.backend.close()
+            self._running = False
+            self._proxy_done.set()
+            for t in self._helpers:
+                t.join()
+            self.ready.set()
+            for socket in (self.frontend, self.backend, self.monitor, steer, self.control_socket):
+                if socket: socket.close(linger=0)
             if self.context: self.context.term()
             self.logger.info(self.name + " is OFFLINE")
 
+    def _set_hwm(self, socket):
+        if self.hwm is not None:
+            socket.setsockopt(zmq.SNDHWM, self.hwm)
+            socket.setsockopt(zmq.RCVHWM, self.hwm)
+
+    def _monitor_loop(self):
+        """
+        Consume the capture of the proxy, count the messages & bytes per topic
+        """
+        socket = self.context.socket(zmq.SUB)
+        try:
+            socket.setsockopt(zmq.SUBSCRIBE, b'')
+            socket.setsockopt(zmq.RCVHWM, 100000)
+            socket.connect(self.capture_address)
+            by_topic = self.mode[0] in ('sub', 'xsub')
+            last_tick = monotonic()
+            while self._running:
+                if socket.poll(min(200, int(self.stats_interval * 1000))):
+                    with self._stats_lock:
+                        try:
+                            # drain in batches under one lock
+                            for _ in range(10000):
+                                frames = socket.recv_multipart(zmq.NOBLOCK, copy=False)
+                                self._count(frames[0].bytes if by_topic else b'*', len(frames),
+                                            sum(f.buffer.nbytes for f in frames))
+                        except zmq.Again:
+                            pass
+                ts = monotonic()
+                if ts - last_tick >= self.stats_interval:
+                    self._tick(ts - last_tick)
+                    last_tick = ts
+        except:
+            trace_error(self.logger)
+        finally:
+            socket.close(linger=0)
+
+    def _count(self, topic, frames, size):
+        self._captured += frames
+        stats = self._topics.get(topic)
+        if stats is None:
+            if len(self._topics) >= self.max_topics:
+                topic = b'~other'
+                stats = self._topics.get(topic)
+            if stats is None:
+                stats = self._topics[topic] = [0, 0, 0.0, 0.0, 0, 0]
+        stats[0] += 1
+        stats[1] += size
+
+    def _tick(self, seconds):
+        with self._stats_lock:
+            for stats in self._topics.values():
+                stats[2] = (stats[0] - stats[4]) / seconds
+                stats[3] = (stats[1] - stats[5]) / seconds
+                stats[4], stats[5] = stats[0], stats[1]
+
+    def _control_loop(self):
+        """
+        Serve the control socket, steer the proxy by its PAIR control socket
+        The proxy is terminated to pause (the PAUSE of libzmq 4.3.5 proxy still forwards) & restarted to resume,
+        its counters are kept in _proxy_stats across the restarts
+        """
+        steer = self.context.socket(zmq.PAIR)
+        try:
+            steer.connect(self.steer_address)
+            while self._running:
+                if not self.control_socket.poll(200):
+                    continue
+                command = self.control_socket.recv().decode(errors='replace').strip().upper()
+                self.logger.debug('%s control: %s', self.name, command)
+                if command not in ('PAUSE', 'RESUME', 'TERMINATE', 'STATISTICS'):
+                    self.control_socket.send_json({'error': 'Unknown command ' + command})
+                    continue
+                if command in ('PAUSE', 'TERMINATE') and not self.paused:
+                    self._proxy_stats = self._read_proxy_stats(steer)
+                    self.paused = True
+                    self._resumed.clear()
+                    steer.send(b'TERMINATE')
+                if command == 'TERMINATE':
+                    self._running = False
+                elif command == 'RESUME' and self.paused:
+                    self.paused = False
+                    self._resumed.set()
+                self.control_socket.send_json(self._statistics(steer))
+        except:
+            trace_error(self.logger)
+            # do not leave the proxy running without control
+            self._running = False
+            steer.send(b'TERMINATE')
+        finally:
+            self._resumed.set()
+            # the proxy replies TERMINATE (libzmq 4.3.5+), it blocks if this end is closed before the proxy ends
+            self._proxy_done.wait()
+            steer.close(linger=0)
+
+    def _read_proxy_stats(self, steer):
+        """
+        :return: the counters of the proxy incl. the previous runs
+        """
+        steer.send(b'STATISTICS')
+        frames = steer.recv_multipart()
+        while len(frames) != 8:
+            # the empty reply of TERMINATE to the previous run (libzmq 4.3.5+)
+            frames = steer.recv_multipart()
+        return [base + struct.unpack('<Q', f)[0] for base, f in zip(self._proxy_stats, frames)]
+
+    def _statistics(self, steer):
+        frontend_in, frontend_in_bytes, frontend_out, frontend_out_bytes, backend_in, backend_in_bytes, \
+            backend_out, backend_out_bytes = self._proxy_stats if self.paused else self._read_proxy_stats(steer)
+        with self._stats_lock:
+            topics = {topic.decode(errors='replace'): {'msgs': s[0], 'bytes': s[1], 'msgs_per_sec': s[2],
+                                                       'bytes_per_sec': s[3]}
+                      for topic, s in self._topics.items()}
+            captured = self._captured
+        # the proxy counts frames, i.e. a multipart message of topic & data is 2 frames
+        return {'name': self.name, 'paused': self.paused, 'running': self._running,
+                'uptime': monotonic() - self._online_ts,
+                'frontend': {'frames_in': frontend_in, 'bytes_in': frontend_in_bytes,
+                             'frames_out': frontend_out, 'bytes_out': frontend_out_bytes},
+                'backend': {'frames_in': backend_in, 'bytes_in': backend_in_bytes,
+                            'frames_out': backend_out, 'bytes_out': backend_out_bytes},
+                # received by the proxy but not forwarded yet, in both directions
+                'depth': frontend_in - backend_out + backend_in - frontend_out,
+                # forwarded by the proxy but not counted by the monitor yet (or dropped at the capture HWM)
+                'monitor_lag': max(frontend_in + backend_in - captured, 0),
+                'topics': topics}
+
+    def control(self, command, timeout=5000):
+        """
+        Send the command to the control socket of the device
+        :param command: PAUSE/ RESUME/ TERMINATE/ STATISTICS
+        :param timeout: [Default to 5000] timeout in ms
+        :return: the statistics
+        """
+        if not self.ready.wait(timeout / 1000) or not self._running:
+            raise RuntimeError(self.name + ' is not running')
+        return control_device(command, self.control_address, None, timeout=timeout, context=self.context)
+
+    def pause(self):
+        return self.control('PAUSE')
+
+    def resume(self):
+        return self.control('RESUME')
+
+    def statistics(self):
+        return self.control('STATISTICS')
+
+    def stop(self):
+        """
+        Terminate the device & wait for the thread to end
+        """
+        rtn = self.control('TERMINATE')
+        self.join()
+        return rtn
+
 
 class QueueConnector(Base_connector):
     """
     The base class for all connectors
     """
 
-    def __init__(self, type, host='tcp://127.0.0.1', port=12116, mode='connect', logger_name='Q_Connector'):
+    def __init__(self, type, host='tcp://127.0.0.1', port=12116, mode='connect', logger_name='Q_Connector',
+                 sndhwm=None, rcvhwm=None, on_full=None, send_timeout=-1):
+        """
+        :param sndhwm: [Default to None] the send high-water mark, None for the zmq default (1000)
+        :param rcvhwm: [Default to None] the receive high-water mark, None for the zmq default (1000)
+        :param on_full: [Default to None] None, drop or block, when the peers are at the HWM
+        :param send_timeout: [Default to -1] max ms to block of on_full block, <0 for block forever
+        """
+        if on_full not in (None, 'drop', 'block'):
+            raise ValueError('Unknown on_full ' + str(on_full))
         Base_connector.__init__(self, host=host, port=port, logger_name=logger_name)
         self.context = None
         self.socket = None
         self.type = type
         self.mode = mode
+        self.sndhwm = sndhwm
+        self.rcvhwm = rcvhwm
+        self.on_full = on_full
+        self.send_timeout = send_timeout
+        self.counters = {'sent': 0, 'received': 0, 'dropped': 0, 'blocked': 0, 'timeouts': 0, 'conflated': 0,
+                         'malformed': 0}
         self.connect()
         self.send = self.socket.send
         self.receive = self.socket.recv
@@ -126,6 +452,13 @@ class QueueConnector(Base_connector):
         self.pre_connect()
         self.context = zmq.Context()
         self.socket = self.context.socket(self.type)
+        # the HWMs apply to the connections/ binds made afterwards
+        if self.sndhwm is not None:
+            self.socket.setsockopt(zmq.SNDHWM, self.sndhwm)
+        if self.rcvhwm is not None:
+            self.socket.setsockopt(zmq.RCVHWM, self.rcvhwm)
+        if self.on_full is not None and self.type == zmq.XPUB:
+            self.socket.setsockopt(zmq.XPUB_NODROP, 1)
         if self.mode == 'connect':
             addr = self.host + ":" + str(self.port)
             self.logger.debug('Connecting ' + addr)
@@ -140,29 +473,126 @@ class QueueConnector(Base_connector):
     def disconnect(self):
         self.socket.close()
 
+    def send_frames(self, frames, copy=True):
+        """
+        Send the multipart message with the on_full policy
+        :param frames: list of frames
+        :param copy: [Default to True] False to send the frames without copy
+        :return: True if sent, False if dropped
+        """
+        send = self.socket.send
+        more = zmq.SNDMORE if len(frames) > 1 else 0
+        if self.on_full is None:
+            send(frames[0], more, copy=copy)
+        else:
+            try:
+                send(frames[0], zmq.NOBLOCK | more, copy=copy)
+            except zmq.Again:
+                if self.on_full == 'drop':
+                    self.counters['dropped'] += 1
+                    return False
+                self._send_blocked(frames[0], more, copy)
+        # the other frames of a multipart message are queued with the first one
+        for frame in frames[1:-1]:
+            send(frame, zmq.SNDMORE, copy=copy)
+        if more:
+            send(frames[-1], copy=copy)
+        self.counters['sent'] += 1
+        return True
+
+    def _send_blocked(self, frame, more, copy):
+        self.counters['blocked'] += 1
+        deadline = monotonic() + self.send_timeout / 1000 if self.send_timeout >= 0 else None
+        while True:
+            wait = None if deadline is None else deadline - monotonic()
+            if wait is not None and wait <= 0:
+                self.counters['timeouts'] += 1
+                raise Timeout('Timeout while sending to ' + self.host + ':' + str(self.port))
+            # POLLOUT of XPUB is always set, poll in short steps
+            self.socket.poll(10 if wait is None else min(10, int(wait * 1000) + 1), zmq.POLLOUT)
+            try:
+                self.socket.send(frame, zmq.NOBLOCK | more, copy=copy)
+                return
+            except zmq.Again:
+                pass
+
+    def flow_stats(self):
+        """
+        :return: the flow control settings & counters
+        """
+        return dict(self.counters, sndhwm=self.sndhwm, rcvhwm=self.rcvhwm, on_full=self.on_full,
+                    send_timeout=self.send_timeout)
+
+
+def encode_text(msg, code):
+    """
+    :return: the bytes of the text framing, dict as JSON
+    """
+    if type(msg).__name__ == 'dict':
+        msg = json.dumps(msg)
+    return msg.encode(code) if isinstance(msg, str) else msg
+
 
 class QueuePub(QueueConnector):
-    def __init__(self, host='tcp://127.0.0.1', port=12116, logger_name='Q_pub', code='utf-8'):
-        QueueConnector.__init__(self, zmq.PUB, host=host, port=port, logger_name=logger_name)
+    def __init__(self, host='tcp://127.0.0.1', port=12116, logger_name='Q_pub', code='utf-8', framing='text',
+                 serializer='pickle', mode='connect', sndhwm=None, on_full=None, send_timeout=-1):
+        """
+        :param mode: [Default to connect] connect (to a QueueDevice) or bind
+        :param framing: [Default to text] text or binary
+        :param serializer: [Default to pickle] the format of binary framing, pickle (protocol 5) or msgpack
+        :param sndhwm: [Default to None] the send high-water mark
+        :param on_full: [Default to None] None (PUB drops silently), drop or block (XPUB with XPUB_NODROP)
+        :param send_timeout: [Default to -1] max ms to block of on_full block, <0 for block forever
+        """
+        if framing not in ('text', 'binary'):
+            raise ValueError('Unknown framing ' + str(framing))
+        if serializer not in ('pickle', 'msgpack') or (serializer == 'msgpack' and msgpack is None):
+            raise ValueError('The serializer ' + str(serializer) + ' is not supported/ installed')
+        QueueConnector.__init__(self, zmq.PUB if on_full is None else zmq.XPUB, host=host, port=port, mode=mode,
+                                logger_name=logger_name, sndhwm=sndhwm, on_full=on_full, send_timeout=send_timeout)
         self.code = code
+        self.framing = framing
+        self.serializer = serializer
 
     def pre_connect(self):
         pass
 
     def pub(self, topic, in_msg):
-        if type(in_msg).__name__ == 'dict':
-            msg = json.dumps(in_msg)
-        else:
-            msg = in_msg
-        self.send_multipart([topic.encode(self.code), msg.encode(self.code)])
-        self.logger.debug(' Published to [' + topic + ']: ' + str(msg))
+        """
+        Publish the message
+        :param topic: the topic
+        :param in_msg: str/ dict of text framing, any object of binary framing
+            the payload buffers (bytes, numpy arrays) are sent without copy, do not modify them after pub
+        :return: True if published, False if dropped by on_full drop
+        """
+        if self.framing == 'binary':
+            sent = self.send_frames([topic.encode(self.code)] + pack_frames(in_msg, self.serializer), copy=False)
+            self.logger.debug('Published to [%s]: %s', topic, type(in_msg).__name__)
+            return sent
+        sent = self.send_frames([topic.encode(self.code), encode_text(in_msg, self.code)])
+        self.logger.debug('Published to [%s]: %s', topic, in_msg)
+        return sent
 
 
 class QueueSub(QueueConnector):
-    def __init__(self, topics, host='tcp://127.0.0.1', port=12117, logger_name='Q_pub', timeout=-1, code='utf-8'):
-        QueueConnector.__init__(self, zmq.SUB, host=host, port=port, logger_name=logger_name)
+    def __init__(self, topics, host='tcp://127.0.0.1', port=12117, logger_name='Q_pub', timeout=-1, code='utf-8',
+                 framing='text', mode='connect', rcvhwm=None, conflate=False):
+        """
+        :param mode: [Default to connect] connect (to a QueueDevice) or bind
+        :param framing: [Default to text] text or binary, as the publisher
+        :param rcvhwm: [Default to None] the receive high-water mark
+        :param conflate: [Default to False] keep the latest message of each topic only, e.g. sensor readings
+        """
+        if framing not in ('text', 'binary'):
+            raise ValueError('Unknown framing ' + str(framing))
+        QueueConnector.__init__(self, zmq.SUB, host=host, port=port, mode=mode, logger_name=logger_name,
+                                rcvhwm=rcvhwm)
         self.topics = topics
         self.code = code
+        self.framing = framing
+        self.conflate = conflate
+        # {topic: data} of conflate, the latest message of each topic in arrival order
+        self._latest = OrderedDict()
         self.timeout = timeout
         self.set_timeout(timeout)
         self.topics = []
@@ -192,48 +622,114 @@ class QueueSub(QueueConnector):
         for top in topics:
             if top not in self.topics:
                 self.socket.setsockopt(zmq.SUBSCRIBE, top.encode(self.code))
-                self.logger.debug('Subscribed ' + top)
+                self.logger.debug('Subscribed %s', top)
         if topics and cleanup:
             # un-subscribe previous
-            for top in topics:
-                if top not in self.topics:
+            for top in self.topics:
+                if top not in topics:
                     self.socket.setsockopt(zmq.UNSUBSCRIBE, top.encode(self.code))
-                    self.logger.debug('Un-subscribed ' + top)
+                    self.logger.debug('Un-subscribed %s', top)
         return topics
 
+    def _recv(self, flags=0):
+        if self.framing == 'binary':
+            # topic, header & at least one payload frame, a shorter message (e.g. of a text publisher) is dropped
+            while True:
+                frames = self.socket.recv_multipart(flags, copy=False)
+                if len(frames) >= 3:
+                    break
+                self.counters['malformed'] += 1
+                self.logger.warning('Dropped a message of %d frames, not of binary framing', len(frames))
+            topic, data = frames[0].bytes, frames[1:]
+        else:
+            topic, data = self.socket.recv_multipart(flags)
+        self.counters['received'] += 1
+        return topic, data
+
+    def _drain(self):
+        """
+        Receive all queued messages, keep the latest of each topic
+        """
+        try:
+            while True:
+                topic, data = self._recv(zmq.NOBLOCK)
+                if self._latest.pop(topic, None) is not None:
+                    self.counters['conflated'] += 1
+                self._latest[topic] = data
+        except zmq.Again:
+            pass
+
     def sub_raw(self):
         """
         Raw method of sub
-        :return: topic & data
+        :return: topic & data, data is the list of header & payload frames (zmq.Frame) of binary framing
         """
-        topic, data = self.socket.recv_multipart()
+        if self.conflate:
+            self._drain()
+            if not self._latest:
+                topic, data = self._recv()
+                self._latest[topic] = data
+                self._drain()
+            topic, data = self._latest.popitem(last=False)
+        else:
+            topic, data = self._recv()
         self.last_topic = topic
         return topic, data
 
     def sub(self, topics=None):
         if topics and self.topics != topics:
             # listen to the new topics
-            # tps=self.sub_topics(topics)
             self.topics = self.sub_topics(topics)
-            self.logger.debug('Subscriber to:' + str(self.topics))
+            self.logger.debug('Subscriber to: %s', self.topics)
         topic, data = self.sub_raw()
-        self.logger.debug('Received [' + topic.decode(self.code) + '] ' + data.decode(self.code))
-        return data.decode(self.code)
+        if self.framing == 'binary':
+            msg = unpack_frames(data)
+            self.logger.debug('Received [%s] %s', topic, type(msg).__name__)
+            return msg
+        msg = data.decode(self.code)
+        self.logger.debug('Received [%s] %s', topic, msg)
+        return msg
 
 
 class MessagePusher(QueueConnector):
-    def __init__(self, host='tcp://127.0.0.1', port=12116, logger_name='Q_pub', code='utf-8'):
-        QueueConnector.__init__(self, zmq.PUSH, host=host, port=port, mode='bind', logger_name=logger_name)
+    def __init__(self, host='tcp://127.0.0.1', port=12116, logger_name='Q_pub', code='utf-8', sndhwm=None,
+                 on_full=None, send_timeout=-1):
+        """
+        :param sndhwm: [Default to None] the send high-water mark
+        :param on_full: [Default to None] None (block forever), drop or block (up to send_timeout)
+        :param send_timeout: [Default to -1] max ms to block of on_full block, <0 for block forever
+        """
+        QueueConnector.__init__(self, zmq.PUSH, host=host, port=port, mode='bind', logger_name=logger_name,
+                                sndhwm=sndhwm, on_full=on_full, send_timeout=send_timeout)
         self.code = code
 
     def pre_connect(self):
         pass
 
+    def push(self, msg):
+        """
+        Push the message to one of the pullers
+        :param msg: str/ dict (as JSON)/ bytes
+        :return: True if pushed, False if dropped by on_full drop
+        """
+        return self.send_frames([encode_text(msg, self.code)])
+
 
 class MessagePuller(QueueConnector):
-    def __init__(self, host='tcp://127.0.0.1', port=12116, logger_name='Q_pub', code='utf-8'):
-        QueueConnector.__init__(self, zmq.PULL, host=host, port=port, logger_name=logger_name)
+    def __init__(self, host='tcp://127.0.0.1', port=12116, logger_name='Q_pub', code='utf-8', rcvhwm=None):
+        """
+        :param rcvhwm: [Default to None] the receive high-water mark
+        """
+        QueueConnector.__init__(self, zmq.PULL, host=host, port=port, logger_name=logger_name, rcvhwm=rcvhwm)
         self.code = code
 
     def pre_connect(self):
         pass
+
+    def pull(self):
+        """
+        :return: the message str
+        """
+        msg = self.socket.recv()
+        self.counters['received'] += 1
+        return msg.decode(self.code)
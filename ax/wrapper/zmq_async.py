@@ -0,0 +1,383 @@
+"""
+The asyncio ZeroMQ connectors, same framing & flow control as ax.wrapper.zmq
+
+__author__ = "Alex Xiao <http://www.alexxiao.me/>"
+__date__ = "2026-10-18"
+__version__ = "0.1"
+
+    Version:
+        0.1 (18/10/2026): AsyncQueuePub/ AsyncQueueSub/ AsyncMessagePusher/ AsyncMessagePuller on zmq.asyncio
+
+All connectors share the zmq.asyncio context of the process, one event loop can serve hundreds of subscriptions.
+The messages are received with recv_multipart, a cancelled receive (e.g. asyncio.wait_for timeout, task cancel)
+never consumes a part of a message. close() ends the pending receives & the async iterations.
+
+    async with AsyncQueueSub(['sensor']) as sub:
+        async for topic, msg in sub:
+            ...
+
+Classes:
+    AsyncQueueConnector - the base class of the connectors
+    AsyncQueuePub - publish to the QueueDevice/ subscribers
+    AsyncQueueSub - subscribe topics, async iterator of (topic, message)
+    AsyncMessagePusher - push to the pullers
+    AsyncMessagePuller - pull from the pushers, async iterator of messages
+"""
+import asyncio
+from collections import OrderedDict
+from time import monotonic
+import zmq
+import zmq.asyncio
+from ax.base import Connector as Base_connector
+from ax.exception import Timeout
+from ax.wrapper.zmq import pack_frames, unpack_frames, encode_text, msgpack
+
+
+def get_context():
+    """
+    :return: the zmq.asyncio context shared by all connectors of the process
+    """
+    return zmq.asyncio.Context.instance()
+
+
+class AsyncQueueConnector(Base_connector):
+    """
+    The base class for all asyncio connectors
+    """
+
+    def __init__(self, type, host='tcp://127.0.0.1', port=12116, mode='connect', logger_name='AsyncQ_Connector',
+                 sndhwm=None, rcvhwm=None, on_full=None, send_timeout=-1, timeout=-1):
+        """
+        :param type: the zmq socket type
+        :param mode: [Default to connect] connect or bind
+        :param sndhwm: [Default to None] the send high-water mark, None for the zmq default (1000)
+        :param rcvhwm: [Default to None] the receive high-water mark, None for the zmq default (1000)
+        :param on_full: [Default to None] None, drop or block, when the peers are at the HWM
+        :param send_timeout: [Default to -1] max ms to block of on_full block, <0 for block forever
+        :param timeout: [Default to -1] the default receive timeout in ms, <0 for block forever
+        """
+        if on_full not in (None, 'drop', 'block'):
+            raise ValueError('Unknown on_full ' + str(on_full))
+        Base_connector.__init__(self, host=host, port=port, logger_name=logger_name)
+        self.type = type
+        self.mode = mode
+        self.sndhwm = sndhwm
+        self.rcvhwm = rcvhwm
+        self.on_full = on_full
+        self.send_timeout = send_timeout
+        self.timeout = timeout
+        self.counters = {'sent': 0, 'received': 0, 'dropped': 0, 'blocked': 0, 'timeouts': 0, 'conflated': 0}
+        self.closed = False
+        self.context = get_context()
+        self.socket = self.context.socket(type)
+        # the HWMs apply to the connections/ binds made afterwards
+        if sndhwm is not None:
+            self.socket.setsockopt(zmq.SNDHWM, sndhwm)
+        if rcvhwm is not None:
+            self.socket.setsockopt(zmq.RCVHWM, rcvhwm)
+        if on_full is not None and type == zmq.XPUB:
+            self.socket.setsockopt(zmq.XPUB_NODROP, 1)
+        addr = self.host + ":" + str(self.port)
+        if mode == 'connect':
+            self.socket.connect(addr)
+            self.logger.debug('Connected %s', addr)
+        elif mode == 'bind':
+            self.socket.bind(addr)
+            self.logger.debug('Binded %s', addr)
+
+    async def send_frames(self, frames, copy=True):
+        """
+        Send the multipart message with the on_full policy
+        :param frames: list of frames
+        :param copy: [Default to True] False to send the frames without copy
+        :return: True if sent, False if dropped
+        """
+        if self.on_full is None:
+            await self.socket.send_multipart(frames, copy=copy)
+        else:
+            try:
+                await self.socket.send_multipart(frames, zmq.NOBLOCK, copy=copy)
+            except zmq.Again:
+                if self.on_full == 'drop':
+                    self.counters['dropped'] += 1
+                    return False
+                await self._send_blocked(frames, copy)
+        self.counters['sent'] += 1
+        return True
+
+    async def _send_blocked(self, frames, copy):
+        self.counters['blocked'] += 1
+        deadline = monotonic() + self.send_timeout / 1000 if self.send_timeout >= 0 else None
+        while True:
+            # POLLOUT of XPUB is always set, retry in short steps
+            await asyncio.sleep(0.01 if deadline is None else max(min(0.01, deadline - monotonic()), 0))
+            try:
+                return await self.socket.send_multipart(frames, zmq.NOBLOCK, copy=copy)
+            except zmq.Again:
+                if deadline is not None and monotonic() >= deadline:
+                    self.counters['timeouts'] += 1
+                    raise Timeout('Timeout while sending to ' + self.host + ':' + str(self.port))
+
+    async def _recv(self, timeout=-1, copy=True):
+        """
+        Receive one multipart message
+        :param timeout: if <0 use the default timeout (block if <0 too), else timeout in ms
+        :return: list of frames
+        """
+        timeout = timeout if timeout >= 0 else self.timeout
+        try:
+            if timeout < 0:
+                frames = await self.socket.recv_multipart(copy=copy)
+            else:
+                frames = await asyncio.wait_for(self.socket.recv_multipart(copy=copy), timeout / 1000)
+        except asyncio.TimeoutError:
+            raise Timeout('Timeout while receiving from ' + self.host + ':' + str(self.port))
+        except asyncio.CancelledError:
+            task = asyncio.current_task()
+            # the future of a pending receive is cancelled by close, the task itself is not cancelling then
+            if self.closed and task is not None and hasattr(task, 'cancelling') and not task.cancelling():
+                raise StopAsyncIteration
+            raise
+        except zmq.ZMQError as e:
+            if self.closed and (isinstance(e, zmq.ContextTerminated) or e.errno == zmq.ENOTSOCK):
+                raise StopAsyncIteration
+            raise
+        self.counters['received'] += 1
+        return frames
+
+    def _recv_nowait(self, copy=True):
+        """
+        :return: list of frames of a queued message, None if no message
+        """
+        future = self.socket.recv_multipart(zmq.NOBLOCK, copy=copy)
+        try:
+            frames = future.result()
+        except zmq.Again:
+            return None
+        self.counters['received'] += 1
+        return frames
+
+    def flow_stats(self):
+        """
+        :return: the flow control settings & counters
+        """
+        return dict(self.counters, sndhwm=self.sndhwm, rcvhwm=self.rcvhwm, on_full=self.on_full,
+                    send_timeout=self.send_timeout)
+
+    def close(self):
+        """
+        Close the socket, the pending receives end with StopAsyncIteration
+        """
+        if not self.closed:
+            self.closed = True
+            self.socket.close(linger=0)
+
+    def disconnect(self):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class AsyncQueuePub(AsyncQueueConnector):
+    def __init__(self, host='tcp://127.0.0.1', port=12116, logger_name='AsyncQ_pub', code='utf-8', framing='text',
+                 serializer='pickle', mode='connect', sndhwm=None, on_full=None, send_timeout=-1):
+        """
+        :param framing: [Default to text] text or binary
+        :param serializer: [Default to pickle] the format of binary framing, pickle (protocol 5) or msgpack
+        :param on_full: [Default to None] None (PUB drops silently), drop or block (XPUB with XPUB_NODROP)
+        """
+        if framing not in ('text', 'binary'):
+            raise ValueError('Unknown framing ' + str(framing))
+        if serializer not in ('pickle', 'msgpack') or (serializer == 'msgpack' and msgpack is None):
+            raise ValueError('The serializer ' + str(serializer) + ' is not supported/ installed')
+        AsyncQueueConnector.__init__(self, zmq.PUB if on_full is None else zmq.XPUB, host=host, port=port,
+                                     mode=mode, logger_name=logger_name, sndhwm=sndhwm, on_full=on_full,
+                                     send_timeout=send_timeout)
+        self.code = code
+        self.framing = framing
+        self.serializer = serializer
+
+    async def pub(self, topic, in_msg):
+        """
+        Publish the message
+        :param topic: the topic
+        :param in_msg: str/ dict of text framing, any object of binary framing
+            the payload buffers (bytes, numpy arrays) are sent without copy, do not modify them after pub
+        :return: True if published, False if dropped by on_full drop
+        """
+        if self.framing == 'binary':
+            sent = await self.send_frames([topic.encode(self.code)] + pack_frames(in_msg, self.serializer),
+                                          copy=False)
+        else:
+            sent = await self.send_frames([topic.encode(self.code), encode_text(in_msg, self.code)])
+        self.logger.debug('Published to [%s]: %s', topic, type(in_msg).__name__)
+        return sent
+
+
+class AsyncQueueSub(AsyncQueueConnector):
+    def __init__(self, topics, host='tcp://127.0.0.1', port=12117, logger_name='AsyncQ_sub', timeout=-1,
+                 code='utf-8', framing='text', mode='connect', rcvhwm=None, conflate=False):
+        """
+        :param topics: the topic or list of topics
+        :param timeout: [Default to -1] the default timeout of sub in ms, <0 for block forever
+        :param framing: [Default to text] text or binary, as the publisher
+        :param conflate: [Default to False] keep the latest message of each topic only, e.g. sensor readings
+        """
+        if framing not in ('text', 'binary'):
+            raise ValueError('Unknown framing ' + str(framing))
+        AsyncQueueConnector.__init__(self, zmq.SUB, host=host, port=port, mode=mode, logger_name=logger_name,
+                                     rcvhwm=rcvhwm, timeout=timeout)
+        self.code = code
+        self.framing = framing
+        self.conflate = conflate
+        # {topic: frames} of conflate, the latest message of each topic in arrival order
+        self._latest = OrderedDict()
+        self.topics = []
+        self.sub_topics(topics)
+        self.last_topic = None
+
+    def sub_topics(self, topics, cleanup=True):
+        """
+        :param topics: the topic or list of topics to subscribe
+        :param cleanup: [Default to True] to un-subscribe previous subscribed topics
+        :return: the subscribed topics
+        """
+        if type(topics) == str:
+            topics = [topics]
+        for top in topics:
+            if top not in self.topics:
+                self.socket.setsockopt(zmq.SUBSCRIBE, top.encode(self.code))
+        if cleanup:
+            for top in self.topics:
+                if top not in topics:
+                    self.socket.setsockopt(zmq.UNSUBSCRIBE, top.encode(self.code))
+        self.topics = list(topics) if cleanup else self.topics + [t for t in topics if t not in self.topics]
+        return self.topics
+
+    def _decode(self, frames):
+        self.last_topic = frames[0] if isinstance(frames[0], bytes) else frames[0].bytes
+        if self.framing == 'binary':
+            return self.last_topic, unpack_frames(frames[1:])
+        return self.last_topic, frames[1].decode(self.code)
+
+    def _drain(self):
+        """
+        Receive all queued messages, keep the latest of each topic
+        """
+        while True:
+            frames = self._recv_nowait(copy=self.framing == 'text')
+            if frames is None:
+                return
+            topic = frames[0] if isinstance(frames[0], bytes) else frames[0].bytes
+            if self._latest.pop(topic, None) is not None:
+                self.counters['conflated'] += 1
+            self._latest[topic] = frames
+
+    async def sub(self, timeout=-1):
+        """
+        Receive one message
+        :param timeout: if <0 use the default timeout (block if <0 too), else timeout in ms
+        :return: topic bytes, message
+        """
+        copy = self.framing == 'text'
+        if not self.conflate:
+            return self._decode(await self._recv(timeout, copy=copy))
+        self._drain()
+        if not self._latest:
+            frames = await self._recv(timeout, copy=copy)
+            self._latest[frames[0] if copy else frames[0].bytes] = frames
+            self._drain()
+        return self._decode(self._latest.popitem(last=False)[1])
+
+    async def sub_many(self, max_messages=100, timeout=-1):
+        """
+        Receive a batch, wait for the first message only
+        :param max_messages: [Default to 100] max messages of the batch
+        :param timeout: if <0 use the default timeout (block if <0 too), else timeout in ms of the first message
+        :return: list of (topic bytes, message)
+        """
+        rtn = [await self.sub(timeout)]
+        copy = self.framing == 'text'
+        while len(rtn) < max_messages:
+            if self.conflate:
+                if not self._latest:
+                    break
+                rtn.append(self._decode(self._latest.popitem(last=False)[1]))
+                continue
+            frames = self._recv_nowait(copy=copy)
+            if frames is None:
+                break
+            rtn.append(self._decode(frames))
+        return rtn
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.closed:
+            raise StopAsyncIteration
+        return await self.sub()
+
+
+class AsyncMessagePusher(AsyncQueueConnector):
+    def __init__(self, host='tcp://127.0.0.1', port=12116, logger_name='AsyncQ_push', code='utf-8', mode='bind',
+                 sndhwm=None, on_full=None, send_timeout=-1):
+        """
+        :param on_full: [Default to None] None (block forever), drop or block (up to send_timeout)
+        """
+        AsyncQueueConnector.__init__(self, zmq.PUSH, host=host, port=port, mode=mode, logger_name=logger_name,
+                                     sndhwm=sndhwm, on_full=on_full, send_timeout=send_timeout)
+        self.code = code
+
+    async def push(self, msg):
+        """
+        Push the message to one of the pullers
+        :param msg: str/ dict (as JSON)/ bytes
+        :return: True if pushed, False if dropped by on_full drop
+        """
+        return await self.send_frames([encode_text(msg, self.code)])
+
+
+class AsyncMessagePuller(AsyncQueueConnector):
+    def __init__(self, host='tcp://127.0.0.1', port=12116, logger_name='AsyncQ_pull', code='utf-8', timeout=-1,
+                 mode='connect', rcvhwm=None):
+        """
+        :param timeout: [Default to -1] the default timeout of pull in ms, <0 for block forever
+        """
+        AsyncQueueConnector.__init__(self, zmq.PULL, host=host, port=port, mode=mode, logger_name=logger_name,
+                                     rcvhwm=rcvhwm, timeout=timeout)
+        self.code = code
+
+    async def pull(self, timeout=-1):
+        """
+        :param timeout: if <0 use the default timeout (block if <0 too), else timeout in ms
+        :return: the message str
+        """
+        return (await self._recv(timeout))[0].decode(self.code)
+
+    async def pull_many(self, max_messages=100, timeout=-1):
+        """
+        Pull a batch, wait for the first message only
+        :param max_messages: [Default to 100] max messages of the batch
+        :param timeout: if <0 use the default timeout (block if <0 too), else timeout in ms of the first message
+        :return: list of message str
+        """
+        rtn = [await self.pull(timeout)]
+        while len(rtn) < max_messages:
+            frames = self._recv_nowait()
+            if frames is None:
+                break
+            rtn.append(frames[0].decode(self.code))
+        return rtn
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.closed:
+            raise StopAsyncIteration
+        return await self.pull()
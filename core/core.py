@@ -4,16 +4,480 @@ This is the core of the Toby
 core is a task distributing centre, it listen to the queue and distribute the message to corresponding worker(s)
 
 __author__ = "Alex Xiao <http://www.alexxiao.me/>"
-__date__ = "2018-03-11"
-__version__ = "0.1"
+__date__ = "2026-10-18"
+__version__ = "0.2"
 
     Version:
         0.1 : implemented by using Redis queue + zmq pull-push mode to push task to workers
+        0.2 (18/10/2026): Distributor/ TaskWorker, redis list to ROUTER/ DEALER with credit based flow control,
+                          in flight tasks redelivered when the worker dies, dead letter after max attempts
 
+Distributor: pops the tasks of a redis list (Queue.push) when the workers have credit, sends them to the workers
+    no more tasks are popped than the credit available, pushed back to the queue when the distributor stops
+    the empty queue is polled every idle_interval, doubled after each empty poll up to max_idle_interval
+    the payloads are forwarded as is, the distributor never loads a task
+    each worker grants credit (READY n) & gets one back per result, the fast workers return credit sooner and get more
+    a task is in flight until its result, the tasks of a worker silent for worker_timeout are redelivered to the others
+    a task failed/ redelivered max_attempts times is pushed to the dead letter list <queue_name>.dead
+    delivery is at least once: a worker timed out but still alive may complete a redelivered task too
+
+Messages of the ROUTER/ DEALER socket, worker -> distributor:
+    READY <credit> - register/ grant more credit
+    DONE <task id> <result payload> - the result, pushed to the result_queue list if any, one credit back
+    FAIL <task id> <error> - the task raised, redelivered (up to max_attempts), one credit back
+    HEARTBEAT - sent by an idle worker every heartbeat seconds
+    BYE - the worker leaves, its tasks in flight are redelivered
+distributor -> worker:
+    TASK <task id> <payload>
+    RESET - the worker is unknown (e.g. timed out, distributor restarted), to register again, sent once per
+        worker_timeout until the READY, the worker registers with its free slots only
+
+Classes:
+    Distributor - the thread dispatching the tasks of a redis queue to the workers
+    TaskWorker - runs a function on the tasks of the distributor
 """
-from ax.info import Memory
+import os
+import socket
+import itertools
+import traceback
+from time import monotonic
+from collections import deque
+from threading import Thread, Event, Lock
+from concurrent.futures import ThreadPoolExecutor
+
+import zmq
+
+from ax.base import Connector as Base_connector
+from ax.tools import trace_error
+from ax.serializer import get_serializer, loads
+from ax.wrapper.redis import Queue
+
+
+_worker_ids = itertools.count()
+# the frames of the messages of the workers, incl. the identity
+_frame_counts = {b'READY': 3, b'DONE': 4, b'FAIL': 4, b'HEARTBEAT': 2, b'BYE': 2}
+
+
+class Distributor(Thread, Base_connector):
+    """
+        Dispatches the tasks of a redis queue to the workers over ROUTER/ DEALER
+
+        Sample code:
+            d = Distributor(queue_name='toby.tasks', port=12119, result_queue='toby.results')
+            d.daemon = True
+            d.start()
+            d.ready.wait()
+            Queue().push('toby.tasks', {'x': 1})
+            d.stats()
+            d.stop()
+    """
+
+    def __init__(self, queue_name='toby.tasks', host='tcp://*', port=12119, queue=None, result_queue=None,
+                 worker_timeout=5.0, max_attempts=3, batch_size=100, idle_interval=0.01, max_idle_interval=0.5,
+                 logger_name='Distributor'):
+        """
+        :param queue_name: the redis list of the tasks
+        :param host: the address to bind the ROUTER socket
+        :param port: the port to bind the ROUTER socket
+        :param queue: [Default to None] the ax.wrapper.redis.Queue, Queue() on localhost if None
+        :param result_queue: [Default to None] the redis list to push the result payloads, dropped if None
+        :param worker_timeout: [Default to 5] seconds without a message until a worker is dead
+        :param max_attempts: [Default to 3] max deliveries of a task, then it is pushed to <queue_name>.dead
+        :param batch_size: [Default to 100] max tasks popped in one LPOP/ results pushed in one RPUSH
+        :param idle_interval: [Default to 0.01] min seconds between the polls of the empty queue, max delay of results
+        :param max_idle_interval: [Default to 0.5] max seconds between the polls of the empty queue
+        """
+        Thread.__init__(self, name=logger_name)
+        Base_connector.__init__(self, host=host, port=port, logger_name=logger_name)
+        self.queue_name = queue_name
+        self.dead_queue = queue_name + '.dead'
+        self.queue = queue if queue is not None else Queue(logger_name=logger_name + '.queue')
+        self.result_queue = result_queue
+        self.worker_timeout = worker_timeout
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.idle_interval = idle_interval
+        self.max_idle_interval = max_idle_interval
+        self.ready = Event()
+        self.counters = {'fetched': 0, 'dispatched': 0, 'done': 0, 'failed': 0, 'redelivered': 0, 'dead': 0,
+                         'workers_lost': 0, 'malformed': 0}
+        self._running = False
+        # {identity: {generation, credit, in_flight {task id: (payload, deliveries)}, last_seen, done}}
+        self._workers = dict()
+        # one (identity, generation) per credit, round robin over the workers, stale after the worker is removed
+        self._tokens = deque()
+        self._credit = 0
+        # the back off of the polls of the empty queue
+        self._idle = idle_interval
+        self._next_fetch = 0
+        # (payload, deliveries) popped from redis, not dispatched yet
+        self._pending = deque()
+        # the result payloads are pushed in one RPUSH per batch_size/ idle_interval
+        self._results = []
+        self._results_ts = 0
+        self._dead = []
+        self._task_ids = itertools.count()
+        self._generations = itertools.count()
+        # {identity: ts} of the unknown workers RESET, the messages sent before their READY are not RESET again
+        self._reset = dict()
+
+    def run(self):
+        context = None
+        router = None
+        try:
+            context = zmq.Context()
+            router = context.socket(zmq.ROUTER)
+            # raise on the send to a disconnected worker, the queueing is bounded by the credit
+            router.setsockopt(zmq.ROUTER_MANDATORY, 1)
+            router.setsockopt(zmq.SNDHWM, 0)
+            router.setsockopt(zmq.RCVHWM, 0)
+            address = self.host + ':' + str(self.port)
+            self.logger.debug('Trying to bind ' + address)
+            router.bind(address)
+            poller = zmq.Poller()
+            poller.register(router, zmq.POLLIN)
+            check_interval = self.worker_timeout / 4
+            next_check = monotonic() + check_interval
+            self._running = True
+            self.logger.info(self.name + ' is ONLINE at ' + address)
+            self.ready.set()
+            while self._running:
+                more = self._fetch()
+                self._dispatch(router)
+                self._flush()
+                if more:
+                    timeout = 0
+                elif self._credit > len(self._pending) or self._results:
+                    # the next poll of the empty queue, or flush of the results
+                    timeout = max(self._next_fetch - monotonic(), 0) if self._credit > len(self._pending) else \
+                        self.max_idle_interval
+                    if self._results:
+                        timeout = min(timeout, self.idle_interval)
+                else:
+                    # no credit, woken up by the results
+                    timeout = check_interval
+                if poller.poll(timeout * 1000):
+                    self._receive(router)
+                now = monotonic()
+                if now >= next_check:
+                    self._check_workers(now)
+                    next_check = now + check_interval
+        except:
+            trace_error(self.logger)
+        finally:
+            self.logger.info(self.name + ' is preparing to go offline')
+            self._running = False
+            self.ready.set()
+            try:
+                self._flush(force=True)
+                self._requeue()
+            except:
+                trace_error(self.logger)
+            if router: router.close(linger=0)
+            if context: context.term()
+            self.logger.info(self.name + ' is OFFLINE')
+
+    def _fetch(self):
+        """
+        Pop the tasks the workers have credit for, up to batch_size, backs off while the queue is empty
+        :return: True if the queue may have more
+        """
+        count = min(self.batch_size, self._credit - len(self._pending))
+        if count <= 0 or monotonic() < self._next_fetch:
+            return False
+        payloads = self.queue.pop_many(self.queue_name, count, raw=True)
+        if payloads:
+            self._idle = self.idle_interval
+            self._next_fetch = 0
+        else:
+            self._next_fetch = monotonic() + self._idle
+            self._idle = min(self._idle * 2, self.max_idle_interval)
+        self.counters['fetched'] += len(payloads)
+        self._pending.extend((p, 0) for p in payloads)
+        return len(payloads) == count
+
+    def _dispatch(self, router):
+        while self._pending and self._tokens:
+            identity, generation = self._tokens.popleft()
+            worker = self._workers.get(identity)
+            if worker is None or worker['generation'] != generation:
+                continue
+            payload, deliveries = self._pending.popleft()
+            task_id = str(next(self._task_ids)).encode()
+            try:
+                router.send_multipart([identity, b'TASK', task_id, payload], zmq.NOBLOCK)
+            except zmq.ZMQError:
+                # EHOSTUNREACH, the worker has disconnected
+                self._pending.appendleft((payload, deliveries))
+                self._remove_worker(identity, 'unreachable')
+                continue
+            worker['credit'] -= 1
+            self._credit -= 1
+            worker['in_flight'][task_id] = (payload, deliveries + 1)
+            self.counters['dispatched'] += 1
+
+    def _receive(self, router, max_messages=10000):
+        now = monotonic()
+        for _ in range(max_messages):
+            try:
+                frames = router.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                return
+            if len(frames) < 2 or _frame_counts.get(frames[1]) != len(frames) or \
+                    (frames[1] == b'READY' and not frames[2].isdigit()):
+                # e.g. a peer of another version, dropped
+                self.counters['malformed'] += 1
+                self.logger.warning('Malformed message dropped from %s: %s',
+                                    frames[0].decode(errors='replace'), [f[:32] for f in frames[1:4]])
+                continue
+            identity, command = frames[0], frames[1]
+            worker = self._workers.get(identity)
+            if command == b'READY':
+                self._reset.pop(identity, None)
+                if worker is None:
+                    worker = {'generation': next(self._generations), 'credit': 0, 'in_flight': dict(),
+                              'last_seen': now, 'done': 0}
+                    self._workers[identity] = worker
+                    self.logger.info('Worker ' + identity.decode(errors='replace') + ' is ready, credit ' +
+                                     frames[2].decode())
+                worker['last_seen'] = now
+                self._grant(identity, worker, int(frames[2]))
+                continue
+            if worker is None:
+                if command == b'BYE':
+                    self._reset.pop(identity, None)
+                elif identity not in self._reset:
+                    self._reset[identity] = now
+                    router.send_multipart([identity, b'RESET'])
+                continue
+            worker['last_seen'] = now
+            if command == b'DONE':
+                if worker['in_flight'].pop(frames[2], None) is not None:
+                    self.counters['done'] += 1
+                    worker['done'] += 1
+                    if self.result_queue is not None:
+                        if not self._results:
+                            self._results_ts = now
+                        self._results.append(frames[3])
+                    self._grant(identity, worker, 1)
+            elif command == b'FAIL':
+                task = worker['in_flight'].pop(frames[2], None)
+                if task is not None:
+                    self.counters['failed'] += 1
+                    self.logger.warning('Task failed on worker %s: %s', identity.decode(errors='replace'),
+                                        frames[3].decode(errors='replace'))
+                    self._retry(*task)
+                    self._grant(identity, worker, 1)
+            elif command == b'BYE':
+                self._remove_worker(identity, 'left')
+
+    def _grant(self, identity, worker, credit):
+        worker['credit'] += credit
+        self._credit += credit
+        self._tokens.extend([(identity, worker['generation'])] * credit)
+
+    def _retry(self, payload, deliveries):
+        if deliveries >= self.max_attempts:
+            self._dead.append(payload)
+            self.counters['dead'] += 1
+        else:
+            # ahead of the others, it has waited the longest
+            self._pending.appendleft((payload, deliveries))
+            self.counters['redelivered'] += 1
+
+    def _remove_worker(self, identity, reason):
+        worker = self._workers.pop(identity)
+        self._credit -= worker['credit']
+        for task in reversed(list(worker['in_flight'].values())):
+            self._retry(*task)
+        if reason != 'left':
+            self.counters['workers_lost'] += 1
+        log = self.logger.info if reason == 'left' and not worker['in_flight'] else self.logger.warning
+        log('Worker %s removed (%s), %d tasks in flight redelivered', identity.decode(errors='replace'), reason,
+            len(worker['in_flight']))
+
+    def _check_workers(self, now):
+        for identity, worker in list(self._workers.items()):
+            if now - worker['last_seen'] > self.worker_timeout:
+                self._remove_worker(identity, 'timeout')
+        for identity, ts in list(self._reset.items()):
+            if now - ts > self.worker_timeout:
+                # no READY, RESET again at its next message
+                del self._reset[identity]
+
+    def _flush(self, force=False):
+        if self._results and (force or len(self._results) >= self.batch_size or
+                              monotonic() - self._results_ts >= self.idle_interval):
+            self.queue.push_many(self.result_queue, self._results, raw=True)
+            self._results = []
+        if self._dead:
+            self.queue.push_many(self.dead_queue, self._dead, raw=True)
+            self._dead = []
+
+    def _requeue(self):
+        """
+        Push the tasks not done back to the head of the queue
+        """
+        payloads = [p for p, _ in self._pending]
+        for worker in self._workers.values():
+            payloads.extend(p for p, _ in worker['in_flight'].values())
+        if payloads:
+            self.queue.push_many(self.queue_name, payloads, raw=True, front=True)
+            self.logger.info('%d tasks not done are pushed back to %s', len(payloads), self.queue_name)
+        self._pending.clear()
+        self._workers.clear()
+        self._tokens.clear()
+        self._credit = 0
+
+    def stats(self):
+        """
+        :return: dict of the counters, tasks pending/ in flight, credit & the per worker credit/ in flight/ done
+        """
+        workers = {identity.decode(errors='replace'): {'credit': w['credit'], 'in_flight': len(w['in_flight']),
+                                                       'done': w['done']}
+                   for identity, w in dict(self._workers).items()}
+        return dict(self.counters, pending=len(self._pending), credit=self._credit,
+                    in_flight=sum(w['in_flight'] for w in workers.values()), workers=workers)
+
+    def stop(self):
+        """
+        Stop the distributor & wait for the thread to end, the tasks not done are pushed back to the queue
+        """
+        self._running = False
+        self.join()
+
+
+class TaskWorker(Base_connector):
+    """
+        Runs func on the tasks of the Distributor, by a thread pool of concurrency threads
+
+        Sample code:
+            w = TaskWorker(lambda task: task['x'] * 2, host='tcp://127.0.0.1', port=12119, concurrency=4)
+            w.run()  # till w.stop() from another thread
+    """
+
+    def __init__(self, func, host='tcp://127.0.0.1', port=12119, concurrency=1, credit=None, heartbeat=1.0,
+                 serializer=None, logger_name='TaskWorker'):
+        """
+        :param func: the function of the task, its return is the result
+        :param concurrency: [Default to 1] the threads running func
+        :param credit: [Default to 2 * concurrency] max tasks held, running & prefetched
+        :param heartbeat: [Default to 1] seconds between the heartbeats while idle, below the worker_timeout
+        :param serializer: [Default to TOBY_REDIS_SERIALIZER or legacy] the Serializer or its spec of the results
+        """
+        Base_connector.__init__(self, host=host, port=port, logger_name=logger_name)
+        self.func = func
+        self.concurrency = concurrency
+        self.credit = credit or 2 * concurrency
+        self.heartbeat = heartbeat
+        self.serializer = get_serializer(serializer)
+        self.identity = (socket.gethostname() + '.' + str(os.getpid()) + '.' + str(next(_worker_ids))).encode()
+        self.counters = {'received': 0, 'done': 0, 'failed': 0, 'resets': 0}
+        self._running = False
+        # the tasks received & not replied yet, by the loop thread
+        self._held = 0
+        # increased by RESET, the replies of the tasks received before are dropped by the distributor
+        self._epoch = 0
+        # (epoch, reply) of the pool threads, sent by the loop, the pipe is written when the list becomes non empty
+        self._replies = []
+        self._replies_lock = Lock()
+        self._wakeup = None
+
+    def run(self):
+        """
+        Work till stop, the running tasks are completed before leaving
+        """
+        context = None
+        dealer = None
+        executor = None
+        self._wakeup = os.pipe()
+        try:
+            context = zmq.Context()
+            dealer = context.socket(zmq.DEALER)
+            dealer.setsockopt(zmq.IDENTITY, self.identity)
+            dealer.setsockopt(zmq.LINGER, 1000)
+            address = self.host + ':' + str(self.port)
+            dealer.connect(address)
+            poller = zmq.Poller()
+            poller.register(dealer, zmq.POLLIN)
+            poller.register(self._wakeup[0], zmq.POLLIN)
+            executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix=self.logger_name)
+            self._running = True
+            dealer.send_multipart([b'READY', str(self.credit).encode()])
+            last_sent = monotonic()
+            self.logger.info('Worker ' + self.identity.decode() + ' connected to ' + address)
+            while self._running:
+                events = dict(poller.poll(max(self.heartbeat - (monotonic() - last_sent), 0) * 1000))
+                if self._wakeup[0] in events:
+                    os.read(self._wakeup[0], 65536)
+                while dealer in events:
+                    try:
+                        frames = dealer.recv_multipart(zmq.NOBLOCK)
+                    except zmq.Again:
+                        break
+                    if frames[0] == b'TASK':
+                        self.counters['received'] += 1
+                        self._held += 1
+                        executor.submit(self._execute, frames[1], frames[2], self._epoch)
+                    elif frames[0] == b'RESET':
+                        # the tasks held are redelivered to the others, their results are dropped, their slots are
+                        # granted as they complete
+                        self.counters['resets'] += 1
+                        self._epoch += 1
+                        self.logger.warning('Reset by the distributor, registering again, %d tasks held', self._held)
+                        dealer.send_multipart([b'READY', str(max(self.credit - self._held, 0)).encode()])
+                if self._send_replies(dealer):
+                    last_sent = monotonic()
+                if monotonic() - last_sent >= self.heartbeat:
+                    dealer.send(b'HEARTBEAT')
+                    last_sent = monotonic()
+        except:
+            trace_error(self.logger)
+        finally:
+            self._running = False
+            if executor:
+                # the prefetched tasks are redelivered by the distributor on BYE
+                executor.shutdown(wait=True, cancel_futures=True)
+            if dealer:
+                self._send_replies(dealer)
+                dealer.send(b'BYE')
+                dealer.close()
+            if context: context.term()
+            for fd in self._wakeup:
+                os.close(fd)
+            self._wakeup = None
+            self.logger.info('Worker ' + self.identity.decode() + ' is OFFLINE')
+
+    def _execute(self, task_id, payload, epoch):
+        try:
+            reply = [b'DONE', task_id, self.serializer.dumps(self.func(loads(payload)))]
+        except:
+            trace_error(self.logger)
+            reply = [b'FAIL', task_id, traceback.format_exc(limit=5).encode()]
+        with self._replies_lock:
+            self.counters['done' if reply[0] == b'DONE' else 'failed'] += 1
+            self._replies.append((epoch, reply))
+            # else the loop is woken up already & takes all the replies
+            wakeup = len(self._replies) == 1
+        if wakeup:
+            os.write(self._wakeup[1], b'\0')
 
+    def _send_replies(self, dealer):
+        with self._replies_lock:
+            replies, self._replies = self._replies, []
+        slots = 0
+        for epoch, reply in replies:
+            self._held -= 1
+            if epoch == self._epoch:
+                dealer.send_multipart(reply)
+            else:
+                # a task of before the RESET, the distributor does not know it
+                slots += 1
+        if slots:
+            dealer.send_multipart([b'READY', str(slots).encode()])
+        return bool(replies)
 
-class Distributor:
-    def __init__(self):
-        pass
\ No newline at end of file
+    def stop(self):
+        self._running = False
+        if self._wakeup:
+            os.write(self._wakeup[1], b'\0')
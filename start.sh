@@ -1,3 +1,5 @@
 #!/usr/bin/env bash
 source /opt/workspace/toby/set_variables.sh
+# the metrics files of the previous run
+rm -rf "${TOBY_METRICS_DIR:-/tmp/toby_metrics}"
 gunicorn -b 192.168.1.100:12116 -w 4 --threads 8 toby:app
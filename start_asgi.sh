@@ -0,0 +1,5 @@
+#!/usr/bin/env bash
+source /opt/workspace/toby/set_variables.sh
+# the metrics files of the previous run
+rm -rf "${TOBY_METRICS_DIR:-/tmp/toby_metrics}"
+uvicorn --host 192.168.1.100 --port 12116 --workers 4 toby_asgi:app
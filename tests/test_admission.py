@@ -0,0 +1,65 @@
+import pytest
+from ax.admission import TokenBucket, AdmissionControl
+from ax.exception import Overloaded
+
+
+def test_token_bucket_burst_then_refill():
+    bucket = TokenBucket(10, burst=2)
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0
+    wait = bucket.acquire()
+    assert 0 < wait <= 0.1
+    bucket.ts -= 0.1
+    assert bucket.acquire() == 0
+
+
+def test_token_bucket_zero_rate():
+    bucket = TokenBucket(0, burst=1)
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == float('inf')
+
+
+def test_disabled_without_limits():
+    control = AdmissionControl()
+    assert not control.enabled
+    assert control.acquire('m.f') is None
+    control.release(None)
+    assert control.stats() == {}
+
+
+def test_concurrency_limit_sheds_and_releases():
+    control = AdmissionControl(concurrency_limits={'m.f': 2}, retry_after=3)
+    first, second = control.acquire('m.f'), control.acquire('m.f')
+    with pytest.raises(Overloaded) as e:
+        control.acquire('m.f')
+    assert (e.value.handler, e.value.reason, e.value.retry_after) == ('m.f', 'concurrency', 3)
+    # other handlers are not limited
+    assert control.acquire('m.g') is not None
+    control.release(first)
+    assert control.acquire('m.f') is not None
+    control.release(second)
+    stats = control.stats()['m.f']
+    assert (stats['in_flight'], stats['admitted'], stats['shed']) == (1, 3, {'concurrency': 1, 'rate': 0})
+
+
+def test_rate_limit_sheds_with_retry_after():
+    control = AdmissionControl(rate_limits={'m.f': (1, 1)})
+    control.release(control.acquire('m.f'))
+    with pytest.raises(Overloaded) as e:
+        control.acquire('m.f')
+    assert e.value.reason == 'rate'
+    assert 0 < e.value.retry_after <= 1
+    assert control.stats()['m.f']['shed'] == {'concurrency': 0, 'rate': 1}
+    assert control.stats()['m.f']['rate'] == 1
+
+
+def test_default_limit_is_per_handler():
+    control = AdmissionControl(concurrency_limits={'*': 1, 'm.g': 2})
+    control.acquire('m.f')
+    with pytest.raises(Overloaded):
+        control.acquire('m.f')
+    # '*' is the limit of each handler not listed, not a shared one
+    control.acquire('m.h')
+    control.acquire('m.g')
+    control.acquire('m.g')
+    assert {h: s['max_concurrency'] for h, s in control.stats().items()} == {'m.f': 1, 'm.h': 1, 'm.g': 2}
@@ -0,0 +1,122 @@
+import time
+import threading
+import pytest
+import redis
+import zmq
+from ax.serializer import get_serializer, loads
+from ax.wrapper.redis import Queue
+from core.core import Distributor, TaskWorker
+
+
+serializer = get_serializer()
+
+
+def recv(router):
+    frames = router.recv_multipart()
+    while frames[1] == b'HEARTBEAT':
+        frames = router.recv_multipart()
+    return frames
+
+
+@pytest.fixture
+def queue():
+    r = redis.Redis(host='localhost', port=12116, db=11)
+    try:
+        r.ping()
+    except redis.ConnectionError:
+        pytest.skip('redis is not available on localhost:12116')
+    return Queue(redis_instance=r)
+
+
+def test_truncated_ready_is_dropped(queue):
+    name = 'toby.test.tasks.' + str(time.time())
+    distributor = Distributor(queue_name=name, host='tcp://127.0.0.1', port=23219, queue=queue)
+    distributor.daemon = True
+    distributor.start()
+    distributor.ready.wait()
+    context = zmq.Context()
+    dealer = context.socket(zmq.DEALER)
+    dealer.setsockopt(zmq.LINGER, 0)
+    dealer.connect('tcp://127.0.0.1:23219')
+    try:
+        dealer.send(b'READY')
+        dealer.send_multipart([b'READY', b'x'])
+        dealer.send_multipart([b'DONE', b'1'])
+        dealer.send_multipart([b'READY', b'1'])
+        queue.push(name, {'x': 1})
+        assert dealer.poll(5000)
+        frames = dealer.recv_multipart()
+        assert frames[0] == b'TASK'
+        assert distributor.is_alive()
+        assert distributor.stats()['malformed'] == 3
+    finally:
+        distributor.stop()
+        dealer.close()
+        context.term()
+        queue._redis.delete(name)
+
+
+def test_worker_registers_free_slots_after_reset():
+    context = zmq.Context()
+    router = context.socket(zmq.ROUTER)
+    router.setsockopt(zmq.LINGER, 0)
+    router.setsockopt(zmq.RCVTIMEO, 5000)
+    router.bind('tcp://127.0.0.1:23220')
+    release = threading.Event()
+    worker = TaskWorker(lambda task: release.wait(5) and task, host='tcp://127.0.0.1', port=23220, concurrency=2,
+                        credit=3)
+    thread = threading.Thread(target=worker.run, daemon=True)
+    thread.start()
+    try:
+        identity, command, credit = router.recv_multipart()
+        assert (command, credit) == (b'READY', b'3')
+        router.send_multipart([identity, b'TASK', b'1', serializer.dumps(1)])
+        router.send_multipart([identity, b'TASK', b'2', serializer.dumps(2)])
+        time.sleep(0.2)
+        # e.g. timed out, the 2 tasks held are redelivered by the distributor
+        router.send_multipart([identity, b'RESET'])
+        assert recv(router)[1:] == [b'READY', b'1']
+        release.set()
+        slots = 0
+        while slots < 2:
+            frames = router.recv_multipart()
+            if frames[1] == b'READY':
+                slots += int(frames[2])
+            else:
+                # no result of the tasks before RESET, only heartbeats
+                assert frames[1] == b'HEARTBEAT'
+        router.send_multipart([identity, b'TASK', b'3', serializer.dumps(3)])
+        frames = recv(router)
+        assert frames[1:3] == [b'DONE', b'3']
+        assert loads(frames[3]) == 3
+    finally:
+        release.set()
+        worker.stop()
+        thread.join(5)
+        router.close()
+        context.term()
+
+
+def test_unknown_worker_reset_once(queue):
+    distributor = Distributor(queue_name='toby.test.tasks.' + str(time.time()), host='tcp://127.0.0.1', port=23221,
+                              queue=queue)
+    distributor.daemon = True
+    distributor.start()
+    distributor.ready.wait()
+    context = zmq.Context()
+    dealer = context.socket(zmq.DEALER)
+    dealer.setsockopt(zmq.LINGER, 0)
+    dealer.connect('tcp://127.0.0.1:23221')
+    try:
+        # the messages sent before the READY of a worker timed out
+        for _ in range(3):
+            dealer.send(b'HEARTBEAT')
+        assert dealer.recv_multipart() == [b'RESET']
+        assert not dealer.poll(300)
+        dealer.send_multipart([b'READY', b'1'])
+        time.sleep(0.1)
+        assert distributor.stats()['credit'] == 1
+    finally:
+        distributor.stop()
+        dealer.close()
+        context.term()
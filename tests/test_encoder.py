@@ -0,0 +1,66 @@
+import io
+import json
+from datetime import date, datetime, timezone
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+import pytest
+import msgpack
+from ax.encoder import ResponseEncoder, JsonEncoder, format_http_datetime, series_values
+
+
+def test_format_http_datetime():
+    assert format_http_datetime(datetime(2026, 10, 18, 8)) == 'Sun, 18 Oct 2026 08:00:00 GMT'
+    assert format_http_datetime(date(2026, 10, 18)) == 'Sun, 18 Oct 2026 00:00:00 GMT'
+
+
+def test_series_values_vectorized_matches_scalar():
+    s = pd.Series(pd.to_datetime(['2026-10-18 08:00:01', None, '1969-12-31 23:59:59']))
+    assert series_values(s) == [format_http_datetime(datetime(2026, 10, 18, 8, 0, 1)), None,
+                                format_http_datetime(datetime(1969, 12, 31, 23, 59, 59))]
+    assert series_values(s, 'iso') == ['2026-10-18T08:00:01.000000', None, '1969-12-31T23:59:59.000000']
+    assert series_values(s.dt.tz_localize('UTC'), 'iso')[0] == '2026-10-18T08:00:01.000000+00:00'
+    assert series_values(pd.Series([1.5, np.nan])) == [1.5, None]
+
+
+@pytest.mark.parametrize('datetime_format', ['http', 'iso'])
+def test_json_types(datetime_format):
+    resp = {'dt': datetime(2026, 10, 18, 8), 'n': np.int64(3), 'a': np.arange(3), 'd': Decimal('1.5'),
+            'df': pd.DataFrame({'x': [1, 2], 'y': ['a', None]})}
+    body = json.loads(JsonEncoder(datetime_format=datetime_format).encode(resp))
+    assert body['dt'] == ('Sun, 18 Oct 2026 08:00:00 GMT' if datetime_format == 'http' else '2026-10-18T08:00:00')
+    assert (body['n'], body['a'], body['d']) == (3, [0, 1, 2], '1.5')
+    assert body['df'] == {'x': [1, 2], 'y': ['a', None]}
+
+
+def test_json_unsupported_type():
+    with pytest.raises(TypeError):
+        JsonEncoder().encode({'x': object()})
+
+
+def test_select_by_accept():
+    encoder = ResponseEncoder()
+    resp = {'request_id': '1', 'value': [1, 2]}
+    body, content_type = encoder.encode(resp)
+    assert (json.loads(body), content_type) == (resp, 'application/json')
+    body, content_type = encoder.encode(resp, 'application/x-msgpack;q=0.9, application/json')
+    assert (msgpack.unpackb(body), content_type) == (resp, 'application/x-msgpack')
+    # not tabular, Arrow is skipped for the next acceptable one
+    assert encoder.encode(resp, 'application/vnd.apache.arrow.stream')[1] == 'application/json'
+    assert encoder.encode(resp, 'text/html')[1] == 'application/json'
+
+
+def test_msgpack_datetime_is_iso():
+    body, _ = ResponseEncoder().encode({'dt': datetime(2026, 10, 18, 8, tzinfo=timezone.utc)}, 'application/x-msgpack')
+    assert msgpack.unpackb(body) == {'dt': '2026-10-18T08:00:00+00:00'}
+
+
+def test_arrow_tabular():
+    pyarrow = pytest.importorskip('pyarrow')
+    df = pd.DataFrame({'x': [1, 2], 'y': ['a', 'b']})
+    body, content_type = ResponseEncoder().encode({'request_id': '1', 'data': df},
+                                                  'application/vnd.apache.arrow.stream')
+    assert content_type == 'application/vnd.apache.arrow.stream'
+    table = pyarrow.ipc.open_stream(io.BytesIO(body)).read_all()
+    assert table.to_pandas().equals(df)
+    assert json.loads(table.schema.metadata[b'toby']) == {'request_id': '1'}
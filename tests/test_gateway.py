@@ -0,0 +1,114 @@
+import json
+import time
+import logging
+import threading
+from ax.gateway import Gateway, Memoizer
+from ax.tools import encrypt
+
+
+class DictCache:
+    def __init__(self):
+        self.values = dict()
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def put(self, key, val=None, expire=-1):
+        self.values[key] = val
+
+
+class MemoGateway:
+    def __init__(self):
+        self.cache = DictCache()
+        self.logger = logging.getLogger('test')
+
+
+def run_concurrently(n, func):
+    results = [None] * n
+
+    def target(i):
+        results[i] = func(i)
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    return results
+
+
+def test_memoizer_single_flight():
+    memoizer = Memoizer(MemoGateway())
+    calls = []
+
+    def handler():
+        calls.append(1)
+        time.sleep(0.3)
+        return {'request_id': 'first', 'value': 42}
+
+    results = run_concurrently(5, lambda i: memoizer.get_or_run('m.f', {'request_id': str(i), 'x': 1}, 60, handler))
+    assert len(calls) == 1
+    assert [r['value'] for r in results] == [42] * 5
+    # the shared result carries the request id of each waiting request
+    assert len({r['request_id'] for r in results}) == 5
+    assert memoizer.stats['m.f']['shared'] == 4
+    assert memoizer.get_or_run('m.f', {'request_id': 'later', 'x': 1}, 60, handler)['request_id'] == 'later'
+    assert memoizer.stats['m.f']['hits'] == 1
+    assert len(calls) == 1
+
+
+def test_memoizer_key_ignores_volatile_fields():
+    memoizer = Memoizer(MemoGateway())
+    assert memoizer.key('m.f', {'request_id': '1', 'request_token': 'a', 'x': 1}) == \
+        memoizer.key('m.f', {'request_id': '2', 'request_token': 'b', 'x': 1})
+    assert memoizer.key('m.f', {'x': 1}) != memoizer.key('m.f', {'x': 2})
+
+
+def test_memoizer_error_is_not_cached():
+    gateway = MemoGateway()
+    memoizer = Memoizer(gateway)
+    assert memoizer.get_or_run('m.f', {'x': 1}, 60, lambda: {'request_status': 'error'})['request_status'] == 'error'
+    assert not gateway.cache.values
+
+
+def test_memoizer_wait_is_bounded():
+    memoizer = Memoizer(MemoGateway(), wait=0.2)
+    release = threading.Event()
+
+    def hanging():
+        release.wait(10)
+        return 'late'
+
+    leader = threading.Thread(target=memoizer.get_or_run, args=('m.f', {'x': 1}, 60, hanging))
+    leader.start()
+    time.sleep(0.1)
+    start = time.monotonic()
+    assert memoizer.get_or_run('m.f', {'x': 1}, 60, lambda: 'direct') == 'direct'
+    assert time.monotonic() - start < 2
+    assert memoizer.stats['m.f']['timeouts'] == 1
+    release.set()
+    leader.join(10)
+
+
+def test_batch_invalid_token_fails_its_requests_only(tmp_path):
+    gateway = Gateway('secret', logging.getLogger('test'), metrics_dir=str(tmp_path))
+    token = encrypt('secret').decode()
+    requests = [{'request_token': token, 'request_id': 'a'}, {'request_token': 'forged', 'request_id': 'b'},
+                {'request_id': 'c'}, {'request_token': token}, {'request_token': 'forged', 'request_id': 'e'}]
+    valid, errors = gateway.prepare_batch(requests)
+    assert [r['request_id'] for r in valid][0] == 'a'
+    assert len(valid) == 2 and valid[1]['request_id']
+    lines = [json.loads(line) for line in errors]
+    assert [line['request_id'] for line in lines] == ['b', 'c', 'e']
+    assert all(line['response']['request_id'] == line['request_id'] for line in lines)
+    assert all(line['response']['request_status'] == 'error' for line in lines)
+    # each distinct token is verified once
+    assert gateway.token_cache.stats()['misses'] == 3
+
+
+def test_handler_label_only_for_resolved_handlers(tmp_path):
+    gateway = Gateway('secret', logging.getLogger('test'), metrics_dir=str(tmp_path))
+    in_param = {'request_module': 'ax.datetime', 'request_function': 'now'}
+    assert gateway.handler_label(in_param) == 'unknown'
+    assert gateway.handler_label({'request_module': ['x'], 'request_function': 'now'}) == 'unknown'
+    gateway.resolve(in_param)
+    assert gateway.handler_label(in_param) == 'ax.datetime.now'
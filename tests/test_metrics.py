@@ -0,0 +1,37 @@
+import os
+from ax.metrics import Metrics
+
+
+def test_record_request_export(tmp_path):
+    metrics = Metrics(str(tmp_path))
+    for seconds in (0.0001, 0.02, 100):
+        metrics.record_request('m.f', 'ok', [('execute', seconds), ('total', seconds)])
+    metrics.record_request(None, 'error', [('total', 0.001)])
+    text = metrics.export()
+    assert 'toby_requests_total{handler="m.f",status="ok"} 3.0' in text
+    assert 'toby_requests_total{handler="unknown",status="error"} 1.0' in text
+    assert 'toby_request_phase_seconds_bucket{handler="m.f",phase="execute",le="0.0005"} 1.0' in text
+    assert 'toby_request_phase_seconds_bucket{handler="m.f",phase="execute",le="0.025"} 2.0' in text
+    assert 'toby_request_phase_seconds_bucket{handler="m.f",phase="execute",le="+Inf"} 3.0' in text
+    assert 'toby_request_phase_seconds_count{handler="m.f",phase="total"} 3.0' in text
+
+
+def test_keys_built_once(tmp_path):
+    metrics = Metrics(str(tmp_path))
+    for _ in range(100):
+        metrics.record_request('m.f', 'ok', [('execute', 0.01), ('total', 0.01)])
+    assert len(metrics._keys) == 1
+    assert len(metrics._histogram_keys) == 2
+
+
+def test_processes_summed_and_store_closed_after_fork(tmp_path):
+    metrics = Metrics(str(tmp_path))
+    metrics.inc('toby_requests_total', (('handler', 'm.f'), ('status', 'ok')))
+    pid = os.fork()
+    if pid == 0:
+        ok = metrics._store is None
+        metrics.inc('toby_requests_total', (('handler', 'm.f'), ('status', 'ok')))
+        os._exit(0 if ok else 1)
+    assert os.waitpid(pid, 0)[1] == 0
+    assert len(os.listdir(str(tmp_path))) == 2
+    assert 'toby_requests_total{handler="m.f",status="ok"} 2.0' in metrics.export()
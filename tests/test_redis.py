@@ -0,0 +1,143 @@
+import time
+import threading
+import asyncio
+import pytest
+import redis
+from ax.exception import Timeout
+from ax.wrapper.redis import Cache, Queue
+from ax.wrapper.redis_async import AsyncCache
+
+
+@pytest.fixture
+def rds():
+    r = redis.Redis(host='localhost', port=12116, db=11)
+    try:
+        r.ping()
+    except redis.ConnectionError:
+        pytest.skip('redis is not available on localhost:12116')
+    return r
+
+
+@pytest.mark.parametrize('xpending_idle', [True, False])
+def test_reliable_queue_redelivery(rds, xpending_idle):
+    queue = Queue(redis_instance=rds)
+    # False for the redis < 6.2 fallback
+    queue._xpending_idle = xpending_idle
+    name = 'toby.test.reliable.' + str(time.time())
+    try:
+        queue.enqueue(name, {'a': 1})
+        first = queue.dequeue(name, timeout=1, visibility_timeout=0.2)
+        assert first[1] == {'a': 1}
+        with pytest.raises(Timeout):
+            queue.dequeue(name, consumer='other', timeout=0.05, visibility_timeout=0.2)
+        time.sleep(0.3)
+        assert queue.dequeue(name, consumer='other', timeout=1, visibility_timeout=0.2) == first
+        assert queue.ack(name, first[0]) == 1
+        assert queue.ack(name, first[0]) == 0
+        assert queue.queue_stats(name)['depth'] == 0
+    finally:
+        rds.delete(name, name + '.dead')
+
+
+def test_reliable_queue_dead_letter(rds):
+    queue = Queue(redis_instance=rds)
+    name = 'toby.test.reliable.' + str(time.time())
+    try:
+        queue.enqueue(name, 'x')
+        queue.dequeue(name, timeout=1, visibility_timeout=0.05, max_attempts=1)
+        time.sleep(0.1)
+        with pytest.raises(Timeout):
+            queue.dequeue(name, timeout=0.1, visibility_timeout=0.05, max_attempts=1)
+        stats = queue.queue_stats(name)
+        assert (stats['depth'], stats['pending'], stats['dead_letter']) == (0, 0, 1)
+    finally:
+        rds.delete(name, name + '.dead')
+
+
+def test_async_cache_prefix_serializers(rds):
+    prefixes = {'toby.test.json.': 'json', 'toby.test.json.msgpack.': 'msgpack'}
+    cache = Cache(redis_instance=rds, prefix_serializers=prefixes)
+    keys = ['toby.test.json.a', 'toby.test.json.msgpack.b', 'toby.test.c']
+
+    async def run():
+        async_cache = AsyncCache(db=11, prefix_serializers=prefixes)
+        await async_cache.put(keys[0], val={'a': 1})
+        await async_cache.put_many({keys[1]: [1, 2], keys[2]: 'x'})
+        return await async_cache.get_many(keys)
+    try:
+        assert asyncio.run(run()) == [{'a': 1}, [1, 2], 'x']
+        assert [rds.get(key)[0] for key in keys] == [3, 2, 0x80]
+        assert cache.get_many(keys) == [{'a': 1}, [1, 2], 'x']
+    finally:
+        rds.delete(*keys)
+
+
+def test_get_or_compute_single_fill(rds):
+    cache = Cache(redis_instance=rds)
+    key = b'toby.test.compute.' + str(time.time()).encode()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        time.sleep(0.2)
+        return 42
+    try:
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute(key, fn, 60)))
+                   for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(10)
+        assert results == [42] * 5
+        assert len(calls) == 1
+        assert cache.get_or_compute(key, fn, 60) == 42
+        assert len(calls) == 1
+    finally:
+        rds.delete(key, key + b':xfetch', key + b':lock')
+
+
+def test_get_or_compute_value_without_meta(rds):
+    cache = Cache(redis_instance=rds)
+    key = 'toby.test.compute.' + str(time.time())
+    try:
+        cache.put(key, val='put')
+        assert cache.get_or_compute(key, lambda: 'computed', 60) == 'put'
+        assert cache.get_or_compute(key, lambda: 'computed', 60) == 'put'
+        assert rds.exists(key + ':xfetch')
+    finally:
+        rds.delete(key, key + ':xfetch')
+
+
+def test_get_or_compute_wait_timeout_saves(rds):
+    cache = Cache(redis_instance=rds)
+    key = 'toby.test.compute.' + str(time.time())
+    try:
+        # held by a caller which hangs
+        rds.set(key + ':lock', b'other', px=5000)
+        assert cache.get_or_compute(key, lambda: 'computed', 60, wait=0.1) == 'computed'
+        assert cache.compute_stats()['wait_timeouts'] == 1
+        assert cache.get(key) == 'computed'
+    finally:
+        rds.delete(key, key + ':xfetch', key + ':lock')
+
+
+def test_buffered_count_interval_must_be_positive():
+    with pytest.raises(ValueError):
+        Cache(count_flush_interval=0)
+    with pytest.raises(ValueError):
+        Cache(count_flush_interval=-1)
+
+
+def test_buffered_count(rds):
+    cache = Cache(redis_instance=rds, count_flush_interval=0.1)
+    key = 'toby.test.count.' + str(time.time())
+    try:
+        for _ in range(10):
+            cache.count(key)
+        cache.count(key + '.hash', 'sub', step=2)
+        time.sleep(0.5)
+        assert int(rds.get(key)) == 10
+        assert int(rds.hget(key + '.hash', 'sub')) == 2
+    finally:
+        rds.delete(key, key + '.hash')
@@ -0,0 +1,48 @@
+import time
+import threading
+import pytest
+import redis
+from ax.exception import Timeout
+from ax.wrapper.redis import RpcClient, RpcServer
+
+
+@pytest.fixture
+def rds():
+    r = redis.Redis(host='localhost', port=12116, db=11)
+    try:
+        r.ping()
+    except redis.ConnectionError:
+        pytest.skip('redis is not available on localhost:12116')
+    return r
+
+
+def test_cancelled_call_does_not_break_client(rds):
+    topic = 'toby.test.rpc.' + str(time.time())
+    gate = threading.Event()
+    server = RpcServer(redis_instance=rds)
+
+    def handler(request):
+        if request == 'slow':
+            gate.wait(5)
+        return request * 2 if request != 'slow' else 'late'
+    threading.Thread(target=server.serve, args=(topic, handler), daemon=True).start()
+    client = RpcClient(redis_instance=rds)
+    try:
+        time.sleep(0.2)
+        # the reply of the cancelled call arrives later
+        cancelled = client.call_async(topic, 'slow', timeout=5)
+        assert cancelled.cancel()
+        # the deadline of the cancelled call passes
+        expiring = client.call_async(topic, 'slow', timeout=0.2)
+        assert expiring.cancel()
+        time.sleep(0.4)
+        gate.set()
+        time.sleep(0.2)
+        # bounded waits, a broken client hangs
+        assert client.call_async(topic, 21, timeout=2).result(timeout=3) == 42
+        with pytest.raises(Timeout):
+            client.call_async('toby.test.rpc.nobody', 1, timeout=0.5).result(timeout=3)
+        assert client.in_flight() == 0
+    finally:
+        server.stop()
+        client.close()
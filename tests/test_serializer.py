@@ -0,0 +1,65 @@
+import pickle
+import pytest
+import numpy as np
+from ax.serializer import Serializer, get_serializer, loads
+
+
+def test_default_is_legacy_pickle():
+    payload = get_serializer().dumps({'a': 1})
+    assert get_serializer().fmt == 'legacy'
+    # the old readers load it by plain pickle.loads
+    assert pickle.loads(payload) == {'a': 1}
+
+
+def test_default_from_env(monkeypatch):
+    monkeypatch.setenv('TOBY_REDIS_SERIALIZER', 'msgpack:zstd:10')
+    serializer = get_serializer()
+    assert (serializer.fmt, serializer.compression, serializer.compress_threshold) == ('msgpack', 'zstd', 10)
+
+
+@pytest.mark.parametrize('spec', ['legacy', 'pickle', 'pickle:lz4:0', 'pickle:zstd:0', 'msgpack', 'msgpack:lz4:0',
+                                  'json', 'json:zstd:0'])
+def test_round_trip(spec):
+    obj = {'a': [1, 2.5, 'x'], 'b': None, 'c': 'y' * 100}
+    payload = get_serializer(spec).dumps(obj)
+    assert loads(payload) == obj
+    assert Serializer.loads(payload) == obj
+
+
+def test_old_payload_is_loaded():
+    assert loads(pickle.dumps({'a': 1}, protocol=2)) == {'a': 1}
+    assert loads(pickle.dumps({'a': 1})) == {'a': 1}
+
+
+def test_new_payload_has_a_header():
+    assert get_serializer('pickle').dumps(1)[0] != 0x80
+    assert get_serializer('json').dumps(1)[0] == 3
+
+
+def test_compress_threshold():
+    serializer = get_serializer('json:zstd:1000')
+    assert serializer.dumps('x' * 10)[0] == 3
+    big = serializer.dumps('x' * 10000)
+    assert big[0] == 3 | 2 << 3
+    assert len(big) < 1000
+    assert loads(big) == 'x' * 10000
+
+
+def test_pickle_arrays_out_of_band():
+    a = np.arange(100000, dtype=np.float64)
+    b = loads(get_serializer('pickle').dumps({'a': a}))['a']
+    assert np.array_equal(a, b)
+    # a view of the payload, read-only
+    assert not b.flags.writeable
+    assert loads(get_serializer('legacy').dumps(a)).flags.writeable
+
+
+def test_invalid_specs():
+    with pytest.raises(ValueError):
+        Serializer('yaml')
+    with pytest.raises(ValueError):
+        Serializer('pickle', compression='gzip')
+    with pytest.raises(ValueError):
+        Serializer('legacy', compression='lz4')
+    with pytest.raises(ValueError):
+        loads(bytes((0x07,)) + b'x')
@@ -0,0 +1,14 @@
+from ax.wrapper.sqlalchemy import get_engine, get_pool_status, borrow_connection
+
+
+def test_engines_keyed_by_uri_and_options(tmp_path):
+    uri = 'sqlite:///' + str(tmp_path / 'toby.db')
+    engine = get_engine(uri, pool_size=2)
+    assert get_engine(uri, pool_size=2) is engine
+    assert get_engine(uri, pool_size=3) is not engine
+    assert get_engine(uri, connect_args={'timeout': 5}) is not engine
+    borrow_connection(uri, pool_size=3).close()
+    status = {name: s for name, s in get_pool_status().items() if str(tmp_path) in name}
+    assert len(status) == 3
+    assert sorted(s['size'] for s in status.values()) == [2, 3, 5]
+    assert sum(s['borrowed'] for s in status.values()) == 1
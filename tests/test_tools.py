@@ -0,0 +1,54 @@
+from ax.tools import TokenCache, encrypt
+
+
+def test_token_verified_once_then_cached():
+    cache = TokenCache('secret')
+    token = encrypt('secret')
+    assert cache.verify(token)
+    assert cache.verify(token)
+    assert cache.stats()['misses'] == 1
+    assert cache.stats()['hits'] == 1
+
+
+def test_forged_token_is_negative_cached():
+    cache = TokenCache('secret')
+    assert not cache.verify(encrypt('other'))
+    assert not cache.verify('forged')
+    assert not cache.verify('forged')
+    assert cache.stats()['misses'] == 2
+    assert cache.stats()['rejected'] == 3
+
+
+def test_cached_only_does_not_decrypt():
+    cache = TokenCache('secret')
+    token = encrypt('secret')
+    assert cache.verify(token, cached_only=True) is None
+    assert cache.stats()['misses'] == 0
+    assert cache.verify(token)
+    assert cache.verify(token, cached_only=True) is True
+    assert cache.verify('forged') is False
+    assert cache.verify('forged', cached_only=True) is False
+
+
+def test_throttled_refuses_unknown_tokens_without_decrypt():
+    cache = TokenCache('secret', max_failures=3, failure_window=60)
+    known = encrypt('secret')
+    assert cache.verify(known)
+    for i in range(3):
+        assert not cache.verify('forged' + str(i))
+    misses = cache.stats()['misses']
+    assert not cache.verify('forged.new')
+    # a valid token not seen yet is refused too until the window resets
+    assert not cache.verify(encrypt('secret'))
+    assert cache.stats()['misses'] == misses
+    assert cache.stats()['throttled'] == 2
+    # the tokens already verified are still accepted
+    assert cache.verify(known)
+
+
+def test_throttle_resets_with_the_window():
+    cache = TokenCache('secret', max_failures=1, failure_window=60)
+    assert not cache.verify('forged')
+    assert not cache.verify(encrypt('secret'))
+    cache._window_start -= 61
+    assert cache.verify(encrypt('secret'))
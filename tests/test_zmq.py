@@ -0,0 +1,28 @@
+import time
+import numpy as np
+from ax.wrapper.zmq import QueuePub, QueueSub, pack_frames, unpack_frames
+
+
+def test_pack_frames_round_trip():
+    a = np.arange(1000, dtype=np.int32)
+    obj = unpack_frames(pack_frames({'a': a, 'b': 'x'}))
+    assert np.array_equal(obj['a'], a) and obj['b'] == 'x'
+    assert unpack_frames(pack_frames({'b': [1, 2]}, 'msgpack')) == {'b': [1, 2]}
+    assert bytes(unpack_frames(pack_frames(b'raw'))) == b'raw'
+
+
+def test_binary_sub_drops_short_messages():
+    pub = QueuePub(port=23319, mode='bind', framing='binary')
+    sub = QueueSub(['t'], port=23319, framing='binary', timeout=5000)
+    try:
+        time.sleep(0.3)
+        # the text framing of the old publisher, topic & payload
+        pub.socket.send_multipart([b't', b'text'])
+        pub.pub('t', {'i': 1})
+        pub.pub('t', {'i': 2})
+        assert sub.sub() == {'i': 1}
+        assert sub.sub() == {'i': 2}
+        assert sub.counters['malformed'] == 1
+    finally:
+        sub.disconnect()
+        pub.disconnect()
@@ -1,68 +1,144 @@
 # The Core of Toby
-from flask import Flask, request, jsonify, g
+from flask import Flask, Response, request, g
 import os
 import logging
-from ax.log import trace_error
-from ax.connection import DatabaseConnection
-from ax.datetime import now
-from ax.tools import load_function, get_uuid, decrypt
-from ax.exception import InvalidToken
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from ax.gateway import build_gateway
+from ax.exception import Overloaded
 
 
 logger = logging.getLogger('werkzeug')
 debug_flg = True if os.getenv('TOBY_DEBUG', 'True') == 'True' else False
-token = os.environ['TOBY_TOKEN']
+gateway = build_gateway(logger)
+# batch requests run on this bounded pool, per worker process
+batch_executor = ThreadPoolExecutor(max_workers=int(os.getenv('TOBY_BATCH_THREADS', '8')),
+                                    thread_name_prefix='Toby.Batch')
 app = Flask('Toby')
 # app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.logger.setLevel(logging.DEBUG if debug_flg else logging.INFO)
 
 
 def get_db():
-    """Opens a new database connection if there is none yet for the
-    current application context.
+    """Borrows a database connection from the process-wide pool if there is
+    none yet for the current application context.
     """
     if not hasattr(g, 'db'):
-        g.db = DatabaseConnection(os.getenv('TOBY_DB_USER', 'toby'), os.environ['TOBY_DB_PASSWORD'])
+        g.db = gateway.connect_db()
     return g.db
 
 
 @app.teardown_appcontext
 def close_db(error):
-    """Closes the database again at the end of the request."""
+    """Returns the database connection to the pool at the end of the request."""
     if hasattr(g, 'db'):
         g.db.disconnect()
         if error:
             logger.error('Database connection closed because of :' + str(error))
 
 
+def respond(resp, timer=None, status=200, headers=None):
+    """Encode the response by the Accept header of the request, record the request to the metrics if timed."""
+    body, content_type = gateway.encode(resp, request.headers.get('Accept'))
+    if timer is not None:
+        timer.phase('serialize')
+        timer.done()
+    return Response(body, status=status, headers=headers, content_type=content_type)
+
+
 @app.route("/")
 def ping():
     return "<h1 style='color:blue'>Hello There! This is Toby</h1>"
 
 
+@app.route("/metrics")
+def metrics():
+    """The request metrics of all worker processes, in Prometheus text format."""
+    return Response(gateway.metrics.export(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route("/admin/reload")
+def reload_handlers():
+    """Reload the given request_module, or all loaded handler modules."""
+    try:
+        resp = gateway.reload(request.get_json(force=True, silent=False, cache=False))
+    except:
+        resp = gateway.error()
+        del resp['request_id']
+    return respond(resp)
+
+
+@app.route("/admin/stats")
+def stats():
+    """The gateway stats of this worker process."""
+    try:
+        resp = gateway.stats(request.get_json(force=True, silent=False, cache=False))
+    except:
+        resp = gateway.error()
+        del resp['request_id']
+    return respond(resp)
+
+
 @app.route("/process")
 def process():
     request_id = None
+    timer = gateway.metrics.timer()
     try:
         in_param = request.get_json(force=True, silent=False, cache=False)
-        if decrypt(in_param['request_token']) != token:
-            # verify token
-            raise InvalidToken(in_param)
-        if 'request_id' not in in_param:
-            request_id = get_uuid()
-            in_param['request_id'] = request_id
-        else:
-            request_id = in_param['request_id']
-        if 'request_timestamp' not in in_param:
-            in_param['request_timestamp'] = now()
-        in_param['logger'] = logger
-        in_param['get_db_connection'] = get_db
-        func = load_function(in_param)
-        resp = func()
+        request_id = gateway.prepare(in_param, get_db)
+        timer.handler = gateway.handler_label(in_param)
+        timer.phase('token')
+        # shed at once if the handler is over its limits, instead of queueing for the threads
+        with gateway.admit(in_param):
+            if request.args.get('mode') == 'async':
+                # run on Dask, the result is fetched via /result/<request_id>
+                resp = gateway.submit(in_param)
+            else:
+                func = gateway.resolve(in_param)
+                timer.handler = gateway.handler_name(in_param)
+                timer.phase('resolve')
+                resp = gateway.execute(func, in_param)
+        timer.phase('execute')
+    except Overloaded as e:
+        timer.status = 'shed'
+        resp, status, retry_after = gateway.shed(e, request_id)
+        return respond(resp, timer, status=status, headers={'Retry-After': str(retry_after)})
+    except:
+        timer.status = 'error'
+        resp = gateway.error(request_id)
+    return respond(resp, timer)
+
+
+@app.route("/result/<request_id>")
+def result(request_id):
+    """Long-poll the async job status/ result, wait up to ?timeout= seconds."""
+    try:
+        resp = gateway.wait_result(request.get_json(force=True, silent=False, cache=False), request_id,
+                                   timeout=float(request.args.get('timeout', 0)))
     except:
-        e = trace_error(logger)
-        resp = {'request_id': request_id, 'request_status': 'error', 'request_error': str(e[-1])}
-    return jsonify(resp)
+        resp = gateway.error(request_id)
+    return respond(resp)
+
+
+@app.route("/process/batch", methods=['GET', 'POST'])
+def process_batch():
+    """Run an array of requests concurrently, stream the results as NDJSON in completion order."""
+    try:
+        requests, errors = gateway.prepare_batch(request.get_json(force=True, silent=False, cache=False))
+    except:
+        return respond(gateway.error())
+    timers = {r['request_id']: gateway.metrics.timer() for r in requests}
+    futures = {batch_executor.submit(gateway.run, r, timers[r['request_id']], False): r['request_id']
+               for r in requests}
+
+    def stream():
+        yield from errors
+        for f in as_completed(futures):
+            line = gateway.batch_line(futures[f], f.result())
+            timer = timers[futures[f]]
+            timer.phase('serialize')
+            timer.done()
+            yield line
+    return Response(stream(), mimetype='application/x-ndjson')
 
 
 if __name__ == "__main__":
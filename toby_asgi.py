@@ -0,0 +1,219 @@
+# The Core of Toby - asyncio (ASGI) serving mode, e.g. uvicorn toby_asgi:app
+# Same request/ response contract as toby.py
+#   - handlers declared as coroutines run on the event loop (should not use blocking calls)
+#   - sync handlers are offloaded to a bounded thread pool (TOBY_ASYNC_THREADS)
+import os
+import json
+import asyncio
+import logging
+import inspect
+from functools import partial
+from urllib.parse import parse_qs
+from concurrent.futures import ThreadPoolExecutor
+from ax.gateway import build_gateway, LazyConnection, job_pending_status
+from ax.exception import Overloaded
+
+
+logger = logging.getLogger('uvicorn.error')
+gateway = build_gateway(logger)
+executor = ThreadPoolExecutor(max_workers=int(os.getenv('TOBY_ASYNC_THREADS', '32')), thread_name_prefix='Toby')
+# max requests of one batch in flight
+batch_concurrency = int(os.getenv('TOBY_BATCH_THREADS', '8'))
+ping_page = b"<h1 style='color:blue'>Hello There! This is Toby</h1>"
+not_found_page = b'<h1>Not Found</h1>'
+
+
+async def read_body(receive):
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return body
+
+
+async def respond(send, body, status=200, content_type=b'application/json', headers=()):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', content_type), (b'content-length', str(len(body)).encode()),
+                            *headers]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def respond_encoded(send, resp, accept=None):
+    """Encode the response by the Accept header"""
+    body, content_type = gateway.encode(resp, accept)
+    await respond(send, body, content_type=content_type.encode())
+
+
+async def run_sync(func, *args, **kwargs):
+    """Run the blocking function on the thread pool"""
+    return await asyncio.get_running_loop().run_in_executor(executor, partial(func, *args, **kwargs))
+
+
+async def verify_token(in_param):
+    """Verify the request token, a token not in the cache is decrypted off the event loop"""
+    if gateway.verify_token(in_param, cached_only=True) is None:
+        await run_sync(gateway.verify_token, in_param)
+
+
+async def execute(in_param, timer, mode=None):
+    if mode == 'async':
+        # run on Dask, the result is fetched via /result/<request_id>
+        return await run_sync(gateway.submit, in_param)
+    # loading/ reloading the module reads & executes files, off the event loop
+    func = gateway.lookup(in_param) or await run_sync(gateway.resolve, in_param)
+    timer.handler = gateway.handler_name(in_param)
+    timer.phase('resolve')
+    if gateway.memo_ttl(in_param, func) is not None:
+        # memoized (incl. coroutine) handlers run with the blocking Cache on the thread pool
+        return await run_sync(gateway.execute, func, in_param)
+    if inspect.iscoroutinefunction(func):
+        return await func(**in_param)
+    return await run_sync(func, **in_param)
+
+
+async def run(in_param, timer, verify=True, mode=None):
+    """Run one request, the error envelope if failed, raise Overloaded if shed by the admission control"""
+    request_id = None
+    db = LazyConnection(gateway.connect_db)
+    try:
+        if verify:
+            await verify_token(in_param)
+        request_id = gateway.prepare(in_param, db, verify=False)
+        timer.handler = gateway.handler_label(in_param)
+        if verify:
+            timer.phase('token')
+        # shed at once if the handler is over its limits, instead of queueing for the threads
+        with gateway.admit(in_param):
+            resp = await execute(in_param, timer, mode)
+        timer.phase('execute')
+    except Overloaded:
+        timer.status = 'shed'
+        raise
+    except Exception:
+        timer.status = 'error'
+        resp = gateway.error(request_id)
+    finally:
+        if db.db is not None:
+            await run_sync(db.close)
+    return resp
+
+
+async def process(body, query, accept, send):
+    timer = gateway.metrics.timer()
+    status, headers = 200, ()
+    try:
+        in_param = json.loads(body)
+    except Exception:
+        timer.status = 'error'
+        resp = gateway.error()
+    else:
+        try:
+            resp = await run(in_param, timer, mode=query.get('mode'))
+        except Overloaded as e:
+            resp, status, retry_after = gateway.shed(e, in_param.get('request_id'))
+            headers = [(b'retry-after', str(retry_after).encode())]
+    body, content_type = gateway.encode(resp, accept)
+    timer.phase('serialize')
+    timer.done()
+    await respond(send, body, status=status, content_type=content_type.encode(), headers=headers)
+
+
+async def result(request_id, body, query):
+    """Long-poll the async job status/ result, wait up to ?timeout= seconds."""
+    try:
+        await verify_token(json.loads(body))
+        resp = await run_sync(gateway.job_status, request_id)
+        for interval in gateway.wait_intervals(float(query.get('timeout', 0))):
+            if resp['request_status'] not in job_pending_status:
+                break
+            await asyncio.sleep(interval)
+            resp = await run_sync(gateway.job_status, request_id)
+    except Exception:
+        resp = gateway.error(request_id)
+    return resp
+
+
+async def process_batch(body, send):
+    """Run an array of requests concurrently, stream the results as NDJSON in completion order."""
+    try:
+        # the distinct tokens are verified by prepare_batch, off the event loop
+        requests, errors = await run_sync(gateway.prepare_batch, json.loads(body))
+    except Exception:
+        return await respond(send, gateway.dumps(gateway.error()))
+    semaphore = asyncio.Semaphore(batch_concurrency)
+
+    async def run_one(in_param):
+        async with semaphore:
+            timer = gateway.metrics.timer()
+            try:
+                resp = await run(in_param, timer, verify=False)
+            except Overloaded as e:
+                resp = gateway.shed(e, in_param['request_id'])[0]
+            line = gateway.batch_line(in_param['request_id'], resp)
+            timer.phase('serialize')
+            timer.done()
+            return line
+
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [(b'content-type', b'application/x-ndjson')]})
+    for line in errors:
+        await send({'type': 'http.response.body', 'body': line, 'more_body': True})
+    for line in asyncio.as_completed([run_one(r) for r in requests]):
+        await send({'type': 'http.response.body', 'body': await line, 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def reload_handlers(body):
+    try:
+        resp = await run_sync(gateway.reload, json.loads(body))
+    except Exception:
+        resp = gateway.error()
+        del resp['request_id']
+    return resp
+
+
+async def stats(body):
+    try:
+        in_param = json.loads(body)
+        await verify_token(in_param)
+        resp = gateway.stats(in_param)
+    except Exception:
+        resp = gateway.error()
+        del resp['request_id']
+    return resp
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            executor.shutdown(wait=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    path = scope['path']
+    query = {k: v[-1] for k, v in parse_qs(scope.get('query_string', b'').decode()).items()}
+    accept = dict(scope['headers']).get(b'accept', b'').decode()
+    if path == '/':
+        await respond(send, ping_page, content_type=b'text/html; charset=utf-8')
+    elif path == '/process':
+        await process(await read_body(receive), query, accept, send)
+    elif path == '/process/batch':
+        await process_batch(await read_body(receive), send)
+    elif path.startswith('/result/'):
+        await respond_encoded(send, await result(path[len('/result/'):], await read_body(receive), query), accept)
+    elif path == '/metrics':
+        await respond(send, gateway.metrics.export().encode(), content_type=b'text/plain; version=0.0.4; charset=utf-8')
+    elif path == '/admin/stats':
+        await respond_encoded(send, await stats(await read_body(receive)), accept)
+    elif path == '/admin/reload':
+        await respond_encoded(send, await reload_handlers(await read_body(receive)), accept)
+    else:
+        await respond(send, not_found_page, status=404, content_type=b'text/html; charset=utf-8')
@@ -0,0 +1,79 @@
+"""
+Benchmark the bulk operations of ax.wrapper.redis.Cache against the per key put/ get/ delete, round trips & time
+    round trips are counted on the redis connection (one per command, one per pipeline/ MGET/ MSET)
+
+Start a local redis-server first, e.g.
+    redis-server --port 6379 &
+    python tools/benchmark_cache.py --port 6379 --keys 1000 100000
+"""
+import os
+import sys
+import time
+import argparse
+import redis
+
+
+class CountingConnection(redis.Connection):
+    """The redis connection counting the packed commands sent, i.e. the round trips"""
+    round_trips = 0
+
+    def send_packed_command(self, command, check_health=True):
+        CountingConnection.round_trips += 1
+        return redis.Connection.send_packed_command(self, command, check_health=check_health)
+
+
+def measure(func):
+    CountingConnection.round_trips = 0
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start, CountingConnection.round_trips
+
+
+def run(cache, n, expire):
+    keys = ['toby.benchmark.' + str(i) for i in range(n)]
+    items = {k: {'id': i, 'value': i * 0.5} for i, k in enumerate(keys)}
+    hash_key = 'toby.benchmark.hash'
+    cases = [
+        ('put', lambda: [cache.put(k, val=v, expire=expire) for k, v in items.items()],
+         lambda: cache.put_many(items, expire=expire)),
+        ('get', lambda: [cache.get(k) for k in keys], lambda: cache.get_many(keys)),
+        ('delete', lambda: [cache.delete(k) for k in keys], lambda: cache.delete_many(keys)),
+        ('sub put', lambda: [cache.put(hash_key, k, v, expire=expire) for k, v in items.items()],
+         lambda: cache.sub_put_many(hash_key, items, expire=expire)),
+        ('sub get', lambda: [cache.get(hash_key, k) for k in keys], lambda: cache.sub_get_many(hash_key, keys)),
+        ('sub delete', lambda: [cache.delete(hash_key, k) for k in keys],
+         lambda: cache.sub_delete_many(hash_key, keys)),
+    ]
+    cache.put_many(items, expire=expire)
+    cache.sub_put_many(hash_key, items, expire=expire)
+    if cache.get_many(keys) != list(items.values()) or cache.sub_get_many(hash_key, keys) != list(items.values()):
+        raise AssertionError('The bulk results are not in input order')
+    print(f'{n} keys, expire {expire}')
+    for name, single, bulk in cases:
+        single_seconds, single_trips = measure(single)
+        bulk_seconds, bulk_trips = measure(bulk)
+        print(f'{name:>12}: per key {single_trips:8d} round trips {single_seconds * 1000:10.1f} ms | '
+              f'bulk {bulk_trips:6d} round trips {bulk_seconds * 1000:10.1f} ms | x{single_seconds / bulk_seconds:.1f}')
+    cache.delete_many(keys)
+    cache.delete(hash_key)
+
+
+def main(args):
+    from ax.wrapper.redis import Cache
+    pool = redis.ConnectionPool(host=args.host, port=args.port, db=args.db, connection_class=CountingConnection)
+    cache = Cache(redis_instance=redis.StrictRedis(connection_pool=pool))
+    info = cache.get_instance().info('server')
+    print(f'redis {info.get("redis_version")} at {args.host}:{args.port}')
+    for n in args.keys:
+        run(cache, n, args.expire)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the bulk operations of Cache')
+    parser.add_argument('--host', default='localhost', help='the redis host')
+    parser.add_argument('--port', type=int, default=6379, help='the redis port')
+    parser.add_argument('--db', type=int, default=15, help='the redis db, keys toby.benchmark.* are removed')
+    parser.add_argument('--keys', type=int, nargs='+', default=[1000, 100000], help='numbers of keys')
+    parser.add_argument('--expire', type=int, default=60, help='expire of the keys, -1 for not expire')
+    sys.path.insert(0, os.getcwd())
+    main(parser.parse_args())
@@ -0,0 +1,113 @@
+"""
+Benchmark core.Distributor with N local TaskWorker processes, tasks/sec, latency & the tasks done per worker
+    the latency is from the push of the task to its result, incl. the wait in the queue
+    --rate pushes the tasks at a fixed rate to measure the latency below the capacity (0 for all at once)
+    --slow-workers makes some workers x10 slower, the credit sends them fewer tasks
+    --kill terminates a worker halfway, its tasks in flight are redelivered after --worker-timeout
+
+Start a local redis-server first, e.g.
+    redis-server --port 6379 &
+    python tools/benchmark_distributor.py --port 6379 --workers 4 --tasks 20000 --task-ms 0
+"""
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+
+
+def work(task):
+    time.sleep(task['ms'] * task['slow'] / 1000)
+    return task['i'], task['ts'], time.time(), os.getpid()
+
+
+def run_worker(address, port, concurrency, credit, slow):
+    from core.core import TaskWorker
+
+    def func(task):
+        task['slow'] = slow
+        return work(task)
+    TaskWorker(func, host=address, port=port, concurrency=concurrency, credit=credit).run()
+
+
+def percentile(values, p):
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+
+def main(args):
+    import redis
+    from ax.wrapper.redis import Queue
+    from core.core import Distributor
+    queue_name, result_name = 'toby.benchmark.tasks', 'toby.benchmark.results'
+    queue = Queue(redis_instance=redis.StrictRedis(host=args.host, port=args.port, db=args.db))
+    for name in (queue_name, result_name, queue_name + '.dead'):
+        queue._redis.delete(name)
+    distributor = Distributor(queue_name=queue_name, port=args.zmq_port, queue=queue, result_queue=result_name,
+                              worker_timeout=args.worker_timeout, batch_size=args.batch_size)
+    distributor.daemon = True
+    distributor.start()
+    distributor.ready.wait()
+    workers = [multiprocessing.Process(target=run_worker, daemon=True,
+                                       args=('tcp://127.0.0.1', args.zmq_port, args.concurrency, args.credit,
+                                             10 if i < args.slow_workers else 1))
+               for i in range(args.workers)]
+    for p in workers:
+        p.start()
+    while len(distributor.stats()['workers']) < args.workers:
+        time.sleep(0.01)
+
+    start = time.perf_counter()
+    batch = 1000 if args.rate <= 0 else max(1, args.rate // 100)
+    for i in range(0, args.tasks, batch):
+        tasks = [{'i': j, 'ts': time.time(), 'ms': args.task_ms} for j in range(i, min(i + batch, args.tasks))]
+        queue.push_many(queue_name, tasks)
+        if args.rate > 0:
+            time.sleep(max(start + (i + batch) / args.rate - time.perf_counter(), 0))
+    results = dict()
+    killed = False
+    while len(results) < args.tasks:
+        for i, ts, done, pid in queue.pop_many(result_name, 1000):
+            results[i] = (done - ts, pid)
+        if args.kill and not killed and len(results) >= args.tasks // 2:
+            workers[-1].terminate()
+            killed = True
+        time.sleep(0.001)
+    seconds = time.perf_counter() - start
+    stats = distributor.stats()
+    distributor.stop()
+    for p in workers:
+        p.terminate()
+        p.join()
+
+    latencies = sorted(latency for latency, _ in results.values())
+    per_worker = dict()
+    for _, pid in results.values():
+        per_worker[pid] = per_worker.get(pid, 0) + 1
+    print(f'{args.workers} workers x {args.concurrency} threads ({args.slow_workers} slow), credit '
+          f'{args.credit or 2 * args.concurrency}, {args.tasks} tasks of {args.task_ms} ms, '
+          f'rate {args.rate or "all at once"}')
+    print(f'throughput {args.tasks / seconds:10.0f} tasks/s ({seconds:.2f} s)')
+    print(f'latency p50 {percentile(latencies, 50) * 1000:8.2f} ms  p99 {percentile(latencies, 99) * 1000:8.2f} ms  '
+          f'max {latencies[-1] * 1000:8.2f} ms')
+    print('tasks per worker', ' '.join(str(per_worker.get(p.pid, 0)) for p in workers))
+    print('distributor', {k: v for k, v in stats.items() if k != 'workers'})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the Distributor with local worker processes')
+    parser.add_argument('--host', default='localhost', help='the redis host')
+    parser.add_argument('--port', type=int, default=6379, help='the redis port')
+    parser.add_argument('--db', type=int, default=15, help='the redis db, lists toby.benchmark.* are removed')
+    parser.add_argument('--zmq-port', type=int, default=23119, help='the port of the distributor')
+    parser.add_argument('--workers', type=int, default=4, help='worker processes')
+    parser.add_argument('--concurrency', type=int, default=1, help='threads per worker')
+    parser.add_argument('--credit', type=int, default=None, help='credit per worker, default 2 x threads')
+    parser.add_argument('--slow-workers', type=int, default=0, help='workers x10 slower')
+    parser.add_argument('--tasks', type=int, default=20000, help='number of tasks')
+    parser.add_argument('--task-ms', type=float, default=0, help='ms of each task')
+    parser.add_argument('--rate', type=int, default=0, help='tasks pushed per second, 0 for all at once')
+    parser.add_argument('--batch-size', type=int, default=100, help='max tasks popped in one LPOP/ results pushed')
+    parser.add_argument('--worker-timeout', type=float, default=2.0, help='seconds until a silent worker is dead')
+    parser.add_argument('--kill', action='store_true', help='terminate a worker halfway')
+    sys.path.insert(0, os.getcwd())
+    main(parser.parse_args())
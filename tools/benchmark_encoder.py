@@ -0,0 +1,60 @@
+"""
+Benchmark the response encoders with a DataFrame result (as from Connection.query), payload size & encode time
+    baseline - stdlib json of df.to_dict('records') with str() fallback, what a handler has to do for jsonify
+
+e.g. python tools/benchmark_encoder.py --rows 100000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import numpy
+import pandas
+
+
+def build_result(rows):
+    df = pandas.DataFrame({
+        'id': numpy.arange(rows),
+        'value': numpy.random.rand(rows),
+        'count': numpy.random.randint(0, 1000, rows),
+        'name': ['sensor_' + str(i % 100) for i in range(rows)],
+        'ts': pandas.date_range('2026-01-01', periods=rows, freq='s', tz='UTC'),
+    })
+    return {'request_id': 'benchmark', 'request_status': 'ok', 'result': df}
+
+
+def baseline(resp):
+    rtn = {k: v for k, v in resp.items()}
+    rtn['result'] = resp['result'].to_dict('records')
+    return json.dumps(rtn, default=str).encode()
+
+
+def measure(encode, resp, repeat):
+    body = encode(resp)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        encode(resp)
+    return (time.perf_counter() - start) / repeat, len(body)
+
+
+def main(args):
+    from ax.encoder import ResponseEncoder, JsonEncoder
+    encoder = ResponseEncoder(datetime_format='iso')
+    resp = build_result(args.rows)
+    candidates = [('stdlib json (records)', baseline),
+                  ('json column (' + ('orjson' if JsonEncoder.native_numpy else 'stdlib') + ')', encoder.json.encode)]
+    for content_type, enc in encoder.encoders.items():
+        candidates.append((content_type, enc.encode))
+    print(f'{args.rows} rows, {args.repeat} repeats')
+    for name, encode in candidates:
+        seconds, size = measure(encode, resp, args.repeat)
+        print(f'{name:>40}: {seconds * 1000:10.2f} ms  {size / 1024:12.1f} KiB')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the response encoders')
+    parser.add_argument('--rows', type=int, default=100000, help='rows of the DataFrame')
+    parser.add_argument('--repeat', type=int, default=5, help='number of encodes to average')
+    sys.path.insert(0, os.getcwd())
+    main(parser.parse_args())
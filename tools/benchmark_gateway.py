@@ -0,0 +1,110 @@
+"""
+Benchmark the gateway serving modes: gunicorn (toby:app, as start.sh) vs uvicorn (toby_asgi:app, as start_asgi.sh)
+
+The handlers below simulate a handler waiting on Redis/ Postgres/ Dask, run from the repository root, e.g.
+    python tools/benchmark_gateway.py --requests 2000 --concurrency 128 --wait 0.05
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+import argparse
+import subprocess
+import requests
+from cryptography.fernet import Fernet
+
+
+def io_handler(wait=0.05, **kwargs):
+    time.sleep(wait)
+    return {'request_id': kwargs['request_id'], 'request_status': 'ok'}
+
+
+async def async_io_handler(wait=0.05, **kwargs):
+    await asyncio.sleep(wait)
+    return {'request_id': kwargs['request_id'], 'request_status': 'ok'}
+
+
+servers = {
+    'gunicorn': ['gunicorn', '-b', '127.0.0.1:{port}', '-w', '4', '--threads', '8', 'toby:app'],
+    'asgi': ['uvicorn', '--host', '127.0.0.1', '--port', '{port}', '--workers', '4', '--log-level', 'warning',
+             'toby_asgi:app'],
+}
+
+
+def start_server(name, port, env):
+    cmd = [c.format(port=port) for c in servers[name]]
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = 'http://127.0.0.1:' + str(port)
+    for _ in range(300):
+        try:
+            requests.get(url + '/', timeout=5)
+            return proc, url
+        except requests.RequestException:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError('Server ' + name + ' did not start')
+
+
+async def _client(host, port, body, count, latencies, errors):
+    """One keep-alive connection firing count requests in sequence"""
+    reader, writer = await asyncio.open_connection(host, port)
+    head = ('GET /process HTTP/1.1\r\nHost: ' + host + '\r\nContent-Type: application/json\r\n'
+            'Content-Length: ' + str(len(body)) + '\r\n\r\n').encode()
+    for _ in range(count):
+        start = time.perf_counter()
+        writer.write(head + body)
+        headers = await reader.readuntil(b'\r\n\r\n')
+        length = int([h for h in headers.split(b'\r\n') if h.lower().startswith(b'content-length:')][0][15:])
+        resp = json.loads(await reader.readexactly(length))
+        latencies.append(time.perf_counter() - start)
+        errors.append(resp.get('request_status') == 'error')
+    writer.close()
+
+
+async def run_load(url, payload, total, concurrency):
+    """
+    Fire total requests with concurrency keep-alive clients
+    :return: (seconds, sorted latencies, errors)
+    """
+    host, port = url.rsplit('/', 1)[1].split(':')
+    body = json.dumps(payload).encode()
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*[_client(host, int(port), body, total // concurrency, latencies, errors)
+                           for _ in range(concurrency)])
+    return time.perf_counter() - start, sorted(latencies), sum(errors)
+
+
+def main(args):
+    key = Fernet.generate_key()
+    env = {**os.environ, 'TOBY_TOKEN': 'benchmark', 'TOBY_ENCRYPT_KEY': key.decode(), 'TOBY_DEBUG': 'False',
+           'PYTHONPATH': os.getcwd()}
+    token = Fernet(key).encrypt(b'benchmark').decode()
+    port = args.port
+    for name in args.servers.split(','):
+        for handler in ['io_handler', 'async_io_handler'] if name == 'asgi' else ['io_handler']:
+            proc, url = start_server(name, port, env)
+            try:
+                payload = {'request_token': token, 'request_module': 'tools.benchmark_gateway',
+                           'request_function': handler, 'wait': args.wait}
+                asyncio.run(run_load(url, payload, args.concurrency, args.concurrency))
+                elapsed, lat, errors = asyncio.run(run_load(url, payload, args.requests, args.concurrency))
+                print(f'{name:>8} {handler:>16}: {len(lat) / elapsed:9.1f} req/s  '
+                      f'p50 {lat[len(lat) // 2] * 1000:8.1f} ms  p99 {lat[int(len(lat) * 0.99) - 1] * 1000:8.1f} ms  '
+                      f'errors {errors}')
+            finally:
+                proc.terminate()
+                proc.wait()
+            port += 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark gunicorn vs ASGI serving mode of the gateway')
+    parser.add_argument('--servers', type=str, default='gunicorn,asgi', help='servers to benchmark')
+    parser.add_argument('--requests', type=int, default=2000, help='number of requests')
+    parser.add_argument('--concurrency', type=int, default=128, help='number of concurrent connections')
+    parser.add_argument('--wait', type=float, default=0.05, help='seconds each handler waits')
+    parser.add_argument('--port', type=int, default=12216, help='first local port to use')
+    sys.path.insert(0, os.getcwd())
+    main(parser.parse_args())
@@ -0,0 +1,90 @@
+"""
+Benchmark QueuePub/ QueueSub of ax.wrapper.zmq, messages/sec & MB/sec of the text & binary framing over tcp:// & ipc://
+    the subscriber runs in another process, HWMs are unlimited so no message is dropped
+
+    python tools/benchmark_zmq.py --count 100000 --sizes 100 10000 1000000
+"""
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+
+
+def subscribe(address, framing, ready, result):
+    from ax.wrapper.zmq import QueueSub
+    host, port = address.rsplit(':', 1)
+    # warmup is subscribed last, the subscriptions before it are in place once a warmup message is received
+    sub = QueueSub(['end', 'bench', 'warmup'], host=host, port=port, framing=framing, rcvhwm=0)
+    sub.sub()
+    ready.set()
+    count = 0
+    start = None
+    while True:
+        sub.sub()
+        if sub.last_topic == b'bench':
+            if start is None:
+                start = time.perf_counter()
+            count += 1
+        elif sub.last_topic == b'end':
+            break
+    result.put((count, time.perf_counter() - start if start else 0.0))
+
+
+def run(address, framing, payload_type, size, count):
+    from ax.wrapper.zmq import QueuePub
+    if payload_type == 'text':
+        payload = 'x' * size
+    elif payload_type == 'numpy':
+        import numpy
+        payload = numpy.ones(size // 8, dtype='f8')
+    else:
+        payload = b'x' * size
+    host, port = address.rsplit(':', 1)
+    pub = QueuePub(host=host, port=port, framing=framing, mode='bind', sndhwm=0)
+    ready, result = multiprocessing.Event(), multiprocessing.Queue()
+    p = multiprocessing.Process(target=subscribe, args=(address, framing, ready, result))
+    p.start()
+    while not ready.is_set():
+        # the subscription takes a while to reach the publisher
+        pub.pub('warmup', b'' if framing == 'binary' else '')
+        time.sleep(0.01)
+    start = time.perf_counter()
+    for _ in range(count):
+        pub.pub('bench', payload)
+    pub.pub('end', b'' if framing == 'binary' else '')
+    received, seconds = result.get()
+    pub_seconds = time.perf_counter() - start
+    p.join()
+    pub.disconnect()
+    pub.context.term()
+    seconds = max(seconds, 1e-9)
+    print(f'{address.split(":")[0]:>4} {framing:>6} {payload_type:>6} {size:>9} B: {received:>8} msgs '
+          f'{received / seconds:12.0f} msgs/s {received * size / seconds / 1e6:10.1f} MB/s '
+          f'(pub {pub_seconds * 1000:.0f} ms)')
+
+
+def main(args):
+    cases = [('text', 'text'), ('binary', 'bytes')]
+    try:
+        import numpy
+        cases.append(('binary', 'numpy'))
+    except ImportError:
+        pass
+    for transport in args.transports:
+        address = 'tcp://127.0.0.1:' + str(args.port) if transport == 'tcp' else 'ipc:///tmp/toby_benchmark_zmq:0'
+        for size in args.sizes:
+            count = min(args.count, max(args.max_bytes // size, 100))
+            for framing, payload_type in cases:
+                run(address, framing, payload_type, size, count)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the text & binary framing of QueuePub/ QueueSub')
+    parser.add_argument('--transports', nargs='+', default=['tcp', 'ipc'], choices=['tcp', 'ipc'])
+    parser.add_argument('--port', type=int, default=23116, help='the tcp port')
+    parser.add_argument('--count', type=int, default=100000, help='messages per case')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 10000, 1000000], help='payload sizes in bytes')
+    parser.add_argument('--max-bytes', type=int, default=2 * 10 ** 9, help='max bytes per case, fewer messages if over')
+    sys.path.insert(0, os.getcwd())
+    main(parser.parse_args())